@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Prenda, Servicio, Incidencia, DudaQueja
+from .correos import reencolar
+from .models import Prenda, Servicio, Incidencia, DudaQueja, CorreoTicket
 
 
 @admin.register(Prenda)
@@ -42,4 +43,19 @@ class DudaQuejaAdmin(admin.ModelAdmin):
     list_filter = ('estado', 'fecha_creacion')
     search_fields = ('comentario', 'cliente__username')
     readonly_fields = ('fecha_creacion', 'fecha_resolucion')
-    
\ No newline at end of file
+    
+
+
+@admin.register(CorreoTicket)
+class CorreoTicketAdmin(admin.ModelAdmin):
+    list_display = ('pedido', 'email_destino', 'estado', 'intentos',
+                    'fecha_creacion', 'fecha_enviado')
+    list_filter = ('estado', 'fecha_creacion')
+    search_fields = ('email_destino', 'pedido__folio')
+    readonly_fields = ('fecha_creacion', 'fecha_tomado', 'fecha_enviado', 'error')
+    raw_id_fields = ('pedido',)
+    actions = ['reintentar']
+
+    @admin.action(description='Reintentar los correos fallidos seleccionados')
+    def reintentar(self, request, queryset):
+        self.message_user(request, f'{reencolar(queryset)} correos vuelven a la cola.')
@@ -0,0 +1,138 @@
+"""
+Tiempos de entrega de los pedidos: cuánto tardan (percentiles p50/p90/p99),
+qué porcentaje se entrega a tiempo y el desglose por servicio, origen y
+operador.
+
+Las columnas se leen con values_list por bloques y se pasan a arreglos de
+NumPy; todos los cálculos se hacen sobre los arreglos, sin recorrer
+instancias del modelo.
+"""
+from itertools import islice
+
+from .models import Pedido
+from .reportes import filtro_rango, rango_dias
+
+
+TAMANO_BLOQUE = 5000
+
+# Rangos en horas para la distribución de tiempos de entrega
+RANGOS_HORAS = (0, 6, 12, 24, 48, 72, 168)
+
+COLUMNAS = ('fecha_recepcion', 'fecha_entrega_real', 'fecha_entrega_estimada',
+            'tipo_servicio', 'origen', 'operador__username')
+
+
+def _cargar(queryset, tamano=TAMANO_BLOQUE):
+    """
+    Lee las columnas de los pedidos por bloques y regresa arreglos de NumPy:
+    horas de entrega, si se entregó a tiempo (1/0, NaN sin fecha estimada)
+    y las etiquetas de servicio, origen y operador.
+    """
+    import numpy as np
+
+    horas, a_tiempo = [], []
+    servicios, origenes, operadores = [], [], []
+    # Fecha límite = fin del día estimado en hora local; hay pocas fechas
+    # distintas, así que se calcula una vez por fecha
+    limites = {None: np.nan}
+
+    filas = queryset.values_list(*COLUMNAS).iterator(chunk_size=tamano)
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            break
+        recepcion, entrega, estimada, servicio, origen, operador = zip(*bloque)
+        for fecha in set(estimada) - limites.keys():
+            limites[fecha] = rango_dias(fecha)[1].timestamp()
+
+        recepcion = np.fromiter((valor.timestamp() for valor in recepcion),
+                                dtype=np.float64, count=len(bloque))
+        entrega = np.fromiter((valor.timestamp() for valor in entrega),
+                              dtype=np.float64, count=len(bloque))
+        limite = np.fromiter((limites[fecha] for fecha in estimada),
+                             dtype=np.float64, count=len(bloque))
+
+        horas.append((entrega - recepcion) / 3600)
+        a_tiempo.append(np.where(np.isnan(limite), np.nan, entrega <= limite))
+        servicios.extend(servicio)
+        origenes.extend(origen)
+        operadores.extend(operador)
+
+    if not horas:
+        return np.empty(0), np.empty(0), [], [], []
+    return (np.concatenate(horas), np.concatenate(a_tiempo),
+            servicios, origenes, operadores)
+
+
+def _estadisticas(horas, a_tiempo):
+    import numpy as np
+
+    if horas.size == 0:
+        return {'pedidos': 0, 'promedio_horas': None, 'p50_horas': None,
+                'p90_horas': None, 'p99_horas': None,
+                'con_fecha_estimada': 0, 'a_tiempo_pct': None}
+
+    p50, p90, p99 = np.percentile(horas, [50, 90, 99])
+    evaluables = a_tiempo[~np.isnan(a_tiempo)]
+    return {
+        'pedidos': int(horas.size),
+        'promedio_horas': round(float(horas.mean()), 1),
+        'p50_horas': round(float(p50), 1),
+        'p90_horas': round(float(p90), 1),
+        'p99_horas': round(float(p99), 1),
+        'con_fecha_estimada': int(evaluables.size),
+        'a_tiempo_pct': round(float(evaluables.mean() * 100), 1) if evaluables.size else None,
+    }
+
+
+def _desglose(etiquetas, horas, a_tiempo):
+    import numpy as np
+
+    if horas.size == 0:
+        return []
+    etiquetas = np.array([etiqueta or 'Sin especificar' for etiqueta in etiquetas])
+    grupos, indice = np.unique(etiquetas, return_inverse=True)
+
+    # Ordenar una vez por grupo y partir los arreglos en cada cambio de grupo
+    orden = np.argsort(indice, kind='stable')
+    cortes = np.cumsum(np.bincount(indice))[:-1]
+    resultado = [
+        {'nombre': str(grupo), **_estadisticas(horas_grupo, a_tiempo_grupo)}
+        for grupo, horas_grupo, a_tiempo_grupo in zip(
+            grupos, np.split(horas[orden], cortes), np.split(a_tiempo[orden], cortes))
+    ]
+    return sorted(resultado, key=lambda fila: -fila['pedidos'])
+
+
+def tiempos_entrega(fecha_inicio, fecha_fin):
+    """
+    Análisis de tiempos de entrega de los pedidos entregados que se
+    recibieron entre fecha_inicio y fecha_fin (inclusivas).
+    """
+    import numpy as np
+
+    pedidos = Pedido.objects.filter(
+        estado='entregado',
+        fecha_entrega_real__isnull=False,
+        **filtro_rango('fecha_recepcion', fecha_inicio, fecha_fin)
+    ).order_by()
+    horas, a_tiempo, servicios, origenes, operadores = _cargar(pedidos)
+
+    limites = np.array(RANGOS_HORAS + (np.inf,), dtype=np.float64)
+    conteos, _ = np.histogram(np.clip(horas, 0, None), bins=limites)
+    distribucion = [
+        {'desde_horas': int(desde),
+         'hasta_horas': None if np.isinf(hasta) else int(hasta),
+         'pedidos': int(cantidad)}
+        for desde, hasta, cantidad in zip(limites[:-1], limites[1:], conteos)
+    ]
+
+    return {
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+        'general': _estadisticas(horas, a_tiempo),
+        'distribucion': distribucion,
+        'por_servicio': _desglose(servicios, horas, a_tiempo),
+        'por_origen': _desglose(origenes, horas, a_tiempo),
+        'por_operador': _desglose(operadores, horas, a_tiempo),
+    }
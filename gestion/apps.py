@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GestionConfig(AppConfig):
     name = 'gestion'
+
+    def ready(self):
+        from . import signals  # noqa: F401
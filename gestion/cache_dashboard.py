@@ -0,0 +1,234 @@
+"""
+Caché del contexto del dashboard del administrador.
+
+El contexto se divide en secciones (ganancias, servicios, máquinas, ...) y
+cada una se guarda por separado en el caché de Django. Los signals de
+signals.py invalidan solo las secciones que dependen del modelo que cambió;
+el TTL corto es una red de seguridad para cambios hechos sin signals
+(por ejemplo queryset.update()).
+
+Invalidar no borra la llave: cambia la versión de la sección, que forma
+parte de la llave. Así, si una petición termina de calcular una sección con
+datos anteriores a la invalidación, la guarda con la versión vieja y nadie
+la vuelve a leer.
+
+Cuando varias peticiones del mismo proceso encuentran la misma sección
+vacía solo una la calcula; las demás esperan su resultado. El candado y
+los contadores de aciertos/fallos son por proceso: FileBasedCache
+(settings.CACHES) no tiene add/incr atómicos entre procesos, así que un
+candado o un contador guardado en el caché no se sostiene con varios
+workers de gunicorn. Con N procesos una sección vacía se calcula a lo más
+N veces, y estadisticas() reporta los números del proceso que responde.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Pedido, Insumo, Incidencia, DudaQueja, Maquina, Prenda
+from .reportes import hoy_local, rango_dias, filtro_rango
+
+
+PREFIJO = 'dashboard'
+
+# Tiempo máximo (segundos) que se espera a que otra petición calcule la sección
+ESPERA_CANDADO = 5
+
+CONTADORES = ('aciertos', 'fallos', 'esperas')
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 60)
+
+
+# ========== SECCIONES ==========
+
+def _ganancias(hoy):
+    """Hoy, semana y mes en una sola consulta con agregados condicionales"""
+    inicio_semana = hoy - timedelta(days=7)
+    inicio_mes = hoy.replace(day=1)
+    ventanas = {
+        'hoy': hoy,
+        'semana': inicio_semana,
+        'mes': inicio_mes,
+    }
+    agregados = {}
+    for nombre, desde in ventanas.items():
+        condicion = Q(fecha_recepcion__gte=rango_dias(desde)[0])
+        agregados[f'ganancias_{nombre}'] = Sum('total', filter=condicion)
+        agregados[f'servicios_{nombre}'] = Count('id', filter=condicion)
+    ganancias = Pedido.objects.filter(
+        estado_pago='pagado',
+        **filtro_rango('fecha_recepcion', min(inicio_semana, inicio_mes), hoy)
+    ).aggregate(**agregados)
+    for nombre in ventanas:
+        ganancias[f'ganancias_{nombre}'] = ganancias[f'ganancias_{nombre}'] or Decimal('0')
+    return ganancias
+
+
+def _alertas(hoy):
+    """Insumos con stock crítico (<=10%), con el índice de Insumo.porcentaje"""
+    insumos_criticos = Insumo.objects.filter(
+        porcentaje__lte=Insumo.PORCENTAJE_CRITICO
+    ).order_by('nombre')
+    return {'alertas_insumos': [
+        {'id': insumo.id,
+         'texto': f'{insumo.nombre} al {insumo.porcentaje}% de stock',
+         'tipo': 'insumo'}
+        for insumo in insumos_criticos
+    ]}
+
+
+def _incidencias(hoy):
+    """Incidencias recientes del personal (últimas 3 pendientes o en proceso)"""
+    return {'incidencias_recientes': list(
+        Incidencia.objects.filter(
+            estado__in=['pendiente', 'en_proceso']
+        ).select_related('trabajador').order_by('-fecha_reporte')[:3]
+    )}
+
+
+def _dudas(hoy):
+    """Dudas/Quejas recientes de clientes (últimas 3 pendientes o en proceso)"""
+    return {'dudas_recientes': list(
+        DudaQueja.objects.filter(
+            estado__in=['pendiente', 'en_proceso']
+        ).select_related('cliente').order_by('-fecha_creacion')[:3]
+    )}
+
+
+def _servicios(hoy):
+    """Un conteo agrupado por estado en lugar de una consulta por estado"""
+    por_estado = dict(
+        Pedido.objects.values_list('estado').annotate(n=Count('id')).order_by()
+    )
+    return {
+        'servicios_totales': sum(
+            n for estado, n in por_estado.items() if estado != 'entregado'),
+        'servicios_pendientes': por_estado.get('pendiente', 0),
+        'servicios_proceso': por_estado.get('en_proceso', 0),
+        'servicios_listos': por_estado.get('listo', 0),
+    }
+
+
+def _maquinas(hoy):
+    """Máquinas en uso (lavado/secado), agrupadas por tipo"""
+    ocupadas = dict(
+        Maquina.objects.filter(estado='ocupado')
+        .values_list('tipo').annotate(n=Count('id')).order_by()
+    )
+    return {
+        'maquinas_lavado': ocupadas.get('lavadora', 0),
+        'maquinas_secado': ocupadas.get('secadora', 0),
+    }
+
+
+def _prendas(hoy):
+    """5 prendas destacadas (las más caras)"""
+    return {'prendas_destacadas': list(
+        Prenda.objects.filter(activo=True).order_by('-precio')[:5]
+    )}
+
+
+# Nombre de la sección -> (función que la calcula, si depende del día)
+SECCIONES = {
+    'ganancias': (_ganancias, True),
+    'alertas': (_alertas, False),
+    'incidencias': (_incidencias, False),
+    'dudas': (_dudas, False),
+    'servicios': (_servicios, False),
+    'maquinas': (_maquinas, False),
+    'prendas': (_prendas, False),
+}
+
+
+# Un candado por sección y los contadores, en memoria del proceso
+_CANDADOS = {seccion: threading.Lock() for seccion in SECCIONES}
+_contadores = dict.fromkeys(CONTADORES, 0)
+_candado_contadores = threading.Lock()
+
+
+# ========== LLAVES Y CONTADORES ==========
+
+def _llave_version(seccion):
+    return f'{PREFIJO}:version:{seccion}'
+
+
+def _llave(seccion, version, hoy):
+    _, por_dia = SECCIONES[seccion]
+    sufijo = f':{hoy.isoformat()}' if por_dia else ''
+    return f'{PREFIJO}:{seccion}:v{version}{sufijo}'
+
+
+def _contar(nombre, cantidad=1):
+    with _candado_contadores:
+        _contadores[nombre] += cantidad
+
+
+def estadisticas():
+    """Aciertos, fallos y esperas por candado de este proceso desde que arrancó"""
+    with _candado_contadores:
+        datos = dict(_contadores)
+    consultas = datos['aciertos'] + datos['fallos']
+    datos['tasa_aciertos'] = round(datos['aciertos'] / consultas * 100, 1) if consultas else None
+    datos['proceso'] = os.getpid()
+    return datos
+
+
+def invalidar(*secciones):
+    """Marca como viejas las secciones indicadas (todas si no se indica ninguna)"""
+    for seccion in secciones or SECCIONES:
+        # time_ns() y no incr(): en FileBasedCache incr es leer y escribir,
+        # y dos procesos que invalidan a la vez escribirían la misma versión
+        cache.set(_llave_version(seccion), time.time_ns(), None)
+
+
+# ========== CONTEXTO ==========
+
+def _calcular(seccion, llave, hoy):
+    """Calcula la sección una sola vez aunque varias peticiones del proceso la pidan a la vez"""
+    funcion, _ = SECCIONES[seccion]
+    candado = _CANDADOS[seccion]
+    if not candado.acquire(blocking=False):
+        # Otra petición la está calculando: esperar su resultado
+        _contar('esperas')
+        if not candado.acquire(timeout=ESPERA_CANDADO):
+            return funcion(hoy)
+    try:
+        # Si se esperó, la otra petición ya la dejó en el caché
+        valor = cache.get(llave)
+        if valor is None:
+            valor = funcion(hoy)
+            cache.set(llave, valor, _ttl())
+        return valor
+    finally:
+        candado.release()
+
+
+def contexto_dashboard():
+    """Contexto completo del dashboard, leyendo del caché lo que siga vigente"""
+    hoy = hoy_local()
+    versiones = cache.get_many([_llave_version(seccion) for seccion in SECCIONES])
+    llaves = {
+        seccion: _llave(seccion, versiones.get(_llave_version(seccion), 0), hoy)
+        for seccion in SECCIONES
+    }
+    guardadas = cache.get_many(list(llaves.values()))
+
+    contexto = {}
+    fallos = 0
+    for seccion, llave in llaves.items():
+        valor = guardadas.get(llave)
+        if valor is None:
+            fallos += 1
+            valor = _calcular(seccion, llave, hoy)
+        contexto.update(valor)
+
+    _contar('aciertos', len(llaves) - fallos)
+    _contar('fallos', fallos)
+    return contexto
@@ -0,0 +1,104 @@
+"""
+Directorio de archivos en caché con tamaño acotado. Lo comparten
+cache_reportes (PDF/Excel de finanzas) y cache_tickets (tickets PDF); cada
+uno decide cómo se nombran sus archivos y cuándo invalidarlos.
+
+- Escritura atómica: se escribe a un temporal en el mismo directorio y se
+  renombra con os.replace, así nadie lee un archivo a medias aunque dos
+  procesos guarden el mismo a la vez.
+- LRU por fecha de modificación: cada lectura "toca" el archivo y, al
+  rebasar el límite de bytes, se borran primero los menos usados.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+
+
+class CacheDisco:
+    """
+    Archivos `*<extension>` del directorio indicado por el ajuste
+    `ajuste_directorio` (por defecto BASE_DIR/cache/<nombre>), con un
+    máximo de bytes indicado por `ajuste_limite`.
+    """
+
+    def __init__(self, nombre, ajuste_directorio, ajuste_limite, limite, extension):
+        self.nombre = nombre
+        self.ajuste_directorio = ajuste_directorio
+        self.ajuste_limite = ajuste_limite
+        self.limite = limite
+        self.extension = extension
+
+    def directorio(self):
+        # Se lee en cada llamada para respetar override_settings en las pruebas
+        directorio = getattr(settings, self.ajuste_directorio,
+                             os.path.join(settings.BASE_DIR, 'cache', self.nombre))
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
+
+    def limite_bytes(self):
+        return getattr(settings, self.ajuste_limite, self.limite)
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio(), nombre)
+
+    def leer(self, nombre):
+        """Bytes del archivo o None si no existe"""
+        ruta = self.ruta(nombre)
+        try:
+            with open(ruta, 'rb') as archivo:
+                contenido = archivo.read()
+        except OSError:
+            return None
+        # Marcar como usado recientemente (LRU por fecha de modificación)
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+        return contenido
+
+    def escribir(self, nombre, contenido):
+        """Guarda el archivo de forma atómica y libera espacio si se rebasó el límite"""
+        directorio = self.directorio()
+        # El temporal no lleva la extensión: no cuenta como entrada del caché
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, os.path.join(directorio, nombre))
+        except BaseException:
+            self.borrar(temporal)
+            raise
+        self.liberar_espacio()
+
+    def archivos(self, prefijo=''):
+        """Entradas (os.DirEntry) del caché cuyo nombre empieza con `prefijo`"""
+        for entrada in os.scandir(self.directorio()):
+            if (entrada.is_file() and entrada.name.startswith(prefijo)
+                    and entrada.name.endswith(self.extension)):
+                yield entrada
+
+    @staticmethod
+    def borrar(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def liberar_espacio(self):
+        """Borra los archivos menos usados hasta quedar dentro del límite"""
+        entradas = []
+        for entrada in self.archivos():
+            try:
+                info = entrada.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, entrada.path))
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        limite = self.limite_bytes()
+        for _, tamano, ruta in sorted(entradas):
+            if total <= limite:
+                break
+            self.borrar(ruta)
+            total -= tamano
@@ -0,0 +1,80 @@
+"""
+Caché en disco de los reportes de finanzas ya generados (PDF y Excel).
+
+Cada archivo se identifica por el tipo de reporte, las fechas del período
+y un hash de los datos con que se generó, así que un cambio en las ventas
+produce otra llave y nunca se sirve un reporte viejo. Además, al cambiar
+las ventas de un día se borran los reportes cuyo período lo incluye.
+El tamaño total está acotado (ver cache_disco).
+
+Lo que no lleva los datos en la llave (la serie de ventas) usa además
+version_ventas(), que cambia con cada invalidación: si una invalidación
+llega mientras se calcula, el resultado se guarda con la versión vieja y
+nadie lo vuelve a leer (igual que en cache_dashboard).
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+
+from .cache_disco import CacheDisco
+
+
+_disco = CacheDisco('reportes', 'REPORTES_CACHE_DIR', 'REPORTES_CACHE_MAX_BYTES',
+                    50 * 1024 * 1024, '.bin')
+
+
+LLAVE_VERSION = 'reportes:version_ventas'
+
+
+def version_ventas():
+    """
+    Versión actual de las ventas. Hay que leerla antes de consultar los
+    datos. Cada invalidación guarda un valor nuevo (no incrementa: con
+    FileBasedCache dos incr simultáneos pueden dejar el mismo número).
+    """
+    version = cache.get(LLAVE_VERSION)
+    if version is None:
+        # Caché reiniciado: empezar en una versión nueva
+        cache.add(LLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(LLAVE_VERSION)
+    return version
+
+
+def _nombre(tipo, fecha_inicio, fecha_fin, datos):
+    huella = hashlib.sha256(
+        json.dumps(datos, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:32]
+    return f"{tipo}_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}_{huella}.bin"
+
+
+def obtener(tipo, fecha_inicio, fecha_fin, datos):
+    """Devuelve los bytes guardados para ese reporte o None si no existen"""
+    return _disco.leer(_nombre(tipo, fecha_inicio, fecha_fin, datos))
+
+
+def guardar(tipo, fecha_inicio, fecha_fin, datos, contenido):
+    """Guarda los bytes del reporte y libera espacio si se rebasó el límite"""
+    _disco.escribir(_nombre(tipo, fecha_inicio, fecha_fin, datos), contenido)
+
+
+def invalidar(fecha=None):
+    """
+    Cambia la versión de las ventas y borra los reportes cuyo período
+    incluye la fecha (todos si no se indica, p. ej. tras reconstruir los resúmenes)
+    """
+    cache.set(LLAVE_VERSION, time.time_ns(), None)
+    for entrada in _disco.archivos():
+        if fecha is None:
+            _disco.borrar(entrada.path)
+            continue
+        try:
+            _, inicio, fin, _ = entrada.name.rsplit('_', 3)
+            inicio = datetime.strptime(inicio, '%Y%m%d').date()
+            fin = datetime.strptime(fin, '%Y%m%d').date()
+        except ValueError:
+            continue
+        if inicio <= fecha <= fin:
+            _disco.borrar(entrada.path)
@@ -0,0 +1,107 @@
+"""
+Caché en disco de los tickets PDF ya generados.
+
+Cada archivo se identifica por el id del pedido y una versión: un hash de
+los campos que salen en el ticket y del diseño con que se dibuja (la
+plantilla HTML o pdf_directo.py, según PDF_MOTOR). Si el
+pedido cambia en algo que sale impreso, la versión cambia y se genera otro
+PDF; la versión también sirve como ETag para que el navegador reciba 304 al
+reimprimir. Los tickets de pedidos entregados o cancelados se borran y el
+tamaño total está acotado (ver cache_disco).
+"""
+import hashlib
+import json
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db import models
+from django.template.loader import get_template
+
+from . import pdf_directo
+from .cache_disco import CacheDisco
+from .pdf import motor as motor_pdf
+from .utils import render_pdf_ticket, PLANTILLA_TICKET, PLANTILLA_TICKET_CUERPO
+
+
+# Campos del pedido y del cliente que aparecen en el ticket
+CAMPOS_PEDIDO = ('folio', 'fecha_recepcion', 'fecha_entrega_estimada', 'tipo_servicio',
+                 'peso', 'cantidad_prendas', 'total', 'metodo_pago', 'observaciones')
+CAMPOS_CLIENTE = ('first_name', 'last_name', 'username')
+
+ESTADOS_FINALES = ('entregado', 'cancelado')
+
+
+_disco = CacheDisco('tickets', 'TICKETS_CACHE_DIR', 'TICKETS_CACHE_MAX_BYTES',
+                    20 * 1024 * 1024, '.pdf')
+
+
+@lru_cache(maxsize=2)
+def _huella_diseno(motor):
+    """
+    Hash del diseño del ticket con el motor dado: la plantilla o el módulo
+    que lo dibuja (cambiarlos, o cambiar de motor, invalida todos los tickets)
+    """
+    if motor == 'reportlab':
+        with open(pdf_directo.__file__, 'rb') as archivo:
+            fuente = archivo.read()
+    else:
+        fuente = ''.join(get_template(plantilla).template.source
+                         for plantilla in (PLANTILLA_TICKET, PLANTILLA_TICKET_CUERPO)).encode('utf-8')
+    return hashlib.sha256(motor.encode('ascii') + fuente).hexdigest()[:16]
+
+
+def _valor(pedido, campo):
+    """
+    Valor del campo tal como queda en la base de datos: Decimal('50') en
+    memoria y Decimal('50.00') leído de la tabla dan la misma versión
+    """
+    valor = getattr(pedido, campo)
+    campo_modelo = pedido._meta.get_field(campo)
+    if isinstance(campo_modelo, models.DecimalField) and valor is not None:
+        return Decimal(str(valor)).quantize(Decimal(1).scaleb(-campo_modelo.decimal_places))
+    return valor
+
+
+def version(pedido):
+    """Versión del ticket: cambia solo si cambia algo que sale impreso"""
+    datos = [_huella_diseno(motor_pdf())]
+    datos += [_valor(pedido, campo) for campo in CAMPOS_PEDIDO]
+    datos += [getattr(pedido.cliente, campo) for campo in CAMPOS_CLIENTE]
+    return hashlib.sha256(
+        json.dumps(datos, default=str).encode('utf-8')
+    ).hexdigest()[:24]
+
+
+def _nombre(pedido_id, version_ticket):
+    return f'ticket_{pedido_id}_{version_ticket}.pdf'
+
+
+def ticket_pdf(pedido, esperar=False):
+    """
+    Devuelve (bytes del PDF, versión). Lo genera solo si no está guardado;
+    (None, versión) si falló la generación. Con esperar=True (trabajos en
+    segundo plano) espera turno en el servicio de PDF en lugar de fallar;
+    con un número, espera a lo más esos segundos.
+    """
+    version_ticket = version(pedido)
+    nombre = _nombre(pedido.id, version_ticket)
+    contenido = _disco.leer(nombre)
+    if contenido is not None:
+        return contenido, version_ticket
+
+    contenido = render_pdf_ticket(pedido, esperar=esperar)
+    if contenido is None:
+        return None, version_ticket
+    if pedido.estado not in ESTADOS_FINALES:
+        # Las versiones anteriores del mismo pedido ya no se van a pedir
+        for entrada in _disco.archivos(f'ticket_{pedido.id}_'):
+            if entrada.name != nombre:
+                _disco.borrar(entrada.path)
+        _disco.escribir(nombre, contenido)
+    return contenido, version_ticket
+
+
+def invalidar(pedido_id):
+    """Borra los tickets guardados de un pedido"""
+    for entrada in _disco.archivos(f'ticket_{pedido_id}_'):
+        _disco.borrar(entrada.path)
@@ -0,0 +1,227 @@
+"""
+Bandeja de salida de los tickets por correo (CorreoTicket).
+
+nuevo_servicio solo registra el correo en la misma transacción que el
+pedido y responde sin esperar al servidor SMTP. El comando
+``manage.py enviar_correos`` toma los pendientes en lotes y los manda por
+una sola conexión SMTP (get_connection + send_messages) en lugar de abrir
+una conexión con TLS por cada correo.
+
+- Los errores temporales se reintentan con espera exponencial
+  (trabajos.espera_reintento).
+- Al agotar los intentos, o si el servidor rechaza el destinatario o el
+  mensaje (respuesta 5xx), el correo queda como 'fallido': ya no se
+  intenta y se puede reencolar desde el admin (reencolar()).
+- Los que quedaron 'en_proceso' porque el worker se detuvo vuelven a la
+  cola después de RECUPERAR_TRAS. Por eso cada correo renueva su
+  fecha_tomado antes de generarse y enviarse, y la espera por el servicio
+  de PDF está acotada (ESPERA_PDF): un lote lento no se da por abandonado.
+"""
+import smtplib
+import uuid
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from . import cache_tickets
+from .models import CorreoTicket
+from .pdf import PDFNoDisponible
+from .trabajos import ERRORES_SMTP, espera_reintento
+from .utils import mensaje_ticket_email
+
+
+# Correos por lote (una conexión SMTP por lote)
+TAMANO_LOTE = 20
+
+# Un correo 'en_proceso' más viejo que esto se considera abandonado
+RECUPERAR_TRAS = timedelta(minutes=10)
+
+# Segundos máximos que un correo espera lugar en el servicio de PDF
+# (muy por debajo de RECUPERAR_TRAS; después se reintenta más tarde)
+ESPERA_PDF = 120
+
+# Se cayó la conexión: el resto del lote vuelve a la cola sin gastar intentos
+ERRORES_CONEXION = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def _permanente(error):
+    """Respuesta 5xx del servidor (destinatario o mensaje rechazado): reintentar no sirve"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def encolar_ticket(pedido):
+    """
+    Registra el envío del ticket del pedido. Se llama dentro de la
+    transacción que crea el pedido: si esta se revierte, no queda correo.
+    """
+    if not pedido.cliente.email:
+        return None
+    return CorreoTicket.objects.create(pedido=pedido, email_destino=pedido.cliente.email)
+
+
+def recuperar_abandonados():
+    """Devuelve a la cola los correos de un worker que se detuvo a media tarea"""
+    return CorreoTicket.objects.filter(
+        estado='en_proceso', fecha_tomado__lt=timezone.now() - RECUPERAR_TRAS
+    ).update(estado='pendiente', lote='', disponible_desde=timezone.now())
+
+
+def tomar_lote(tamano=TAMANO_LOTE):
+    """
+    Reserva hasta `tamano` correos disponibles. El UPDATE condicionado al
+    estado y marcado con un id de lote evita que dos workers tomen el mismo.
+    """
+    ahora = timezone.now()
+    ids = list(CorreoTicket.objects.filter(
+        estado='pendiente', disponible_desde__lte=ahora
+    ).order_by('disponible_desde', 'id').values_list('id', flat=True)[:tamano])
+    if not ids:
+        return []
+
+    lote = uuid.uuid4().hex
+    CorreoTicket.objects.filter(id__in=ids, estado='pendiente').update(
+        estado='en_proceso', lote=lote, fecha_tomado=ahora)
+    return list(CorreoTicket.objects.filter(lote=lote, estado='en_proceso')
+                .select_related('pedido__cliente').order_by('id'))
+
+
+def _actualizar(correo, **campos):
+    for campo, valor in campos.items():
+        setattr(correo, campo, valor)
+    correo.save(update_fields=list(campos))
+
+
+def _fallido(correo, error, intentos=None):
+    _actualizar(correo, estado='fallido', error=str(error), lote='',
+                intentos=correo.intentos if intentos is None else intentos)
+
+
+def _reintentar(correo, error):
+    intentos = correo.intentos + 1
+    if intentos >= correo.max_intentos:
+        _fallido(correo, error, intentos)
+    else:
+        _actualizar(correo, estado='pendiente', intentos=intentos, error=str(error), lote='',
+                    disponible_desde=timezone.now() + timedelta(seconds=espera_reintento(intentos)))
+
+
+def _liberar(correos):
+    """Vuelven a la cola tal cual (sin contar intento)"""
+    CorreoTicket.objects.filter(id__in=[c.id for c in correos], estado='en_proceso').update(
+        estado='pendiente', lote='', disponible_desde=timezone.now())
+
+
+def _renovar(correo):
+    """
+    Renueva fecha_tomado del correo. False si ya no es de este lote (otro
+    worker lo recuperó como abandonado): entonces no se debe enviar.
+    """
+    correo.fecha_tomado = timezone.now()
+    return CorreoTicket.objects.filter(
+        pk=correo.pk, estado='en_proceso', lote=correo.lote
+    ).update(fecha_tomado=correo.fecha_tomado) == 1
+
+
+def _mensaje(correo):
+    """EmailMessage del correo o None si no se pudo generar el ticket"""
+    pedido = correo.pedido
+    pdf_bytes, _ = cache_tickets.ticket_pdf(pedido, esperar=ESPERA_PDF)
+    if not pdf_bytes:
+        return None
+    return mensaje_ticket_email(pedido, pdf_bytes, correo.email_destino)
+
+
+def enviar_lote(correos, conexion=None):
+    """
+    Envía los correos ya tomados con tomar_lote() por una sola conexión.
+    Retorna un dict con cuántos se enviaron, reintentan, fallaron o se
+    devolvieron a la cola.
+    """
+    resultado = dict.fromkeys(('enviados', 'reintentos', 'fallidos', 'devueltos'), 0)
+    if not correos:
+        return resultado
+
+    conexion = conexion or get_connection()
+    try:
+        conexion.open()
+    except ERRORES_SMTP as e:
+        # Sin servidor de correo: todo el lote espera al siguiente intento
+        for correo in correos:
+            _reintentar(correo, e)
+        resultado['reintentos'] = len(correos)
+        return resultado
+
+    try:
+        for posicion, correo in enumerate(correos):
+            if not _renovar(correo):
+                continue
+            try:
+                mensaje = _mensaje(correo)
+            except PDFNoDisponible as e:
+                _reintentar(correo, e.mensaje)
+                resultado['reintentos'] += 1
+                continue
+            except Exception as e:
+                _fallido(correo, f'Error al generar el ticket: {e}')
+                resultado['fallidos'] += 1
+                continue
+            if mensaje is None:
+                _fallido(correo, 'Error al generar el PDF del ticket')
+                resultado['fallidos'] += 1
+                continue
+
+            try:
+                conexion.send_messages([mensaje])
+            except ERRORES_CONEXION as e:
+                _reintentar(correo, e)
+                resultado['reintentos'] += 1
+                pendientes = correos[posicion + 1:]
+                _liberar(pendientes)
+                resultado['devueltos'] += len(pendientes)
+                break
+            except ERRORES_SMTP as e:
+                if _permanente(e):
+                    _fallido(correo, e, correo.intentos + 1)
+                    resultado['fallidos'] += 1
+                else:
+                    _reintentar(correo, e)
+                    resultado['reintentos'] += 1
+            else:
+                _actualizar(correo, estado='enviado', error=None, lote='',
+                            intentos=correo.intentos + 1, fecha_enviado=timezone.now())
+                resultado['enviados'] += 1
+    finally:
+        try:
+            conexion.close()
+        except ERRORES_SMTP:
+            pass
+    return resultado
+
+
+def reencolar(queryset):
+    """Vuelve a intentar correos fallidos (desde el admin o la consola)"""
+    return queryset.filter(estado='fallido').update(
+        estado='pendiente', intentos=0, error=None, lote='', disponible_desde=timezone.now())
+
+
+def metricas():
+    """Correos por estado, reintentos en espera y antigüedad del más viejo pendiente"""
+    por_estado = dict.fromkeys((estado for estado, _ in CorreoTicket.ESTADOS), 0)
+    por_estado.update(
+        CorreoTicket.objects.values_list('estado').annotate(n=Count('id')).order_by())
+    pendientes = CorreoTicket.objects.filter(estado='pendiente').aggregate(
+        reintentando=Count('id', filter=Q(intentos__gt=0)),
+        mas_antiguo=Min('fecha_creacion'),
+    )
+    antiguedad = None
+    if pendientes['mas_antiguo']:
+        antiguedad = round((timezone.now() - pendientes['mas_antiguo']).total_seconds())
+    return {
+        'por_estado': por_estado,
+        'reintentando': pendientes['reintentando'],
+        'pendiente_mas_antiguo_s': antiguedad,
+    }
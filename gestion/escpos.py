@@ -0,0 +1,151 @@
+"""
+Ticket en comandos ESC/POS para las impresoras térmicas de 80 mm.
+
+Genera directamente los bytes que entiende la impresora (texto, negritas,
+tamaño doble, QR nativo y corte de papel), sin pasar por un PDF ni por el
+visor del navegador. Lo usan la vista imprimir_ticket_escpos (descarga) y
+cualquier agente de impresión local que mande los bytes tal cual al puerto
+de la impresora:
+
+    from gestion.escpos import ticket_escpos
+    impresora.write(ticket_escpos(pedido))
+
+El contenido es el mismo que el del ticket PDF (tickets_pdf.html).
+"""
+import textwrap
+
+from django.template.defaultfilters import date as formato_fecha
+from django.utils.timezone import template_localtime
+
+from .utils import url_rastreo
+
+
+# Columnas de la fuente A en papel de 80 mm (576 puntos / 12)
+COLUMNAS = 48
+
+# Página de códigos PC850 (Multilingual): acentos, ñ y ¡
+CODIFICACION = 'cp850'
+PAGINA_CODIGOS = 2
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+INICIALIZAR = ESC + b'@'
+ALINEAR_IZQUIERDA = ESC + b'a\x00'
+ALINEAR_CENTRO = ESC + b'a\x01'
+NEGRITAS = ESC + b'E\x01'
+SIN_NEGRITAS = ESC + b'E\x00'
+TAMANO_NORMAL = GS + b'!\x00'
+DOBLE_ALTO = GS + b'!\x01'
+DOBLE_ALTO_ANCHO = GS + b'!\x11'
+SALTO = b'\n'
+# Avanza el papel hasta la cuchilla y hace corte parcial
+CORTE = GS + b'VB\x00'
+
+# Tamaño del módulo del QR en puntos (1-16) y corrección de errores L
+QR_MODULO = 6
+QR_CORRECCION = b'0'
+
+
+def _texto(texto):
+    return str(texto).encode(CODIFICACION, errors='replace')
+
+
+def _linea(texto=''):
+    return _texto(texto) + SALTO
+
+
+def _funcion_qr(funcion, datos):
+    """GS ( k con cn = 49 (QR): pL pH cn fn datos"""
+    tamano = len(datos) + 2
+    return GS + b'(k' + bytes((tamano % 256, tamano // 256, 49, funcion)) + datos
+
+
+def qr(contenido, modulo=QR_MODULO):
+    """Comandos del QR nativo de la impresora (modelo 2)"""
+    datos = _texto(contenido)
+    return b''.join((
+        _funcion_qr(65, b'2\x00'),                 # modelo 2
+        _funcion_qr(67, bytes((modulo,))),         # tamaño del módulo
+        _funcion_qr(69, QR_CORRECCION),            # nivel de corrección
+        _funcion_qr(80, b'0' + datos),             # guardar los datos
+        _funcion_qr(81, b'0'),                     # imprimir
+    ))
+
+
+def _nombre_cliente(cliente):
+    if cliente.first_name:
+        return f'{cliente.first_name} {cliente.last_name}'
+    return cliente.username
+
+
+def ticket_escpos(pedido, cortar=True):
+    """Bytes ESC/POS del ticket del pedido (usa pedido.cliente)"""
+    recepcion = formato_fecha(template_localtime(pedido.fecha_recepcion), 'd/m/Y h:i A')
+    entrega = formato_fecha(pedido.fecha_entrega_estimada, 'd/m/Y') or 'Pendiente'
+    total = f'${pedido.total}'
+    separador = '-' * COLUMNAS
+
+    partes = [
+        INICIALIZAR,
+        ESC + b't' + bytes((PAGINA_CODIGOS,)),
+
+        # Encabezado
+        ALINEAR_CENTRO,
+        DOBLE_ALTO_ANCHO, NEGRITAS, _linea('PUNTO LIMPIO'), SIN_NEGRITAS, TAMANO_NORMAL,
+        _linea('Lavandería Profesional'),
+        _linea('Av. Principal #123, Tizayuca, Hgo.'),
+        ALINEAR_IZQUIERDA,
+        _linea(separador),
+    ]
+
+    # Datos del pedido
+    for etiqueta, valor in (
+        ('Folio:', pedido.folio),
+        ('Fecha:', recepcion),
+        ('Cliente:', _nombre_cliente(pedido.cliente)),
+        ('Entrega Aprox:', entrega),
+    ):
+        partes += [NEGRITAS, _texto(etiqueta), SIN_NEGRITAS, _linea(f' {valor}')]
+    partes.append(SALTO)
+
+    # Tabla: Cant. | Descripción | Total
+    ancho_cantidad, ancho_total = 6, 12
+    ancho_descripcion = COLUMNAS - ancho_cantidad - ancho_total
+    partes += [
+        NEGRITAS,
+        _linea(f'{"Cant.":<{ancho_cantidad}}{"Descripción":<{ancho_descripcion}}'
+               f'{"Total":>{ancho_total}}'),
+        SIN_NEGRITAS,
+        _linea(separador),
+    ]
+    descripcion = textwrap.wrap(str(pedido.tipo_servicio), ancho_descripcion - 1) or ['']
+    descripcion += textwrap.wrap(
+        f'({pedido.cantidad_prendas} pzas / {pedido.peso} kg)', ancho_descripcion - 1)
+    if pedido.observaciones:
+        descripcion += textwrap.wrap(f'Nota: {pedido.observaciones}', ancho_descripcion - 1)
+    for numero, texto in enumerate(descripcion):
+        cantidad, importe = ('1', total) if numero == 0 else ('', '')
+        renglon = f'{cantidad:<{ancho_cantidad}}{texto:<{ancho_descripcion}}{importe:>{ancho_total}}'
+        partes.append(_linea(renglon.rstrip()))
+
+    # Totales
+    partes += [
+        _linea(separador),
+        _linea(f'{"Pago: " + str(pedido.metodo_pago).upper():>{COLUMNAS}}'),
+        DOBLE_ALTO, NEGRITAS,
+        _linea(f'{"TOTAL: " + total:>{COLUMNAS}}'),
+        SIN_NEGRITAS, TAMANO_NORMAL,
+        SALTO,
+
+        # QR con la URL de rastreo
+        ALINEAR_CENTRO,
+        qr(url_rastreo(pedido.folio)),
+        _linea('Escanea para rastrear'),
+        SALTO,
+        _linea('¡Gracias por tu confianza!'),
+        ALINEAR_IZQUIERDA,
+    ]
+    if cortar:
+        partes.append(CORTE)
+    return b''.join(partes)
@@ -0,0 +1,223 @@
+"""
+Archivos estáticos servidos por la propia aplicación, sin depender de un CDN
+ni de un servidor aparte.
+
+- AlmacenEstaticos: ManifestStaticFilesStorage (nombres con hash del
+  contenido) que además guarda una copia .gz y, si está instalado el paquete
+  `brotli`, una .br de cada archivo de texto al correr collectstatic.
+- EstaticosMiddleware: sirve STATIC_ROOT eligiendo la versión comprimida
+  según Accept-Encoding, responde 304 a If-None-Match y manda Cache-Control
+  de un año (immutable) para los nombres con hash.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se genera .gz
+    brotli = None
+
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.map', '.json', '.svg', '.txt',
+                            '.html', '.xml', '.ttf', '.otf', '.eot', '.ico')
+
+# Codificaciones en orden de preferencia: (Content-Encoding, extensión)
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    """Manifest con hash + copias precomprimidas (.gz y .br)"""
+
+    def stored_name(self, name):
+        # Sin collectstatic (pruebas, desarrollo con DEBUG=False) se usa el
+        # nombre sin hash en lugar de romper la página
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        nombres = set()
+        for nombre, nombre_hash, procesado in super().post_process(paths, dry_run, **options):
+            if nombre in paths:
+                nombres.add(nombre)
+            if nombre_hash:
+                nombres.add(nombre_hash)
+            yield nombre, nombre_hash, procesado
+
+        if dry_run:
+            return
+        for nombre in sorted(nombres):
+            if nombre.lower().endswith(EXTENSIONES_COMPRIMIBLES):
+                self._comprimir(nombre)
+
+    def _comprimir(self, nombre):
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+
+        versiones = {'.gz': gzip.compress(contenido, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            versiones['.br'] = brotli.compress(contenido, quality=11)
+
+        for extension, comprimido in versiones.items():
+            # Si casi no se reduce no vale la pena servirlo comprimido
+            if len(comprimido) < len(contenido) * 0.95:
+                with open(ruta + extension, 'wb') as archivo:
+                    archivo.write(comprimido)
+            elif os.path.exists(ruta + extension):
+                os.remove(ruta + extension)
+
+
+class _Estatico:
+    """Un archivo de STATIC_ROOT (o su versión comprimida) listo para servirse"""
+
+    def __init__(self, ruta, etag, tipo, codificacion=None):
+        info = os.stat(ruta)
+        self.ruta = ruta
+        self.firma = (info.st_mtime_ns, info.st_size)
+        self.tamano = info.st_size
+        self.etag = etag
+        self.tipo = tipo
+        self.codificacion = codificacion
+        self.variantes = {}
+
+    def vigente(self):
+        """False si el archivo cambió en disco (por ejemplo, otro collectstatic)"""
+        try:
+            info = os.stat(self.ruta)
+        except OSError:
+            return False
+        return (info.st_mtime_ns, info.st_size) == self.firma
+
+
+def _etag(ruta):
+    resumen = hashlib.md5(usedforsecurity=False)
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(65536), b''):
+            resumen.update(bloque)
+    return f'"{resumen.hexdigest()[:20]}"'
+
+
+def _codificaciones_aceptadas(cabecera):
+    """Codificaciones de Accept-Encoding con q > 0"""
+    aceptadas = set()
+    for parte in cabecera.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre and calidad > 0:
+            aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+class EstaticosMiddleware:
+    """
+    Sirve los archivos de STATIC_ROOT antes de pasar por el resto de los
+    middlewares (sesión, autenticación, NoCacheMiddleware).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        url = settings.STATIC_URL or ''
+        self.prefijo = None if '://' in url else '/' + url.strip('/') + '/'
+        self.raiz = str(settings.STATIC_ROOT) if getattr(settings, 'STATIC_ROOT', None) else None
+        self.max_age = getattr(settings, 'ESTATICOS_MAX_AGE', 365 * 24 * 60 * 60)
+        self._archivos = {}
+        self._con_hash = None
+
+    def __call__(self, request):
+        if (self.prefijo and self.raiz and request.method in ('GET', 'HEAD')
+                and request.path_info.startswith(self.prefijo)):
+            respuesta = self.servir(request, request.path_info[len(self.prefijo):])
+            if respuesta is not None:
+                return respuesta
+        return self.get_response(request)
+
+    def _nombres_con_hash(self):
+        """Nombres con hash según el manifest de collectstatic"""
+        if self._con_hash is None:
+            almacen = AlmacenEstaticos(location=self.raiz, base_url=settings.STATIC_URL)
+            self._con_hash = set(almacen.hashed_files.values())
+        return self._con_hash
+
+    def _buscar(self, nombre):
+        archivo = self._archivos.get(nombre)
+        if archivo is not None and archivo.vigente():
+            return archivo
+        self._con_hash = None
+
+        nombre_normal = posixpath.normpath(nombre).lstrip('/')
+        if nombre_normal != nombre or nombre.endswith(('.gz', '.br')):
+            return None
+        try:
+            ruta = safe_join(self.raiz, nombre)
+        except Exception:
+            return None
+        if not os.path.isfile(ruta):
+            return None
+
+        tipo, _ = mimetypes.guess_type(ruta)
+        if tipo and (tipo.startswith('text/') or tipo in ('application/javascript', 'application/json')):
+            tipo += '; charset=utf-8'
+        etag = _etag(ruta)
+        archivo = _Estatico(ruta, etag, tipo or 'application/octet-stream')
+        for codificacion, extension in CODIFICACIONES:
+            if os.path.isfile(ruta + extension):
+                archivo.variantes[codificacion] = _Estatico(
+                    ruta + extension, f'{etag[:-1]}-{extension[1:]}"',
+                    archivo.tipo, codificacion)
+        self._archivos[nombre] = archivo
+        return archivo
+
+    def servir(self, request, nombre):
+        archivo = self._buscar(nombre)
+        if archivo is None:
+            return None
+
+        aceptadas = _codificaciones_aceptadas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        elegido = next((archivo.variantes[codificacion]
+                        for codificacion, _ in CODIFICACIONES
+                        if codificacion in archivo.variantes and codificacion in aceptadas),
+                       archivo)
+
+        if nombre in self._nombres_con_hash():
+            cache_control = f'public, max-age={self.max_age}, immutable'
+        else:
+            # Sin hash en el nombre el contenido puede cambiar: revalidar con ETag
+            cache_control = 'public, max-age=0, must-revalidate'
+
+        etags = {archivo.etag} | {variante.etag for variante in archivo.variantes.values()}
+        solicitados = {
+            etiqueta.strip().removeprefix('W/')
+            for etiqueta in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')
+        }
+        if solicitados & etags or '*' in solicitados:
+            respuesta = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            respuesta = HttpResponse(content_type=elegido.tipo)
+            respuesta['Content-Length'] = elegido.tamano
+        else:
+            respuesta = FileResponse(open(elegido.ruta, 'rb'), content_type=elegido.tipo)
+            respuesta['Content-Length'] = elegido.tamano
+
+        respuesta['ETag'] = elegido.etag
+        respuesta['Cache-Control'] = cache_control
+        if archivo.variantes:
+            respuesta['Vary'] = 'Accept-Encoding'
+        if elegido.codificacion and respuesta.status_code == 200:
+            respuesta['Content-Encoding'] = elegido.codificacion
+        return respuesta
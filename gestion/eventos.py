@@ -0,0 +1,196 @@
+"""
+Eventos en vivo para los tableros de operación (Server-Sent Events).
+
+Los signals publican un evento pequeño en JSON cuando un pedido cambia de
+estado, una máquina se asigna o se libera, o se dispara una alerta de stock.
+El bus reparte cada evento a todas las conexiones abiertas en este proceso:
+se arma una sola vez y cada navegador solo recibe una copia en su cola, sin
+consultas a la base de datos por cliente.
+
+El bus vive en memoria, así que el servidor ASGI debe correr en un solo
+proceso (por ejemplo `uvicorn puntoLimpio.asgi:application`) para que todos
+los navegadores reciban todos los eventos.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.db import transaction
+
+
+CANALES = ('pedidos', 'maquinas', 'stock')
+
+# Eventos pendientes por conexión; si un navegador no los consume se le cierra
+# la conexión y al reconectar recupera lo perdido con Last-Event-ID
+MAX_PENDIENTES = 100
+
+# Eventos que se guardan para reenviar a quien se reconecta
+HISTORIAL = 500
+
+# Segundos entre comentarios "keep-alive" para que los proxies no corten
+LATIDO = 15
+
+# Distingue los ids de este proceso de los de un arranque anterior
+ARRANQUE = format(time.time_ns() // 1_000_000, 'x')
+
+
+class _Suscripcion:
+    """Conexión de un navegador: su cola de eventos y el loop al que pertenece"""
+
+    def __init__(self, canales, loop):
+        self.canales = canales
+        self.loop = loop
+        self.cola = asyncio.Queue(MAX_PENDIENTES)
+
+    def entregar(self, evento):
+        """Se ejecuta dentro del loop de la conexión"""
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Navegador demasiado lento: se vacía la cola y se cierra el stream
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+
+class Bus:
+    """Pub/sub en memoria; publicar() se puede llamar desde cualquier hilo"""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._suscripciones = set()
+        self._historial = deque(maxlen=HISTORIAL)
+        self._ids = itertools.count(1)
+
+    def publicar(self, canal, tipo, datos):
+        with self._candado:
+            numero = next(self._ids)
+            evento = (numero, canal, formatear(f'{ARRANQUE}-{numero}', tipo, datos))
+            self._historial.append(evento)
+            destinos = [s for s in self._suscripciones if canal in s.canales]
+
+        for suscripcion in destinos:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El loop ya se cerró (servidor apagándose)
+                self.cancelar(suscripcion)
+        return numero
+
+    def suscribir(self, canales, ultimo_id=None):
+        """
+        Registra una conexión en el loop actual. Si trae Last-Event-ID de este
+        mismo arranque se le reenvían los eventos que se perdió; si ya no
+        están en el historial recibe "sincronizar" para recargar la página.
+        """
+        suscripcion = _Suscripcion(frozenset(canales), asyncio.get_running_loop())
+        with self._candado:
+            self._suscripciones.add(suscripcion)
+            if ultimo_id:
+                arranque, _, numero = ultimo_id.partition('-')
+                primero = self._historial[0][0] if self._historial else 1
+                if arranque != ARRANQUE or not numero.isdigit() or int(numero) < primero - 1:
+                    suscripcion.entregar((0, None, formatear(None, 'sincronizar', {})))
+                else:
+                    for evento in self._historial:
+                        if evento[0] > int(numero) and evento[1] in suscripcion.canales:
+                            suscripcion.entregar(evento)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._candado:
+            self._suscripciones.discard(suscripcion)
+
+    def conexiones(self):
+        with self._candado:
+            return len(self._suscripciones)
+
+
+def formatear(identificador, tipo, datos):
+    """Bytes de un evento en el formato text/event-stream"""
+    lineas = []
+    if identificador:
+        lineas.append(f'id: {identificador}')
+    lineas.append(f'event: {tipo}')
+    lineas.append('data: ' + json.dumps(datos, separators=(',', ':'), default=str))
+    return ('\n'.join(lineas) + '\n\n').encode('utf-8')
+
+
+bus = Bus()
+
+
+def publicar(canal, tipo, datos):
+    """Publica el evento cuando se confirme la transacción en curso"""
+    transaction.on_commit(lambda: bus.publicar(canal, tipo, datos))
+
+
+async def stream(canales, ultimo_id=None):
+    """Generador asíncrono con los bytes del stream de una conexión"""
+    suscripcion = bus.suscribir(canales, ultimo_id)
+    try:
+        # Reintento del navegador (ms) si se corta la conexión
+        yield b'retry: 3000\n\n'
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), LATIDO)
+            except asyncio.TimeoutError:
+                yield b': latido\n\n'
+                continue
+            if evento is None:
+                return
+            yield evento[2]
+    finally:
+        bus.cancelar(suscripcion)
+
+
+# ========== DATOS DE LOS EVENTOS ==========
+
+def _nombre_cliente(usuario):
+    if usuario is None:
+        return ''
+    if usuario.first_name:
+        return f'{usuario.first_name} {usuario.last_name}'.strip()
+    return usuario.username
+
+
+def datos_pedido(pedido, estado_anterior=None):
+    return {
+        'id': pedido.id,
+        'folio': pedido.folio,
+        'estado': pedido.estado,
+        'anterior': estado_anterior,
+        'pago': pedido.estado_pago,
+        'servicio': pedido.tipo_servicio,
+        'cliente': _nombre_cliente(pedido.cliente),
+        'peso': pedido.peso,
+        'prendas': pedido.cantidad_prendas,
+        'entrega': pedido.fecha_entrega_estimada,
+        'origen': pedido.origen,
+    }
+
+
+def datos_maquina(maquina, estado_anterior=None):
+    pedido = maquina.pedido_actual if maquina.estado == 'ocupado' else None
+    return {
+        'id': maquina.id,
+        'nombre': maquina.nombre,
+        'tipo': maquina.tipo,
+        'estado': maquina.estado,
+        'anterior': estado_anterior,
+        'folio': pedido.folio if pedido else None,
+        'cliente': _nombre_cliente(pedido.cliente) if pedido else None,
+        'inicio': maquina.hora_inicio_uso.isoformat() if maquina.hora_inicio_uso else None,
+        'duracion': maquina.tiempo_asignado,
+    }
+
+
+def datos_insumo(insumo):
+    return {
+        'id': insumo.id,
+        'nombre': insumo.nombre,
+        'porcentaje': insumo.porcentaje,
+        'texto': f'{insumo.nombre} al {insumo.porcentaje}% de stock',
+    }
@@ -0,0 +1,92 @@
+"""
+Exportación en streaming (CSV o NDJSON) de los historiales de ventas y
+movimientos. Los renglones se leen por páginas con paginación por llave
+(fecha, id) en lugar de OFFSET y con values_list; con los índices
+(-fecha, -id) de Pedido y MovimientoOperador cada página empieza en la
+llave, así que la memoria y el tiempo por página no dependen de cuántos
+renglones haya.
+"""
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+TAMANO_PAGINA = 2000
+
+
+def recorrer_por_llave(queryset, campo_fecha, campos, tamano=TAMANO_PAGINA):
+    """
+    Recorre el queryset del más reciente al más antiguo, ordenado por
+    (campo_fecha, id), y produce tuplas con los valores de `campos`.
+    """
+    queryset = queryset.order_by(f'-{campo_fecha}', '-id')
+    ultimo = None
+    while True:
+        pagina = queryset
+        if ultimo is not None:
+            fecha, ultimo_id = ultimo
+            # El __lte deja que el índice (-fecha, -id) empiece en la página
+            # en lugar de recorrer desde el principio hasta la llave
+            pagina = pagina.filter(
+                Q(**{f'{campo_fecha}__lt': fecha}) |
+                Q(**{campo_fecha: fecha, 'id__lt': ultimo_id}),
+                **{f'{campo_fecha}__lte': fecha}
+            )
+        filas = list(pagina.values_list(campo_fecha, 'id', *campos)[:tamano])
+        for fila in filas:
+            yield fila[2:]
+        if len(filas) < tamano:
+            return
+        ultimo = filas[-1][:2]
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat(timespec='seconds')
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+class _Eco:
+    """Objeto tipo archivo que regresa lo escrito, para usar csv.writer en streaming"""
+
+    def write(self, valor):
+        return valor
+
+
+def _renglones_csv(encabezados, filas):
+    writer = csv.writer(_Eco())
+    # BOM para que Excel abra bien los acentos
+    yield '\ufeff' + writer.writerow(encabezados)
+    for fila in filas:
+        yield writer.writerow([_texto(valor) for valor in fila])
+
+
+def _renglones_ndjson(encabezados, filas):
+    for fila in filas:
+        registro = dict(zip(encabezados, (_texto(valor) for valor in fila)))
+        yield json.dumps(registro, ensure_ascii=False) + '\n'
+
+
+def respuesta_exportacion(nombre, formato, encabezados, filas):
+    """StreamingHttpResponse en CSV (por defecto) o NDJSON"""
+    if formato == 'ndjson':
+        response = StreamingHttpResponse(
+            _renglones_ndjson(encabezados, filas),
+            content_type='application/x-ndjson; charset=utf-8')
+        extension = 'ndjson'
+    else:
+        response = StreamingHttpResponse(
+            _renglones_csv(encabezados, filas),
+            content_type='text/csv; charset=utf-8')
+        extension = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{extension}"'
+    return response
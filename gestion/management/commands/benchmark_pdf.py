@@ -0,0 +1,88 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gestion.models import Pedido
+from gestion.pdf import MOTORES, servicio
+from gestion.utils import render_pdf_ticket, qr_png, qr_data_uri
+from usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = ('Mide cuánto tarda en generarse cada ticket PDF con cada motor '
+            '(reportlab: dibujo directo; html: plantilla + xhtml2pdf). Usa los '
+            'últimos pedidos registrados o, si no hay, pedidos de ejemplo sin '
+            'guardarlos. No usa ni modifica el caché de tickets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=20,
+                            help='Tickets por motor (por defecto 20)')
+        parser.add_argument('--motor', choices=MOTORES, action='append',
+                            help='Motor a medir (se puede repetir; por defecto todos)')
+
+    def _pedidos(self, cantidad):
+        pedidos = list(Pedido.objects.select_related('cliente').order_by('-id')[:cantidad])
+        if pedidos:
+            return pedidos
+
+        cliente = Usuario(username='cliente_prueba', first_name='Cliente', last_name='De Prueba')
+        ahora = timezone.now()
+        return [
+            Pedido(
+                id=numero, folio=f'PL-PRUEBA-{numero:04d}', cliente=cliente,
+                tipo_servicio='Lavado por kilo', peso=Decimal('4.50'),
+                cantidad_prendas=12, total=Decimal('157.50'), metodo_pago='efectivo',
+                fecha_recepcion=ahora, fecha_entrega_estimada=ahora.date() + timedelta(days=2),
+                observaciones='Separar prendas blancas' if numero % 2 else '',
+            )
+            for numero in range(1, cantidad + 1)
+        ]
+
+    def handle(self, *args, **options):
+        if options['tickets'] < 1:
+            raise CommandError('--tickets debe ser al menos 1')
+        pedidos = self._pedidos(options['tickets'])
+        motores = options['motor'] or MOTORES
+
+        # Procesos de xhtml2pdf ya calentados, como en el servidor (si siguen
+        # arrancando le quitan CPU a la medición)
+        servicio().iniciar(esperar=True)
+
+        self.stdout.write(f'{len(pedidos)} tickets por motor\n')
+        resultados = {}
+        for motor in motores:
+            # Primer ticket fuera de la medición (importaciones, fuentes)
+            render_pdf_ticket(pedidos[0], motor=motor, esperar=True)
+            # Cada motor genera sus propios QR, como con un folio nuevo
+            qr_png.cache_clear()
+            qr_data_uri.cache_clear()
+
+            tiempos = []
+            tamano = 0
+            for pedido in pedidos:
+                inicio = time.perf_counter()
+                contenido = render_pdf_ticket(pedido, motor=motor, esperar=True)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                if contenido is None:
+                    raise CommandError(f'El motor {motor} no pudo generar el ticket {pedido.folio}')
+                tamano += len(contenido)
+
+            tiempos.sort()
+            resultados[motor] = statistics.mean(tiempos)
+            self.stdout.write(
+                f'{motor:<10} promedio {statistics.mean(tiempos):8.1f} ms   '
+                f'p50 {statistics.median(tiempos):8.1f} ms   '
+                f'p95 {tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]:8.1f} ms   '
+                f'máx {tiempos[-1]:8.1f} ms   '
+                f'{tamano / len(pedidos) / 1024:6.1f} KB por ticket'
+            )
+
+        if len(resultados) == 2 and resultados['reportlab']:
+            self.stdout.write(self.style.SUCCESS(
+                f'\nreportlab es {resultados["html"] / resultados["reportlab"]:.1f}x '
+                f'más rápido que html por ticket'
+            ))
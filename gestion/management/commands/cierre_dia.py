@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from gestion import cache_reportes
+from gestion.models import Pedido, VentaDiaria, CorteCaja, CierreDia
+from gestion.reportes import (
+    METODOS_PAGO, PRENDAS_PDF, hoy_local, filtro_rango, calcular_periodo,
+    resumen_financiero, pdf_reporte_financiero
+)
+
+
+class Command(BaseCommand):
+    help = ('Cierra el día anterior (o un rango con --desde/--hasta): corrige '
+            'los resúmenes diarios y los totales por método contra los pedidos, '
+            'guarda los totales del sistema en los cortes de caja y deja generados '
+            'los PDF de finanzas del día y del mes. Se puede repetir sin efectos '
+            'y retoma lo pendiente.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día a cerrar YYYY-MM-DD (por defecto ayer)')
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD para llenar historia')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (por defecto ayer)')
+        parser.add_argument('--forzar', action='store_true',
+                            help='Vuelve a cerrar días que ya estaban completados')
+        parser.add_argument('--sin-reportes', action='store_true',
+                            help='No genera los PDF de finanzas')
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor}')
+
+    def handle(self, *args, **options):
+        ayer = hoy_local() - timedelta(days=1)
+        if options['fecha']:
+            desde = hasta = self._fecha(options['fecha'])
+        else:
+            hasta = self._fecha(options['hasta']) or ayer
+            desde = self._fecha(options['desde']) or hasta
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        cerrados = CierreDia.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        if not options['forzar']:
+            completados = set(cerrados.filter(
+                estado='completado').values_list('fecha', flat=True))
+            con_totales = set(cerrados.filter(
+                estado='totales').values_list('fecha', flat=True))
+        else:
+            completados, con_totales = set(), set()
+
+        dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+        pendientes = [dia for dia in dias if dia not in completados]
+        if not pendientes:
+            self.stdout.write(self.style.SUCCESS(
+                f'Sin días pendientes entre {desde} y {hasta}.'))
+            return
+
+        sin_totales = [dia for dia in pendientes if dia not in con_totales]
+        if sin_totales:
+            self._cerrar_totales(sin_totales[0], sin_totales[-1], set(sin_totales))
+
+        # Solo se generan los PDF del último día: son los que se consultan a
+        # la mañana siguiente; al llenar historia no vale la pena hacer uno por día
+        if not options['sin_reportes']:
+            self._generar_reportes(pendientes[-1], ayer)
+
+        CierreDia.objects.filter(fecha__in=pendientes).update(estado='completado')
+        self.stdout.write(self.style.SUCCESS(
+            f'Cierre completado: {len(pendientes)} días ({pendientes[0]} a {pendientes[-1]}).'))
+
+    def _cerrar_totales(self, desde, hasta, dias):
+        """Totales del rango en una sola pasada, leídos y guardados en una transacción"""
+        with transaction.atomic():
+            # Bloquea las filas de VentaDiaria de los días (las que actualiza
+            # VentaDiaria.acumular al pagar) antes de leer los pedidos: lo que
+            # otro pago sume después se aplica sobre la corrección
+            resumen = VentaDiaria.objects.filter(fecha__in=dias)
+            list(resumen.select_for_update().values_list('pk', flat=True))
+
+            # Lo que debería haber en VentaDiaria, calculado desde los pedidos
+            filas = Pedido.objects.filter(
+                estado_pago='pagado',
+                **filtro_rango('fecha_recepcion', desde, hasta)
+            ).annotate(
+                dia=TruncDate('fecha_recepcion')
+            ).values(
+                'dia', 'metodo_pago', 'tipo_servicio', 'origen'
+            ).annotate(
+                num_pedidos=Count('id'),
+                suma_total=Sum('total')
+            ).order_by()
+
+            esperado = {}
+            for fila in filas:
+                if fila['dia'] in dias:
+                    clave = (fila['dia'], fila['metodo_pago'],
+                             fila['tipo_servicio'], fila['origen'])
+                    esperado[clave] = (fila['num_pedidos'], fila['suma_total'])
+
+            actual = {
+                (fecha, metodo, servicio, origen): (cantidad, total)
+                for fecha, metodo, servicio, origen, cantidad, total in resumen.values_list(
+                    'fecha', 'metodo_pago', 'tipo_servicio', 'origen', 'cantidad', 'total')
+                if cantidad or total
+            }
+            diferencias = [
+                clave for clave in esperado.keys() | actual.keys()
+                if esperado.get(clave) != actual.get(clave)
+            ]
+            dias_corregidos = sorted({clave[0] for clave in diferencias})
+
+            # Totales por día y método de pago
+            totales = {dia: {metodo: Decimal('0') for metodo in METODOS_PAGO} for dia in dias}
+            pedidos = dict.fromkeys(dias, 0)
+            for (dia, metodo, _, _), (cantidad, total) in esperado.items():
+                if metodo in totales[dia]:
+                    totales[dia][metodo] += total
+                pedidos[dia] += cantidad
+
+            # Cada fila se corrige sumando la diferencia, como en acumular()
+            for clave in diferencias:
+                fecha, metodo, servicio, origen = clave
+                cantidad, total = esperado.get(clave, (0, Decimal('0')))
+                registrada, registrado = actual.get(clave, (0, Decimal('0')))
+                fila, _ = VentaDiaria.objects.get_or_create(
+                    fecha=fecha, metodo_pago=metodo, tipo_servicio=servicio, origen=origen)
+                VentaDiaria.objects.filter(pk=fila.pk).update(
+                    cantidad=F('cantidad') + (cantidad - registrada),
+                    total=F('total') + (total - registrado),
+                )
+            for fecha in dias_corregidos:
+                transaction.on_commit(
+                    lambda fecha=fecha: cache_reportes.invalidar(fecha))
+
+            CierreDia.objects.filter(fecha__in=dias).delete()
+            CierreDia.objects.bulk_create([
+                CierreDia(
+                    fecha=dia,
+                    num_pedidos=pedidos[dia],
+                    ventas_efectivo=totales[dia]['efectivo'],
+                    ventas_tarjeta=totales[dia]['tarjeta'],
+                    ventas_transferencia=totales[dia]['transferencia'],
+                    total_ventas=sum(totales[dia].values(), Decimal('0')),
+                    estado='totales',
+                )
+                for dia in dias
+            ], batch_size=1000)
+
+            # Totales del sistema en los cortes de cada responsable
+            cortes = list(CorteCaja.objects.filter(fecha__in=dias))
+            for corte in cortes:
+                ventas = totales[corte.fecha]
+                corte.ventas_efectivo = ventas['efectivo']
+                corte.ventas_tarjeta = ventas['tarjeta']
+                corte.ventas_transferencia = ventas['transferencia']
+                corte.total_ventas = sum(ventas.values(), Decimal('0'))
+                corte.diferencia = corte.total_fisico - corte.total_ventas
+            CorteCaja.objects.bulk_update(cortes, [
+                'ventas_efectivo', 'ventas_tarjeta', 'ventas_transferencia',
+                'total_ventas', 'diferencia'
+            ], batch_size=1000)
+
+        # El resumen por prenda se reconstruye para el rango (una consulta)
+        call_command('reconstruir_ventas_prendas', desde=str(desde),
+                     hasta=str(hasta), stdout=self.stdout)
+        call_command('conciliar_totales_pago', desde=str(desde),
+                     hasta=str(hasta), reparar=True, stdout=self.stdout)
+
+        self.stdout.write(
+            f'Totales de {len(dias)} días guardados; {len(cortes)} cortes actualizados; '
+            f'{len(dias_corregidos)} días corregidos en VentaDiaria.')
+
+    def _generar_reportes(self, dia, ayer):
+        """PDF de finanzas del día y del mes hasta ese día (quedan en caché)"""
+        periodos = {(dia, dia), (dia.replace(day=1), dia)}
+        if dia == ayer:
+            # Lo que pedirán los filtros "hoy" y "mes" de la vista en la mañana
+            periodos.add(calcular_periodo('hoy'))
+            periodos.add(calcular_periodo('mes'))
+
+        for fecha_inicio, fecha_fin in sorted(periodos):
+            # El mismo resumen que imprimir_reporte_finanzas, o la vista no lo encuentra
+            resumen = resumen_financiero(fecha_inicio, fecha_fin, limite_prendas=PRENDAS_PDF)
+            if pdf_reporte_financiero(resumen, esperar=True) is None:
+                raise CommandError(
+                    f'No se pudo generar el PDF de {fecha_inicio} a {fecha_fin}')
+            self.stdout.write(f'PDF de finanzas {fecha_inicio} a {fecha_fin} listo.')
@@ -0,0 +1,95 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from gestion.models import Pedido, TotalPagoDiario
+from gestion.reportes import rango_dias
+
+
+class Command(BaseCommand):
+    help = ('Compara TotalPagoDiario contra los pedidos pagados y, con '
+            '--reparar, corrige los días y métodos de pago con diferencias')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (inclusive)')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (inclusive)')
+        parser.add_argument('--reparar', action='store_true',
+                            help='Corrige las diferencias encontradas')
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor}')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'])
+        hasta = self._fecha(options['hasta'])
+
+        pedidos = Pedido.objects.filter(estado_pago='pagado')
+        totales = TotalPagoDiario.objects.all()
+        if desde:
+            pedidos = pedidos.filter(fecha_recepcion__gte=rango_dias(desde)[0])
+            totales = totales.filter(fecha__gte=desde)
+        if hasta:
+            pedidos = pedidos.filter(fecha_recepcion__lt=rango_dias(hasta)[1])
+            totales = totales.filter(fecha__lte=hasta)
+
+        with transaction.atomic():
+            if options['reparar']:
+                # Las filas del rango quedan bloqueadas hasta terminar: un pago
+                # que ya las tocó se confirma antes de leer los pedidos, y uno
+                # nuevo espera y suma su parte después de la corrección
+                list(totales.select_for_update().values_list('pk', flat=True))
+
+            # Lo que debería haber, calculado desde los pedidos
+            esperado = {
+                (fila['dia'], fila['metodo_pago']): (fila['num_pedidos'], fila['suma_total'])
+                for fila in pedidos.annotate(
+                    dia=TruncDate('fecha_recepcion')
+                ).values('dia', 'metodo_pago').annotate(
+                    num_pedidos=Count('id'),
+                    suma_total=Sum('total')
+                ).order_by()
+            }
+            actual = {
+                (fecha, metodo): (cantidad, total)
+                for fecha, metodo, cantidad, total in totales.values_list(
+                    'fecha', 'metodo_pago', 'cantidad', 'total')
+                if cantidad or total
+            }
+
+            diferencias = sorted(
+                clave for clave in esperado.keys() | actual.keys()
+                if esperado.get(clave) != actual.get(clave)
+            )
+            for fecha, metodo in diferencias:
+                self.stdout.write(
+                    f'{fecha} {metodo}: esperado={esperado.get((fecha, metodo))} '
+                    f'registrado={actual.get((fecha, metodo))}')
+
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS('TotalPagoDiario es consistente.'))
+                return
+            if not options['reparar']:
+                raise CommandError(
+                    f'{len(diferencias)} diferencias entre TotalPagoDiario y los pedidos '
+                    '(use --reparar para corregirlas).')
+
+            # La corrección se suma como diferencia, igual que acumular(), para
+            # no pisar lo que otro pago sume a la misma fila
+            for fecha, metodo in diferencias:
+                cantidad, total = esperado.get((fecha, metodo), (0, Decimal('0')))
+                registrada, registrado = actual.get((fecha, metodo), (0, Decimal('0')))
+                fila, _ = TotalPagoDiario.objects.get_or_create(fecha=fecha, metodo_pago=metodo)
+                TotalPagoDiario.objects.filter(pk=fila.pk).update(
+                    cantidad=F('cantidad') + (cantidad - registrada),
+                    total=F('total') + (total - registrado),
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'TotalPagoDiario reparado: {len(diferencias)} filas corregidas.'))
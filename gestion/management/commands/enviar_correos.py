@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion.correos import (
+    TAMANO_LOTE, tomar_lote, enviar_lote, recuperar_abandonados, metricas
+)
+
+
+class Command(BaseCommand):
+    help = ('Envía los tickets por correo de la bandeja de salida (CorreoTicket) '
+            'en lotes, con una sola conexión SMTP por lote')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=TAMANO_LOTE,
+            help='Correos que se envían por cada conexión SMTP')
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando la bandeja está vacía')
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Envía lo que haya disponible y termina')
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        totales = dict.fromkeys(('enviados', 'reintentos', 'fallidos', 'devueltos'), 0)
+
+        self.stdout.write(f'Worker de correos iniciado (lotes de {lote}).')
+        while True:
+            close_old_connections()
+            recuperados = recuperar_abandonados()
+            if recuperados:
+                self.stdout.write(f'{recuperados} correos abandonados vuelven a la cola')
+
+            correos = tomar_lote(lote)
+            if not correos:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            resultado = enviar_lote(correos)
+            self.stdout.write(
+                f"Lote de {len(correos)}: {resultado['enviados']} enviados, "
+                f"{resultado['reintentos']} por reintentar, {resultado['fallidos']} fallidos")
+            for clave, cantidad in resultado.items():
+                totales[clave] += cantidad
+            # Devueltos por caída de la conexión: esperar antes de reconectar
+            if resultado['devueltos']:
+                time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Correos enviados: {totales['enviados']}, por reintentar: "
+            f"{totales['reintentos']}, fallidos: {totales['fallidos']}"))
+        self.stdout.write(f"Bandeja: {metricas()['por_estado']}")
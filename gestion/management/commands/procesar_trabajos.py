@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from gestion.trabajos import tomar_trabajo, ejecutar_trabajo, recuperar_abandonados
+
+
+def _ejecutar_en_hilo(trabajo):
+    try:
+        ejecutar_trabajo(trabajo)
+    finally:
+        # Cada hilo abre su propia conexión; cerrarla al terminar
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de reportes por correo (TrabajoReporte) con varios hilos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos', type=int,
+            default=getattr(settings, 'TRABAJOS_HILOS', 2),
+            help='Trabajos que se procesan al mismo tiempo')
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Procesa lo que haya disponible y termina')
+
+    def handle(self, *args, **options):
+        hilos = max(1, options['hilos'])
+        en_curso = set()
+        procesados = 0
+
+        self.stdout.write(f'Worker de reportes iniciado con {hilos} hilos.')
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            while True:
+                close_old_connections()
+                recuperados = recuperar_abandonados()
+                if recuperados:
+                    self.stdout.write(f'{recuperados} trabajos abandonados vuelven a la cola')
+
+                # Llenar los hilos libres con trabajos disponibles
+                while len(en_curso) < hilos:
+                    trabajo = tomar_trabajo()
+                    if trabajo is None:
+                        break
+                    self.stdout.write(
+                        f'Procesando trabajo {trabajo.id} -> {trabajo.email_destino}')
+                    en_curso.add(pool.submit(_ejecutar_en_hilo, trabajo))
+
+                if not en_curso:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                terminados, en_curso = wait(
+                    en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                procesados += len(terminados)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Trabajos procesados: {procesados}'))
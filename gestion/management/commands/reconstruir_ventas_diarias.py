@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from gestion import cache_dashboard, cache_reportes
+from gestion.models import Pedido, VentaDiaria
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla VentaDiaria a partir de los pedidos pagados'
+
+    def handle(self, *args, **options):
+        filas = Pedido.objects.filter(
+            estado_pago='pagado'
+        ).annotate(
+            dia=TruncDate('fecha_recepcion')
+        ).values(
+            'dia', 'metodo_pago', 'tipo_servicio', 'origen'
+        ).annotate(
+            num_pedidos=Count('id'),
+            suma_total=Sum('total')
+        ).order_by()
+
+        with transaction.atomic():
+            VentaDiaria.objects.all().delete()
+            creadas = VentaDiaria.objects.bulk_create([
+                VentaDiaria(
+                    fecha=fila['dia'],
+                    metodo_pago=fila['metodo_pago'],
+                    tipo_servicio=fila['tipo_servicio'],
+                    origen=fila['origen'],
+                    cantidad=fila['num_pedidos'],
+                    total=fila['suma_total'],
+                )
+                for fila in filas.iterator()
+            ], batch_size=1000)
+
+        # Los reportes y la serie de ventas se calcularon con el resumen anterior
+        cache_reportes.invalidar()
+        cache_dashboard.invalidar('ganancias')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'VentaDiaria reconstruida: {len(creadas)} filas.'))
@@ -0,0 +1,97 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from gestion import cache_dashboard, cache_reportes
+from gestion.models import DetallePedido, VentaPrendaDiaria
+
+
+class Command(BaseCommand):
+    help = ('Compara VentaPrendaDiaria contra DetallePedido/Pedido en un rango '
+            'de fechas y, si se indica, reconstruye el resumen de ese rango')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (inclusive)')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (inclusive)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Solo reporta diferencias, no modifica nada')
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor}')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'])
+        hasta = self._fecha(options['hasta'])
+
+        lineas = DetallePedido.objects.filter(
+            pedido__estado_pago='pagado',
+            prenda__isnull=False
+        ).annotate(dia=TruncDate('pedido__fecha_recepcion'))
+        resumen = VentaPrendaDiaria.objects.all()
+        if desde:
+            lineas = lineas.filter(dia__gte=desde)
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            lineas = lineas.filter(dia__lte=hasta)
+            resumen = resumen.filter(fecha__lte=hasta)
+
+        with transaction.atomic():
+            if not options['verificar']:
+                # Bloquea las filas del rango (las mismas que actualiza
+                # VentaPrendaDiaria.acumular) antes de leer las líneas: lo que
+                # otra línea sume después se aplica sobre la corrección
+                list(resumen.select_for_update().values_list('pk', flat=True))
+
+            # Lo que debería haber, calculado desde las tablas originales
+            esperado = {
+                (fila['dia'], fila['prenda_id']): (fila['suma_cantidad'], fila['suma_subtotal'])
+                for fila in lineas.values('dia', 'prenda_id').annotate(
+                    suma_cantidad=Sum('cantidad'),
+                    suma_subtotal=Sum('subtotal')
+                ).order_by()
+            }
+            actual = {
+                (fecha, prenda_id): (cantidad, subtotal)
+                for fecha, prenda_id, cantidad, subtotal in resumen.values_list(
+                    'fecha', 'prenda_id', 'cantidad', 'subtotal')
+                if cantidad or subtotal
+            }
+
+            diferencias = [
+                clave for clave in esperado.keys() | actual.keys()
+                if esperado.get(clave) != actual.get(clave)
+            ]
+            for fecha, prenda_id in sorted(diferencias):
+                self.stdout.write(
+                    f'{fecha} prenda={prenda_id}: esperado={esperado.get((fecha, prenda_id))} '
+                    f'resumen={actual.get((fecha, prenda_id))}')
+
+            if options['verificar']:
+                if diferencias:
+                    raise CommandError(
+                        f'{len(diferencias)} diferencias entre VentaPrendaDiaria y los pedidos.')
+                self.stdout.write(self.style.SUCCESS('VentaPrendaDiaria es consistente.'))
+                return
+
+            # Cada fila se corrige sumando la diferencia, no reemplazándola:
+            # así no se pierde lo que otra línea sume a la misma fila
+            for fecha, prenda_id in diferencias:
+                cantidad, subtotal = esperado.get((fecha, prenda_id), (0, Decimal('0')))
+                registrada, registrado = actual.get((fecha, prenda_id), (0, Decimal('0')))
+                VentaPrendaDiaria.acumular(
+                    fecha, (prenda_id, cantidad - registrada, subtotal - registrado), 1)
+
+        # Los reportes y la serie de ventas se calcularon con el resumen anterior
+        cache_reportes.invalidar()
+        cache_dashboard.invalidar('ganancias')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'VentaPrendaDiaria reconstruida: {len(esperado)} filas '
+            f'({len(diferencias)} corregidas).'))
@@ -3,7 +3,8 @@ from django.utils.deprecation import MiddlewareMixin
 
 class NoCacheMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
-        if request.user.is_authenticated:
+        # Las vistas que manejan su propio caché (ETag) mandan su Cache-Control
+        if request.user.is_authenticated and not response.has_header('Cache-Control'):
             # Ordena al navegador NO guardar copia de las páginas
             response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
             response['Pragma'] = 'no-cache'
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:55
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_ventas_diarias(apps, schema_editor):
+    Pedido = apps.get_model('gestion', 'Pedido')
+    VentaDiaria = apps.get_model('gestion', 'VentaDiaria')
+
+    filas = Pedido.objects.filter(
+        estado_pago='pagado'
+    ).annotate(
+        dia=TruncDate('fecha_recepcion')
+    ).values(
+        'dia', 'metodo_pago', 'tipo_servicio', 'origen'
+    ).annotate(
+        num_pedidos=Count('id'),
+        suma_total=Sum('total')
+    ).order_by()
+
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(
+            fecha=fila['dia'],
+            metodo_pago=fila['metodo_pago'],
+            tipo_servicio=fila['tipo_servicio'],
+            origen=fila['origen'],
+            cantidad=fila['num_pedidos'],
+            total=fila['suma_total'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_configuracionnegocio_remove_movimientoinsumo_insumo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('tipo_servicio', models.CharField(max_length=50)),
+                ('origen', models.CharField(max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'metodo_pago', 'tipo_servicio', 'origen')},
+            },
+        ),
+        migrations.RunPython(poblar_ventas_diarias,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_ventas_prendas(apps, schema_editor):
+    DetallePedido = apps.get_model('gestion', 'DetallePedido')
+    VentaPrendaDiaria = apps.get_model('gestion', 'VentaPrendaDiaria')
+
+    filas = DetallePedido.objects.filter(
+        pedido__estado_pago='pagado',
+        prenda__isnull=False
+    ).annotate(
+        dia=TruncDate('pedido__fecha_recepcion')
+    ).values(
+        'dia', 'prenda_id'
+    ).annotate(
+        suma_cantidad=Sum('cantidad'),
+        suma_subtotal=Sum('subtotal')
+    ).order_by()
+
+    VentaPrendaDiaria.objects.bulk_create([
+        VentaPrendaDiaria(
+            fecha=fila['dia'],
+            prenda_id=fila['prenda_id'],
+            cantidad=fila['suma_cantidad'],
+            subtotal=fila['suma_subtotal'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaPrendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('prenda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gestion.prenda')),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria por Prenda',
+                'verbose_name_plural': 'Ventas Diarias por Prenda',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'prenda')},
+            },
+        ),
+        migrations.RunPython(poblar_ventas_prendas,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_indices_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('num_pedidos', models.PositiveIntegerField(default=0)),
+                ('ventas_efectivo', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ventas_tarjeta', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ventas_transferencia', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('estado', models.CharField(choices=[('totales', 'Totales calculados'), ('completado', 'Completado')], default='totales', max_length=20)),
+                ('fecha_cierre', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cierre de Día',
+                'verbose_name_plural': 'Cierres de Día',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
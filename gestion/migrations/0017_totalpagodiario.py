@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:15
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def poblar_totales_pago(apps, schema_editor):
+    VentaDiaria = apps.get_model('gestion', 'VentaDiaria')
+    TotalPagoDiario = apps.get_model('gestion', 'TotalPagoDiario')
+
+    filas = VentaDiaria.objects.values(
+        'fecha', 'metodo_pago'
+    ).annotate(
+        suma_cantidad=Sum('cantidad'),
+        suma_total=Sum('total')
+    ).order_by()
+
+    TotalPagoDiario.objects.bulk_create([
+        TotalPagoDiario(
+            fecha=fila['fecha'],
+            metodo_pago=fila['metodo_pago'],
+            cantidad=fila['suma_cantidad'],
+            total=fila['suma_total'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_cierredia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotalPagoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Total de Pago Diario',
+                'verbose_name_plural': 'Totales de Pago Diarios',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'metodo_pago')},
+            },
+        ),
+        migrations.RunPython(poblar_totales_pago,
+                             migrations.RunPython.noop),
+    ]
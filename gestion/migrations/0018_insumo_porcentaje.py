@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:00
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_totalpagodiario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insumo',
+            name='porcentaje',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(capacidad_maxima__gt=0, then=django.db.models.functions.comparison.Cast(django.db.models.functions.math.Floor(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('stock_actual'), '*', models.Value(100)), '/', models.F('capacidad_maxima')), 6)), models.IntegerField())), default=models.Value(0)), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='insumo',
+            index=models.Index(fields=['porcentaje'], name='insumo_porcentaje_idx'),
+        ),
+    ]
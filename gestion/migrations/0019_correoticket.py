@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_insumo_porcentaje'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_destino', models.EmailField(max_length=254)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('max_intentos', models.IntegerField(default=5)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('lote', models.CharField(blank=True, max_length=32)),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='No se procesa antes de esta hora (reintentos)')),
+                ('fecha_tomado', models.DateTimeField(blank=True, null=True)),
+                ('fecha_enviado', models.DateTimeField(blank=True, null=True)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='correos_ticket', to='gestion.pedido')),
+            ],
+            options={
+                'verbose_name': 'Correo de Ticket',
+                'verbose_name_plural': 'Correos de Ticket',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='gestion_cor_estado_53dae4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_correoticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='fecha_tomado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
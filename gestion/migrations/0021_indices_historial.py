@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0020_trabajoreporte_fecha_tomado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientooperador',
+            index=models.Index(fields=['-fecha', '-id'], name='movimiento_historial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha_recepcion', '-id'], name='pedido_historial_idx'),
+        ),
+    ]
@@ -1,7 +1,13 @@
+from decimal import Decimal
 from usuarios.models import Usuario
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Floor, Round
 from django.conf import settings
+from functools import partial
+
+from . import cache_reportes
 
 
 # Esta función es para crear la tabla de insumos que funcionará como un inventario/vista
@@ -31,18 +37,45 @@ class Insumo(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
-    def porcentaje(self):
-        if self.capacidad_maxima > 0:
-            return int((self.stock_actual / self.capacidad_maxima) * 100)
+    # Porcentaje de llenado (entero, truncado) calculado y guardado por la
+    # base de datos, para filtrar el stock crítico con un índice:
+    # Insumo.objects.filter(porcentaje__lte=PORCENTAJE_CRITICO)
+    porcentaje = models.GeneratedField(
+        expression=Case(
+            When(capacidad_maxima__gt=0, then=Cast(
+                # Round antes de Floor para que 0.29 * 100 no quede en 28.99...
+                Floor(Round(F('stock_actual') * 100 / F('capacidad_maxima'), 6)),
+                models.IntegerField()
+            )),
+            default=Value(0),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    PORCENTAJE_CRITICO = 10
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['porcentaje'], name='insumo_porcentaje_idx'),
+        ]
+
+    def _porcentaje(self):
+        """porcentaje guardado; sin guardar todavía, calculado aquí con la misma regla"""
+        if self.pk is not None:
+            return self.porcentaje
+        capacidad = Decimal(str(self.capacidad_maxima))
+        if capacidad > 0:
+            return int(Decimal(str(self.stock_actual)) / capacidad * 100)
         return 0
 
     def estado_alerta(self):
         """Devuelve True si el stock es crítico (menor o igual al 10%)"""
-        return self.porcentaje() <= 10
+        return self._porcentaje() <= self.PORCENTAJE_CRITICO
 
     def color_barra(self):
-        p = self.porcentaje()
-        if p <= 10:
+        p = self._porcentaje()
+        if p <= self.PORCENTAJE_CRITICO:
             return 'nivel-bajo'
         if p <= 40:
             return 'nivel-medio'
@@ -199,10 +232,67 @@ class Pedido(models.Model):
     fecha_entrega_estimada = models.DateField(blank=True, null=True)
     fecha_entrega_real = models.DateTimeField(blank=True, null=True)
 
+    # Campos de los que depende la aportación del pedido a VentaDiaria
+    CAMPOS_VENTA = ('fecha_recepcion', 'metodo_pago', 'tipo_servicio',
+                    'origen', 'total', 'estado_pago')
+
     class Meta:
         ordering = ['-fecha_recepcion']
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
+        indexes = [
+            # Ventas pagadas por rango de fechas (dashboard, corte, reportes)
+            models.Index(fields=['estado_pago', 'fecha_recepcion']),
+            # Servicios por estado y fecha
+            models.Index(fields=['estado', 'fecha_recepcion']),
+            # Pedidos de un cliente por estado
+            models.Index(fields=['cliente', 'estado']),
+            # Páginas del historial por llave (fecha_recepcion, id)
+            models.Index(fields=['-fecha_recepcion', '-id'], name='pedido_historial_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordar su estado, para avisar a los tableros solo cuando cambie
+        if 'estado' in field_names and 'estado_pago' in field_names:
+            instance._estado_original = (instance.estado, instance.estado_pago)
+        return instance
+
+    def clave_venta(self):
+        """
+        Devuelve (fecha local, metodo_pago, tipo_servicio, origen, total) con
+        la que el pedido suma en VentaDiaria, o None si no está pagado.
+        """
+        if self.estado_pago != 'pagado':
+            return None
+        return (
+            timezone.localdate(self.fecha_recepcion),
+            self.metodo_pago,
+            self.tipo_servicio,
+            self.origen,
+            Decimal(str(self.total)),
+        )
+
+    def _venta_guardada(self, bloquear=False):
+        """
+        Aportación a VentaDiaria del pedido tal como está en la base de datos
+        (no como se leyó: otra copia del mismo pedido pudo guardarse después).
+        Con bloquear=True la fila queda bloqueada hasta el final de la
+        transacción, para que dos guardados del mismo pedido no se crucen.
+        """
+        if self._state.adding:
+            return None
+        guardado = Pedido.objects.filter(pk=self.pk)
+        if bloquear:
+            guardado = guardado.select_for_update()
+        guardado = guardado.only(*self.CAMPOS_VENTA).first()
+        return guardado.clave_venta() if guardado else None
+
+    def fecha_venta(self, bloquear=False):
+        """Fecha local con la que el pedido cuenta en los resúmenes (None si no está pagado)"""
+        venta = self._venta_guardada(bloquear)
+        return venta[0] if venta else None
 
     def save(self, *args, **kwargs):
         if not self.folio:
@@ -213,12 +303,120 @@ class Pedido(models.Model):
             random_part = ''.join(random.choices(
                 string.ascii_uppercase + string.digits, k=4))
             self.folio = f"CK-{year}-{random_part}"
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            nuevo = self._state.adding
+            anterior = self._venta_guardada(bloquear=True)
+            # Para los signals de post_save (dashboard)
+            self._venta_anterior = anterior
+            super().save(*args, **kwargs)
+            actual = self.clave_venta()
+            if anterior != actual:
+                VentaDiaria.acumular(anterior, -1)
+                VentaDiaria.acumular(actual, 1)
+                TotalPagoDiario.mover(anterior, actual)
+
+                # Las prendas solo dependen de la fecha y de si está pagado
+                fecha_anterior = anterior[0] if anterior else None
+                fecha_actual = actual[0] if actual else None
+                if not nuevo and fecha_anterior != fecha_actual:
+                    VentaPrendaDiaria.mover_pedido(
+                        self, fecha_anterior, fecha_actual)
 
     def __str__(self):
         return f"{self.folio} - {self.cliente.username} - {self.tipo_servicio}"
 
 
+class VentaDiaria(models.Model):
+    """
+    Resumen diario de las ventas pagadas. Se actualiza en la misma
+    transacción en la que se guarda cada Pedido, para que los reportes
+    de finanzas lean unas cuantas filas por día en lugar de todos los pedidos.
+    """
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=20)
+    tipo_servicio = models.CharField(max_length=50)
+    origen = models.CharField(max_length=20)
+
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Venta Diaria'
+        verbose_name_plural = 'Ventas Diarias'
+        unique_together = ['fecha', 'metodo_pago', 'tipo_servicio', 'origen']
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} - {self.metodo_pago} - {self.tipo_servicio}: ${self.total}"
+
+    @classmethod
+    def acumular(cls, clave, signo):
+        """Suma (signo=1) o resta (signo=-1) un pedido según su clave_venta()"""
+        if clave is None:
+            return
+        fecha, metodo_pago, tipo_servicio, origen, total = clave
+        transaction.on_commit(partial(cache_reportes.invalidar, fecha))
+        fila, _ = cls.objects.get_or_create(
+            fecha=fecha,
+            metodo_pago=metodo_pago,
+            tipo_servicio=tipo_servicio,
+            origen=origen,
+        )
+        cls.objects.filter(pk=fila.pk).update(
+            cantidad=F('cantidad') + signo,
+            total=F('total') + signo * total,
+        )
+
+
+class TotalPagoDiario(models.Model):
+    """
+    Total cobrado por día y método de pago. Se actualiza junto con
+    VentaDiaria cada vez que un pedido se paga o deja de estar pagado, para
+    que el corte de caja lea tres filas en lugar de sumar los pedidos del día.
+    """
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=20)
+
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Total de Pago Diario'
+        verbose_name_plural = 'Totales de Pago Diarios'
+        unique_together = ['fecha', 'metodo_pago']
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} - {self.metodo_pago}: ${self.total}"
+
+    @staticmethod
+    def _llave(clave):
+        # (fecha, metodo_pago, total) de una clave_venta()
+        return (clave[0], clave[1], clave[4]) if clave else None
+
+    @classmethod
+    def acumular(cls, clave, signo):
+        """Suma (signo=1) o resta (signo=-1) un pedido según su clave_venta()"""
+        if clave is None:
+            return
+        fecha, metodo_pago, total = cls._llave(clave)
+        fila, _ = cls.objects.get_or_create(
+            fecha=fecha, metodo_pago=metodo_pago)
+        cls.objects.filter(pk=fila.pk).update(
+            cantidad=F('cantidad') + signo,
+            total=F('total') + signo * total,
+        )
+
+    @classmethod
+    def mover(cls, anterior, actual):
+        """Pasa el pedido de la clave anterior a la actual si cambió su fecha, método o total"""
+        if cls._llave(anterior) == cls._llave(actual):
+            return
+        cls.acumular(anterior, -1)
+        cls.acumular(actual, 1)
+
+
 class DetallePedido(models.Model):
     """Detalles de las prendas incluidas en un pedido"""
     pedido = models.ForeignKey(
@@ -230,14 +428,83 @@ class DetallePedido(models.Model):
         max_digits=10, decimal_places=2, default=0)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    def aporte_prenda(self):
+        """(prenda_id, cantidad, subtotal) con que la línea suma en VentaPrendaDiaria"""
+        return (self.prenda_id, self.cantidad, self.subtotal)
+
+    def _prenda_guardada(self, bloquear=False):
+        """Aporte de la línea tal como está en la base de datos (ver Pedido._venta_guardada)"""
+        if self._state.adding:
+            return None
+        guardada = DetallePedido.objects.filter(pk=self.pk)
+        if bloquear:
+            guardada = guardada.select_for_update()
+        return guardada.values_list('prenda_id', 'cantidad', 'subtotal').first()
+
     def save(self, *args, **kwargs):
         self.subtotal = self.precio_unitario * self.cantidad
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Primero el pedido y después la línea: el mismo orden en que se
+            # bloquean en Pedido.save, que mueve las líneas si cambia la fecha
+            fecha = self.pedido.fecha_venta(bloquear=True)
+            anterior = self._prenda_guardada(bloquear=True)
+            super().save(*args, **kwargs)
+            actual = self.aporte_prenda()
+            if anterior != actual:
+                VentaPrendaDiaria.acumular(fecha, anterior, -1)
+                VentaPrendaDiaria.acumular(fecha, actual, 1)
 
     def __str__(self):
         return f"{self.pedido.folio} - {self.prenda.nombre if self.prenda else 'Sin prenda'}"
 
 
+class VentaPrendaDiaria(models.Model):
+    """
+    Resumen diario por prenda de las líneas de pedidos pagados
+    (reemplaza el join DetallePedido-Pedido en la gráfica de prendas).
+    """
+    fecha = models.DateField()
+    prenda = models.ForeignKey(Prenda, on_delete=models.CASCADE)
+
+    cantidad = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Venta Diaria por Prenda'
+        verbose_name_plural = 'Ventas Diarias por Prenda'
+        unique_together = ['fecha', 'prenda']
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} - {self.prenda.nombre}: {self.cantidad}"
+
+    @classmethod
+    def acumular(cls, fecha, aporte, signo):
+        """Suma o resta un aporte (prenda_id, cantidad, subtotal) en la fecha dada"""
+        if fecha is None or aporte is None or aporte[0] is None:
+            return
+        prenda_id, cantidad, subtotal = aporte
+        transaction.on_commit(partial(cache_reportes.invalidar, fecha))
+        fila, _ = cls.objects.get_or_create(fecha=fecha, prenda_id=prenda_id)
+        cls.objects.filter(pk=fila.pk).update(
+            cantidad=F('cantidad') + signo * cantidad,
+            subtotal=F('subtotal') + signo * subtotal,
+        )
+
+    @classmethod
+    def mover_pedido(cls, pedido, fecha_anterior, fecha_actual):
+        """Pasa todas las líneas de un pedido de una fecha a otra (None = no pagado)"""
+        lineas = pedido.detalles.filter(
+            prenda__isnull=False
+        ).values('prenda_id').annotate(
+            suma_cantidad=models.Sum('cantidad'),
+            suma_subtotal=models.Sum('subtotal')
+        ).values_list('prenda_id', 'suma_cantidad', 'suma_subtotal').order_by()
+        for aporte in lineas:
+            cls.acumular(fecha_anterior, aporte, -1)
+            cls.acumular(fecha_actual, aporte, 1)
+
+
 class MovimientoOperador(models.Model):
     """Registro de movimientos/acciones realizadas por operadores"""
     ACCIONES = (
@@ -265,6 +532,10 @@ class MovimientoOperador(models.Model):
         ordering = ['-fecha']
         verbose_name = 'Movimiento de Operador'
         verbose_name_plural = 'Movimientos de Operadores'
+        indexes = [
+            # Páginas del historial por llave (fecha, id)
+            models.Index(fields=['-fecha', '-id'], name='movimiento_historial_idx'),
+        ]
 
     def __str__(self):
         return f"{self.operador.username} - {self.accion} - {self.fecha.strftime('%d/%m/%Y %H:%M')}"
@@ -299,6 +570,14 @@ class Maquina(models.Model):
     tiempo_asignado = models.IntegerField(
         default=0, help_text="Tiempo en minutos")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordar el estado para avisar a los tableros si se asigna o libera
+        if 'estado' in field_names and 'pedido_actual_id' in field_names:
+            instance._estado_original = (instance.estado, instance.pedido_actual_id)
+        return instance
+
     def tiempo_restante(self):
         """Calcula los minutos restantes basado en la hora de inicio y el tiempo asignado"""
         if not self.hora_inicio_uso or self.estado != 'ocupado':
@@ -412,3 +691,121 @@ class CorteCaja(models.Model):
         """Calcula la diferencia entre ventas y efectivo reportado"""
         self.diferencia = self.total_fisico - self.total_ventas
         return self.diferencia
+
+
+class TrabajoReporte(models.Model):
+    """Trabajo en cola: generar el reporte financiero y enviarlo por correo"""
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    )
+
+    solicitado_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='trabajos_reporte')
+    email_destino = models.EmailField()
+    filtro = models.CharField(max_length=20, default='hoy')
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+
+    estado = models.CharField(
+        max_length=20, choices=ESTADOS, default='pendiente')
+    progreso = models.CharField(max_length=100, blank=True)
+    intentos = models.IntegerField(default=0)
+    max_intentos = models.IntegerField(default=5)
+    error = models.TextField(blank=True, null=True)
+
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    disponible_desde = models.DateTimeField(
+        default=timezone.now, help_text="No se procesa antes de esta hora (reintentos)")
+    # Cuándo lo tomó un worker (para recuperar los que quedaron a medias)
+    fecha_tomado = models.DateTimeField(blank=True, null=True)
+    fecha_terminado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = 'Trabajo de Reporte'
+        verbose_name_plural = 'Trabajos de Reporte'
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.fecha_inicio} - {self.fecha_fin} a {self.email_destino} ({self.get_estado_display()})"
+
+
+class CorreoTicket(models.Model):
+    """
+    Bandeja de salida del ticket por correo: se registra junto con el pedido
+    (misma transacción) y el comando `enviar_correos` lo envía después.
+    """
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    )
+
+    pedido = models.ForeignKey(
+        Pedido, on_delete=models.CASCADE, related_name='correos_ticket')
+    email_destino = models.EmailField()
+
+    estado = models.CharField(
+        max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    max_intentos = models.IntegerField(default=5)
+    error = models.TextField(blank=True, null=True)
+    # Lote del worker que lo tomó (para recuperar los que quedaron a medias)
+    lote = models.CharField(max_length=32, blank=True)
+
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    disponible_desde = models.DateTimeField(
+        default=timezone.now, help_text="No se procesa antes de esta hora (reintentos)")
+    fecha_tomado = models.DateTimeField(blank=True, null=True)
+    fecha_enviado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = 'Correo de Ticket'
+        verbose_name_plural = 'Correos de Ticket'
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.pedido_id} a {self.email_destino} ({self.get_estado_display()})"
+
+
+class CierreDia(models.Model):
+    """
+    Cierre de un día de ventas (comando `cierre_dia`): totales definitivos
+    por método de pago y en qué etapa quedó, para poder reanudarlo.
+    """
+    ESTADOS = (
+        ('totales', 'Totales calculados'),
+        ('completado', 'Completado'),
+    )
+
+    fecha = models.DateField(unique=True)
+    num_pedidos = models.PositiveIntegerField(default=0)
+    ventas_efectivo = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0)
+    ventas_tarjeta = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0)
+    ventas_transferencia = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0)
+    total_ventas = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0)
+    estado = models.CharField(
+        max_length=20, choices=ESTADOS, default='totales')
+    fecha_cierre = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Cierre de Día'
+        verbose_name_plural = 'Cierres de Día'
+
+    def __str__(self):
+        return f"Cierre {self.fecha.strftime('%d/%m/%Y')} ({self.get_estado_display()})"
@@ -0,0 +1,251 @@
+"""
+Servicio de generación de PDF (tickets, reportes de finanzas, corte de caja).
+
+xhtml2pdf ocupa el CPU y no libera el GIL, así que la conversión HTML → PDF
+se hace en un ProcessPoolExecutor con procesos ya calentados (xhtml2pdf,
+reportlab y las fuentes cargadas antes del primer trabajo). Las plantillas
+se siguen renderizando en el proceso de Django, que ya las tiene en caché y
+tiene acceso a la base de datos; a los procesos solo viaja el HTML.
+
+- Cola acotada: PDF_PROCESOS trabajos corriendo + PDF_COLA_MAX esperando.
+  Si está llena, las peticiones web reciben PDFNoDisponible (503 con
+  Retry-After) en lugar de quedarse bloqueadas; los trabajos en segundo
+  plano (esperar=True, o esperar=segundos para un máximo) sí esperan su turno.
+- Cada trabajo tiene un tiempo máximo (PDF_TIMEOUT segundos). Si se
+  agota y el trabajo sigue en la cola se cancela; si ya corre, se terminan
+  los procesos y se arranca un pool nuevo (los demás trabajos de ese pool
+  reciben PDFNoDisponible). En ambos casos el lugar se libera de inmediato.
+- metricas() da la profundidad de la cola y los tiempos de generación.
+
+Con PDF_PROCESOS = 0 la conversión se hace en el mismo proceso.
+
+El ticket y el corte de caja también se pueden dibujar directo con reportlab
+(pdf_directo.py), sin pasar por HTML, con PDF_MOTOR = 'reportlab'; por
+defecto se usan las plantillas.
+"""
+import atexit
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+# Tiempos de los últimos trabajos para calcular percentiles
+MUESTRAS_TIEMPO = 500
+
+# 'reportlab': dibujo directo (pdf_directo.py); 'html': plantilla + xhtml2pdf
+MOTORES = ('reportlab', 'html')
+
+
+class PDFNoDisponible(Exception):
+    """El servicio de PDF está saturado o el trabajo tardó demasiado"""
+
+    def __init__(self, mensaje, reintentar=5):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.reintentar = reintentar
+
+
+def respuesta_no_disponible(error):
+    """HTTP 503 con Retry-After para cuando el servicio de PDF no da abasto"""
+    response = HttpResponse(error.mensaje, status=503,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(error.reintentar)
+    return response
+
+
+# ========== PROCESOS DE TRABAJO ==========
+
+def _iniciar_proceso():
+    """Carga xhtml2pdf, reportlab y las fuentes antes del primer trabajo"""
+    from xhtml2pdf import pisa
+    pisa.pisaDocument(BytesIO(b'<html><body><p>PDF</p></body></html>'), BytesIO())
+
+
+def _convertir(html):
+    """HTML → (bytes del PDF o None si xhtml2pdf reporta error, segundos)"""
+    from xhtml2pdf import pisa
+
+    inicio = time.perf_counter()
+    resultado = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), resultado)
+    contenido = None if pdf.err else resultado.getvalue()
+    return contenido, time.perf_counter() - inicio
+
+
+# ========== SERVICIO ==========
+
+class ServicioPDF:
+
+    def __init__(self, procesos, cola_max, timeout):
+        self.procesos = procesos
+        self.timeout = timeout
+        self._lugares = threading.BoundedSemaphore(max(procesos, 1) + cola_max)
+        self._candado = threading.Lock()
+        self._pool = None
+        self._tiempos = deque(maxlen=MUESTRAS_TIEMPO)
+        self._en_curso = 0
+        self._contadores = dict.fromkeys(
+            ('trabajos', 'errores', 'rechazados', 'tiempo_agotado', 'max_en_cola'), 0)
+
+    def _obtener_pool(self):
+        with self._candado:
+            if self._pool is None:
+                # spawn: no heredar hilos ni conexiones del proceso de Django
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_iniciar_proceso,
+                )
+            return self._pool
+
+    def iniciar(self, esperar=False):
+        """
+        Arranca y calienta los procesos sin esperar a la primera petición.
+        Con esperar=True regresa hasta que todos terminaron de calentarse.
+        """
+        if self.procesos:
+            pool = self._obtener_pool()
+            # Con una pausa cada proceso toma un trabajo y pasa por _iniciar_proceso
+            futuros = [pool.submit(time.sleep, 0.2 if esperar else 0)
+                       for _ in range(self.procesos)]
+            if esperar:
+                for futuro in futuros:
+                    futuro.result()
+
+    def _reiniciar_pool(self, pool, terminar=False):
+        with self._candado:
+            if self._pool is pool:
+                self._pool = None
+        # shutdown() no detiene un trabajo que ya está corriendo
+        procesos = list((pool._processes or {}).values()) if terminar else []
+        pool.shutdown(wait=False, cancel_futures=True)
+        for proceso in procesos:
+            proceso.terminate()
+
+    def cerrar(self):
+        with self._candado:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _contar(self, nombre, cantidad=1):
+        with self._candado:
+            self._contadores[nombre] += cantidad
+
+    def convertir(self, html, esperar=False):
+        """
+        Convierte el HTML a PDF. Retorna los bytes o None si xhtml2pdf falla.
+        Lanza PDFNoDisponible si la cola está llena (y esperar=False), si no
+        hubo lugar en `esperar` segundos (si es un número) o si el trabajo
+        excede el tiempo máximo.
+        """
+        if esperar is True or esperar is False:
+            hay_lugar = self._lugares.acquire(blocking=esperar)
+        else:
+            hay_lugar = self._lugares.acquire(timeout=esperar)
+        if not hay_lugar:
+            self._contar('rechazados')
+            raise PDFNoDisponible(
+                'Hay demasiados PDF generándose en este momento; intente de nuevo en unos segundos.')
+
+        with self._candado:
+            self._en_curso += 1
+            self._contadores['max_en_cola'] = max(self._contadores['max_en_cola'], self._en_curso)
+        inicio = time.perf_counter()
+        try:
+            if not self.procesos:
+                contenido, segundos = _convertir(html)
+            else:
+                pool = self._obtener_pool()
+                try:
+                    futuro = pool.submit(_convertir, html)
+                except BrokenProcessPool:
+                    self._reiniciar_pool(pool)
+                    pool = self._obtener_pool()
+                    futuro = pool.submit(_convertir, html)
+                try:
+                    contenido, segundos = futuro.result(timeout=self.timeout)
+                except FuturoTimeout:
+                    # Si no se pudo cancelar ya está corriendo: terminar el proceso
+                    if not futuro.cancel():
+                        self._reiniciar_pool(pool, terminar=True)
+                    self._contar('tiempo_agotado')
+                    raise PDFNoDisponible('El PDF tardó demasiado en generarse.')
+                except BrokenProcessPool:
+                    self._reiniciar_pool(pool)
+                    self._contar('errores')
+                    raise PDFNoDisponible('El servicio de PDF se reinició; intente de nuevo.')
+        finally:
+            self._terminar()
+
+        with self._candado:
+            self._contadores['trabajos'] += 1
+            if contenido is None:
+                self._contadores['errores'] += 1
+            self._tiempos.append((segundos, time.perf_counter() - inicio))
+        return contenido
+
+    def _terminar(self):
+        with self._candado:
+            self._en_curso -= 1
+        self._lugares.release()
+
+    def metricas(self):
+        with self._candado:
+            datos = dict(self._contadores)
+            datos['en_cola'] = self._en_curso
+            tiempos = sorted(self._tiempos)
+            totales = sorted(total for _, total in self._tiempos)
+        datos['procesos'] = self.procesos
+
+        def percentil(valores, p):
+            if not valores:
+                return None
+            return round(valores[min(len(valores) - 1, int(len(valores) * p))] * 1000, 1)
+
+        generacion = [segundos for segundos, _ in tiempos]
+        datos['generacion_ms'] = {'p50': percentil(generacion, 0.5),
+                                  'p95': percentil(generacion, 0.95)}
+        # Incluye la espera en la cola y el envío del HTML al proceso
+        datos['total_ms'] = {'p50': percentil(totales, 0.5),
+                             'p95': percentil(totales, 0.95)}
+        return datos
+
+
+_servicio = None
+_candado_servicio = threading.Lock()
+
+
+def servicio():
+    global _servicio
+    with _candado_servicio:
+        if _servicio is None:
+            _servicio = ServicioPDF(
+                procesos=getattr(settings, 'PDF_PROCESOS', 2),
+                cola_max=getattr(settings, 'PDF_COLA_MAX', 8),
+                timeout=getattr(settings, 'PDF_TIMEOUT', 30),
+            )
+            atexit.register(_servicio.cerrar)
+        return _servicio
+
+
+def html_a_pdf(html, esperar=False):
+    """Bytes del PDF generado a partir del HTML (None si xhtml2pdf falla)"""
+    return servicio().convertir(html, esperar=esperar)
+
+
+def metricas():
+    return servicio().metricas()
+
+
+def motor():
+    """Motor configurado para el ticket y el corte de caja (PDF_MOTOR)"""
+    valor = getattr(settings, 'PDF_MOTOR', 'html')
+    return valor if valor in MOTORES else 'html'
@@ -0,0 +1,336 @@
+"""
+Dibujo directo de los PDF de formato fijo (ticket y corte de caja) con el
+canvas de reportlab.
+
+Producen el mismo contenido y acomodo que tickets_pdf.html y
+corte_caja_pdf.html, pero sin pasar por la plantilla HTML ni por el
+intérprete de HTML/CSS de xhtml2pdf: solo se escriben textos, líneas y la
+imagen del QR en coordenadas fijas. Tarda unos milisegundos, así que corre
+en el mismo proceso de Django sin ocupar lugar en la cola de pdf.py.
+
+Si se cambia el diseño de una de las plantillas hay que reflejarlo aquí
+(y viceversa): con PDF_MOTOR = 'html' se vuelven a usar las plantillas.
+"""
+from io import BytesIO
+
+from django.template.defaultfilters import date as formato_fecha, floatformat
+from django.utils.timezone import template_localtime
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import cm, mm
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
+
+
+# px de las plantillas → pt (xhtml2pdf usa 96 px por pulgada)
+PX = 0.75
+
+FUENTE = 'Helvetica'
+FUENTE_NEGRITA = 'Helvetica-Bold'
+
+
+def _nuevo_canvas(buffer, tamano, titulo):
+    lienzo = canvas.Canvas(buffer, pagesize=tamano, pageCompression=1)
+    lienzo.setTitle(titulo)
+    lienzo.setAuthor('Punto Limpio')
+    return lienzo
+
+
+def _texto_centrado(lienzo, texto, x, y, fuente, tamano):
+    lienzo.setFont(fuente, tamano)
+    lienzo.drawCentredString(x, y, texto)
+
+
+def _etiqueta_valor(lienzo, x, y, etiqueta, valor, tamano):
+    """'Etiqueta:' en negritas seguida del valor en la misma línea"""
+    lienzo.setFont(FUENTE_NEGRITA, tamano)
+    lienzo.drawString(x, y, etiqueta)
+    ancho = lienzo.stringWidth(etiqueta, FUENTE_NEGRITA, tamano)
+    lienzo.setFont(FUENTE, tamano)
+    lienzo.drawString(x + ancho + lienzo.stringWidth(' ', FUENTE, tamano), y, valor)
+
+
+# ========== TICKET (80 mm) ==========
+
+TICKET_ANCHO = 80 * mm
+TICKET_ALTO = 297 * mm
+TICKET_MARGEN = 5 * mm
+
+
+def _nombre_cliente(cliente):
+    if cliente.first_name:
+        return f'{cliente.first_name} {cliente.last_name}'
+    return cliente.username
+
+
+def ticket_pdf(pedido, qr_png=None):
+    """Bytes del ticket del pedido (mismo contenido que tickets_pdf.html)"""
+    return tickets_pdf([(pedido, qr_png)], f'Ticket {pedido.folio}')
+
+
+def tickets_pdf(tickets, titulo='Tickets'):
+    """
+    Un PDF con una página por ticket; `tickets` son pares (pedido, qr_png).
+    Todo se dibuja en el mismo canvas: fuentes y recursos se escriben una
+    sola vez para todas las páginas.
+    """
+    buffer = BytesIO()
+    lienzo = _nuevo_canvas(buffer, (TICKET_ANCHO, TICKET_ALTO), titulo)
+    for pedido, qr_png in tickets:
+        _dibujar_ticket(lienzo, pedido, qr_png)
+        lienzo.showPage()
+    lienzo.save()
+    return buffer.getvalue()
+
+
+def _dibujar_ticket(lienzo, pedido, qr_png):
+    izquierda = TICKET_MARGEN
+    derecha = TICKET_ANCHO - TICKET_MARGEN
+    centro = TICKET_ANCHO / 2
+    ancho = derecha - izquierda
+    normal = 11 * PX
+    chico = 9 * PX
+    renglon = normal * 1.4
+    y = TICKET_ALTO - TICKET_MARGEN - 16 * PX
+
+    # Encabezado
+    _texto_centrado(lienzo, 'PUNTO LIMPIO', centro, y, FUENTE_NEGRITA, 16 * PX)
+    y -= renglon * 1.3
+    _texto_centrado(lienzo, 'Lavandería Profesional', centro, y, FUENTE, normal)
+    y -= renglon
+    _texto_centrado(lienzo, 'Av. Principal #123, Tizayuca, Hgo.', centro, y, FUENTE, normal)
+    y -= 10 * PX
+    lienzo.setDash(2, 2)
+    lienzo.line(izquierda, y, derecha, y)
+    lienzo.setDash()
+    y -= 10 * PX + renglon
+
+    # Datos del pedido
+    recepcion = formato_fecha(template_localtime(pedido.fecha_recepcion), 'd/m/Y h:i A')
+    entrega = formato_fecha(pedido.fecha_entrega_estimada, 'd/m/Y') or 'Pendiente'
+    for etiqueta, valor in (
+        ('Folio:', pedido.folio),
+        ('Fecha:', recepcion),
+        ('Cliente:', _nombre_cliente(pedido.cliente)),
+        ('Entrega Aprox:', entrega),
+    ):
+        _etiqueta_valor(lienzo, izquierda, y, etiqueta, str(valor), normal)
+        y -= renglon
+    y -= 10 * PX
+
+    # Tabla: Cant. 15% | Descripción 60% | Total 25%
+    columna_desc = izquierda + ancho * 0.15
+    ancho_desc = ancho * 0.60 - 2
+    lienzo.setFont(FUENTE_NEGRITA, 10 * PX)
+    lienzo.drawString(izquierda, y, 'Cant.')
+    lienzo.drawString(columna_desc, y, 'Descripción')
+    lienzo.drawRightString(derecha, y, 'Total')
+    y -= 3
+    lienzo.line(izquierda, y, derecha, y)
+    y -= 4 + normal
+
+    lienzo.setFont(FUENTE, normal)
+    lienzo.drawString(izquierda, y, '1')
+    lienzo.drawRightString(derecha, y, f'${pedido.total}')
+    lineas = [(linea, normal) for linea in
+              simpleSplit(str(pedido.tipo_servicio), FUENTE, normal, ancho_desc)]
+    lineas += [(linea, chico) for linea in simpleSplit(
+        f'({pedido.cantidad_prendas} pzas / {pedido.peso} kg)', FUENTE, chico, ancho_desc)]
+    if pedido.observaciones:
+        lineas += [(linea, chico) for linea in simpleSplit(
+            f'Nota: {pedido.observaciones}', FUENTE, chico, ancho_desc)]
+    for linea, tamano in lineas:
+        lienzo.setFont(FUENTE, tamano)
+        lienzo.drawString(columna_desc, y, linea)
+        y -= tamano * 1.4
+    y -= 4
+
+    # Totales
+    y -= 10 * PX
+    lienzo.line(izquierda, y, derecha, y)
+    y -= 5 * PX + renglon
+    lienzo.setFont(FUENTE, normal)
+    lienzo.drawRightString(derecha, y, f'Pago: {str(pedido.metodo_pago).upper()}')
+    y -= renglon * 1.3
+    lienzo.setFont(FUENTE_NEGRITA, 14 * PX)
+    lienzo.drawRightString(derecha, y, f'TOTAL: ${pedido.total}')
+
+    # Código QR
+    y -= 20 * PX
+    if qr_png:
+        lado = 90 * PX
+        y -= lado
+        lienzo.drawImage(ImageReader(BytesIO(qr_png)), centro - lado / 2, y, lado, lado)
+    y -= 5 * PX + chico
+    _texto_centrado(lienzo, 'Escanea para rastrear', centro, y, FUENTE, chico)
+    y -= 15 * PX + chico
+    _texto_centrado(lienzo, '¡Gracias por tu confianza!', centro, y, FUENTE, chico)
+
+
+# ========== CORTE DE CAJA (carta) ==========
+
+GRIS_TEXTO = colors.HexColor('#333333')
+GRIS_MEDIO = colors.HexColor('#555555')
+GRIS_CLARO = colors.HexColor('#666666')
+BORDE = colors.HexColor('#dddddd')
+FONDO = colors.HexColor('#f8f9fa')
+AZUL = colors.HexColor('#007bff')
+COLOR_DIFERENCIA = {
+    'positiva': colors.HexColor('#28a745'),
+    'negativa': colors.HexColor('#dc3545'),
+    'cero': colors.HexColor('#6c757d'),
+}
+
+
+def _dinero(valor):
+    return f'${floatformat(valor, 2)}'
+
+
+def _tabla_montos(lienzo, x, y, ancho, titulo, filas, total):
+    """Sección con título subrayado, filas etiqueta/monto y renglón de total"""
+    lienzo.setFont(FUENTE_NEGRITA, 14)
+    lienzo.setFillColor(GRIS_MEDIO)
+    lienzo.drawString(x, y, titulo)
+    y -= 8
+    lienzo.setStrokeColor(AZUL)
+    lienzo.setLineWidth(1.5)
+    lienzo.line(x, y, x + ancho, y)
+    y -= 15
+
+    alto_fila = 12 + 2 * 10 * PX
+    lienzo.setLineWidth(0.75)
+    lienzo.setStrokeColor(BORDE)
+    for etiqueta, valor in filas:
+        base = y - alto_fila + 10 * PX + 3
+        lienzo.setFont(FUENTE, 12)
+        lienzo.setFillColor(GRIS_CLARO)
+        lienzo.drawString(x + 10 * PX, base, etiqueta)
+        lienzo.setFont(FUENTE_NEGRITA, 12)
+        lienzo.setFillColor(GRIS_TEXTO)
+        lienzo.drawRightString(x + ancho - 10 * PX, base, _dinero(valor))
+        y -= alto_fila
+        lienzo.line(x, y, x + ancho, y)
+
+    alto_total = 14 + 2 * 15 * PX
+    lienzo.setStrokeColor(GRIS_TEXTO)
+    lienzo.setLineWidth(1.5)
+    lienzo.line(x, y, x + ancho, y)
+    base = y - alto_total + 15 * PX + 3
+    lienzo.setFont(FUENTE_NEGRITA, 14)
+    lienzo.setFillColor(GRIS_TEXTO)
+    lienzo.drawString(x + 10 * PX, base, 'TOTAL:')
+    lienzo.drawRightString(x + ancho - 10 * PX, base, _dinero(total))
+    y -= alto_total
+    lienzo.line(x, y, x + ancho, y)
+    return y
+
+
+def corte_caja_pdf(contexto):
+    """
+    Bytes del corte de caja; recibe el mismo contexto que
+    corte_caja_pdf.html (ver views.imprimir_corte_caja).
+    """
+    buffer = BytesIO()
+    ancho_pagina, alto_pagina = letter
+    lienzo = _nuevo_canvas(buffer, letter, f'Corte de caja {contexto["fecha"]}')
+
+    margen = 1 * cm + 20 * PX
+    izquierda = margen
+    derecha = ancho_pagina - margen
+    centro = ancho_pagina / 2
+    ancho = derecha - izquierda
+    y = alto_pagina - margen - 24
+
+    # Encabezado
+    lienzo.setFillColor(GRIS_TEXTO)
+    _texto_centrado(lienzo, 'PUNTO LIMPIO', centro, y, FUENTE_NEGRITA, 24)
+    y -= 24
+    lienzo.setFillColor(GRIS_CLARO)
+    _texto_centrado(lienzo, f'CORTE DE CAJA - {contexto["fecha"]}', centro, y, FUENTE, 16)
+    y -= 15 * PX + 6
+    lienzo.setStrokeColor(GRIS_TEXTO)
+    lienzo.setLineWidth(3 * PX)
+    lienzo.line(izquierda, y, derecha, y)
+    y -= 30 * PX + 14
+
+    # Dos columnas: ventas del sistema y dinero físico
+    ancho_columna = (ancho - 4 * 10 * PX) / 2
+    fin_ventas = _tabla_montos(
+        lienzo, izquierda + 10 * PX, y, ancho_columna,
+        'VENTAS REGISTRADAS EN SISTEMA',
+        [('Efectivo:', contexto['ventas_efectivo']),
+         ('Tarjeta:', contexto['ventas_tarjeta']),
+         ('Transferencia:', contexto['ventas_transferencia'])],
+        contexto['total_ventas'],
+    )
+    fin_fisico = _tabla_montos(
+        lienzo, izquierda + 3 * 10 * PX + ancho_columna, y, ancho_columna,
+        'DINERO FÍSICO REPORTADO',
+        [('Efectivo contado:', contexto['efectivo_contado']),
+         ('Terminal (Tarjeta):', contexto['tarjeta_terminal']),
+         ('Banco (Transfer):', contexto['transferencia_banco'])],
+        contexto['total_fisico'],
+    )
+    y = min(fin_ventas, fin_fisico) - 25 * PX - 30 * PX
+
+    # Diferencia
+    diferencia = contexto['diferencia']
+    clase = 'positiva' if diferencia > 0 else 'negativa' if diferencia < 0 else 'cero'
+    alto_caja = 2 * 20 * PX + 14 + 10 * PX + 28 + 6
+    lienzo.setFillColor(FONDO)
+    lienzo.setStrokeColor(BORDE)
+    lienzo.setLineWidth(2 * PX)
+    lienzo.roundRect(izquierda, y - alto_caja, ancho, alto_caja, 8 * PX, stroke=1, fill=1)
+    base = y - 20 * PX - 14
+    lienzo.setFillColor(GRIS_CLARO)
+    _texto_centrado(lienzo, 'DIFERENCIA', centro, base, FUENTE, 14)
+    lienzo.setFillColor(COLOR_DIFERENCIA[clase])
+    _texto_centrado(lienzo, _dinero(diferencia), centro, base - 10 * PX - 28, FUENTE_NEGRITA, 28)
+    y -= alto_caja + 30 * PX
+
+    # Justificación
+    justificacion = contexto.get('justificacion')
+    if justificacion:
+        relleno = 15 * PX
+        interlineado = 12 * 1.6
+        # Como en HTML, los saltos de línea y espacios seguidos cuentan como uno
+        texto = ' '.join(str(justificacion).split())
+        lineas = simpleSplit(texto, FUENTE, 12, ancho - 2 * relleno) or ['']
+        alto_caja = 2 * relleno + 12 + 10 * PX + interlineado * len(lineas)
+        y -= 20 * PX
+        lienzo.setFillColor(FONDO)
+        lienzo.setStrokeColor(BORDE)
+        lienzo.setLineWidth(PX)
+        lienzo.roundRect(izquierda, y - alto_caja, ancho, alto_caja, 4 * PX, stroke=1, fill=1)
+        base = y - relleno - 12
+        lienzo.setFillColor(GRIS_MEDIO)
+        lienzo.setFont(FUENTE_NEGRITA, 12)
+        lienzo.drawString(izquierda + relleno, base, 'JUSTIFICACIÓN:')
+        base -= 10 * PX + interlineado
+        lienzo.setFillColor(GRIS_TEXTO)
+        lienzo.setFont(FUENTE, 12)
+        for linea in lineas:
+            lienzo.drawString(izquierda + relleno, base, linea)
+            base -= interlineado
+        y -= alto_caja + 20 * PX
+
+    # Pie
+    y -= 40 * PX
+    lienzo.setStrokeColor(BORDE)
+    lienzo.setLineWidth(2 * PX)
+    lienzo.line(izquierda, y, derecha, y)
+    y -= 20 * PX + 8 * PX + 12
+    for etiqueta, valor in (('RESPONSABLE:', contexto['responsable']),
+                            ('FECHA/HORA DE REGISTRO:', contexto['fecha_hora'])):
+        lienzo.setFillColor(GRIS_TEXTO)
+        lienzo.setFont(FUENTE_NEGRITA, 12)
+        lienzo.drawString(izquierda, y, etiqueta)
+        espacio = lienzo.stringWidth(etiqueta + ' ', FUENTE_NEGRITA, 12)
+        lienzo.setFillColor(GRIS_CLARO)
+        lienzo.setFont(FUENTE, 12)
+        lienzo.drawString(izquierda + espacio, y, str(valor))
+        y -= 12 * 1.2 + 2 * 8 * PX
+
+    lienzo.showPage()
+    lienzo.save()
+    return buffer.getvalue()
@@ -0,0 +1,554 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncHour, TruncDay, TruncWeek, TruncMonth
+from django.template.loader import get_template
+from django.utils import timezone
+
+from . import cache_reportes
+from .pdf import html_a_pdf
+from .models import (
+    Pedido, DetallePedido, VentaDiaria, VentaPrendaDiaria, TotalPagoDiario
+)
+
+
+METODOS_PAGO = ('efectivo', 'tarjeta', 'transferencia')
+
+
+def hoy_local():
+    """Fecha de hoy en la zona horaria del negocio (America/Mexico_City)"""
+    return timezone.localdate(timezone=timezone.get_default_timezone())
+
+
+def rango_dias(fecha_inicio, fecha_fin=None):
+    """
+    Rango semiabierto [inicio, fin) de datetimes con zona horaria que cubre
+    los días fecha_inicio..fecha_fin (inclusivos) en la hora local del
+    negocio (settings.TIME_ZONE).
+
+    Se usa en lugar de `__date`, que envuelve la columna en una función y
+    no deja usar los índices sobre la fecha.
+    """
+    zona = timezone.get_default_timezone()
+    fecha_fin = fecha_fin or fecha_inicio
+    inicio = datetime.combine(fecha_inicio, datetime.min.time(), tzinfo=zona)
+    fin = datetime.combine(fecha_fin + timedelta(days=1),
+                           datetime.min.time(), tzinfo=zona)
+    return inicio, fin
+
+
+def filtro_rango(campo, fecha_inicio, fecha_fin=None):
+    """Argumentos de filtro `campo__gte` / `campo__lt` para rango_dias()"""
+    inicio, fin = rango_dias(fecha_inicio, fecha_fin)
+    return {f'{campo}__gte': inicio, f'{campo}__lt': fin}
+
+
+def calcular_periodo(filtro, fecha_desde=None, fecha_hasta=None):
+    """
+    Traduce el filtro de finanzas (hoy, semana, mes, personalizado)
+    a un par de fechas (fecha_inicio, fecha_fin), ambas inclusivas.
+    """
+    hoy = hoy_local()
+
+    if filtro == 'semana':
+        return hoy - timedelta(days=7), hoy
+    if filtro == 'mes':
+        return hoy.replace(day=1), hoy
+    if filtro == 'personalizado' and fecha_desde and fecha_hasta:
+        fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
+        fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
+        return fecha_inicio, fecha_fin
+    return hoy, hoy
+
+
+def _porcentaje(parte, total):
+    return round((parte / total * 100), 1) if total > 0 else 0
+
+
+def _sumas_por_metodo():
+    """Expresiones de agregación condicional: una suma por método de pago"""
+    return {
+        metodo: Sum('total', filter=Q(metodo_pago=metodo))
+        for metodo in METODOS_PAGO
+    }
+
+
+def ventas_por_metodo(fecha):
+    """
+    Ventas pagadas de un día separadas por método de pago (corte de caja).
+    Se leen de TotalPagoDiario: a lo más una fila por método.
+    """
+    totales = dict(TotalPagoDiario.objects.filter(
+        fecha=fecha
+    ).values_list('metodo_pago', 'total'))
+
+    ventas = {
+        f'ventas_{metodo}': totales.get(metodo) or Decimal('0')
+        for metodo in METODOS_PAGO
+    }
+    ventas['total_ventas'] = sum(ventas.values(), Decimal('0'))
+    return ventas
+
+
+def resumen_financiero(fecha_inicio, fecha_fin, limite_prendas=None):
+    """
+    Calcula todos los datos del reporte financiero de un período:
+    totales, desglose por método de pago con porcentajes, estadísticas
+    por prenda y por servicio.
+
+    Usa tres consultas sobre los resúmenes diarios: una agregación
+    condicional para los totales, una agrupación para prendas (sobre
+    VentaPrendaDiaria) y otra para servicios.
+    """
+    ventas_periodo = VentaDiaria.objects.filter(
+        fecha__gte=fecha_inicio,
+        fecha__lte=fecha_fin
+    )
+
+    # ========== TOTALES Y MÉTODOS DE PAGO ==========
+    totales = ventas_periodo.aggregate(
+        ingresos=Sum('total'), **_sumas_por_metodo())
+
+    ingresos_totales = totales['ingresos'] or Decimal('0')
+    pago_efectivo = totales['efectivo'] or Decimal('0')
+    pago_tarjeta = totales['tarjeta'] or Decimal('0')
+    pago_transferencia = totales['transferencia'] or Decimal('0')
+
+    total_pagos = pago_efectivo + pago_tarjeta + pago_transferencia
+
+    # ========== PRENDAS ==========
+    prendas_stats = VentaPrendaDiaria.objects.filter(
+        fecha__gte=fecha_inicio,
+        fecha__lte=fecha_fin
+    ).values(
+        'prenda__nombre'
+    ).annotate(
+        cantidad_total=Sum('cantidad'),
+        ganancia_total=Sum('subtotal')
+    ).filter(cantidad_total__gt=0).order_by('-cantidad_total')
+    if limite_prendas:
+        prendas_stats = prendas_stats[:limite_prendas]
+
+    # ========== SERVICIOS ==========
+    servicios_stats = ventas_periodo.values(
+        'tipo_servicio'
+    ).annotate(
+        num_pedidos=Sum('cantidad'),
+        ganancia_total=Sum('total')
+    ).filter(num_pedidos__gt=0).order_by('-num_pedidos')
+
+    return {
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'ingresos_totales': ingresos_totales,
+        'utilidad_neta': ingresos_totales,
+        'pago_efectivo': pago_efectivo,
+        'pago_tarjeta': pago_tarjeta,
+        'pago_transferencia': pago_transferencia,
+        'pct_efectivo': _porcentaje(pago_efectivo, total_pagos),
+        'pct_tarjeta': _porcentaje(pago_tarjeta, total_pagos),
+        'pct_transferencia': _porcentaje(pago_transferencia, total_pagos),
+        'prendas_stats': list(prendas_stats),
+        'servicios_stats': [
+            {'tipo_servicio': s['tipo_servicio'], 'cantidad': s['num_pedidos'],
+             'ganancia_total': s['ganancia_total']}
+            for s in servicios_stats
+        ],
+    }
+
+
+# Granularidades de la serie de ventas y cuántos puntos se permiten como máximo
+GRANULARIDADES = ('hora', 'dia', 'semana', 'mes')
+MAX_PUNTOS_SERIE = 1500
+
+
+def _inicio_cubeta(fecha, granularidad):
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _siguiente_cubeta(valor, granularidad):
+    if granularidad == 'hora':
+        return valor + timedelta(hours=1)
+    if granularidad == 'semana':
+        return valor + timedelta(days=7)
+    if granularidad == 'mes':
+        return (valor.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return valor + timedelta(days=1)
+
+
+def _cubetas(fecha_inicio, fecha_fin, granularidad):
+    """Todas las cubetas del período, en orden, para rellenar las vacías con cero"""
+    if granularidad == 'hora':
+        # Se avanza en UTC para no repetir ni saltar horas si hay cambio de horario
+        inicio, fin = rango_dias(fecha_inicio, fecha_fin)
+        zona = timezone.get_default_timezone()
+        valor, fin = inicio.astimezone(dt_timezone.utc), fin.astimezone(dt_timezone.utc)
+        while valor < fin:
+            yield valor.astimezone(zona)
+            valor = _siguiente_cubeta(valor, granularidad)
+        return
+    valor = _inicio_cubeta(fecha_inicio, granularidad)
+    while valor <= fecha_fin:
+        yield valor
+        valor = _siguiente_cubeta(valor, granularidad)
+
+
+def contar_cubetas(fecha_inicio, fecha_fin, granularidad):
+    """Número de puntos que tendría la serie (sin consultar la base de datos)"""
+    dias = (fecha_fin - fecha_inicio).days + 1
+    if granularidad == 'hora':
+        return dias * 24
+    if granularidad == 'semana':
+        return (fecha_fin - _inicio_cubeta(fecha_inicio, 'semana')).days // 7 + 1
+    if granularidad == 'mes':
+        return (fecha_fin.year - fecha_inicio.year) * 12 + fecha_fin.month - fecha_inicio.month + 1
+    return dias
+
+
+def serie_ventas(fecha_inicio, fecha_fin, granularidad):
+    """
+    Ingresos y número de pedidos pagados del período agrupados por hora,
+    día, semana o mes, con las cubetas vacías en cero.
+
+    Por día, semana y mes se agrupa VentaDiaria; por hora se agrupan los
+    pedidos del rango (VentaDiaria no guarda la hora). En ambos casos es una
+    sola consulta con Trunc* en la zona horaria del negocio.
+    """
+    if granularidad == 'hora':
+        filas = Pedido.objects.filter(
+            estado_pago='pagado',
+            **filtro_rango('fecha_recepcion', fecha_inicio, fecha_fin)
+        ).annotate(
+            cubeta=TruncHour('fecha_recepcion',
+                             tzinfo=timezone.get_default_timezone())
+        ).values('cubeta').annotate(
+            num_pedidos=Count('id'),
+            ingresos=Sum('total')
+        ).order_by()
+    else:
+        funcion = {'dia': TruncDay, 'semana': TruncWeek, 'mes': TruncMonth}[granularidad]
+        filas = VentaDiaria.objects.filter(
+            fecha__gte=fecha_inicio,
+            fecha__lte=fecha_fin
+        ).annotate(
+            cubeta=funcion('fecha')
+        ).values('cubeta').annotate(
+            num_pedidos=Sum('cantidad'),
+            ingresos=Sum('total')
+        ).order_by()
+
+    valores = {
+        fila['cubeta']: (fila['num_pedidos'] or 0, fila['ingresos'] or Decimal('0'))
+        for fila in filas
+    }
+
+    serie = []
+    for cubeta in _cubetas(fecha_inicio, fecha_fin, granularidad):
+        num_pedidos, ingresos = valores.get(cubeta, (0, Decimal('0')))
+        serie.append({
+            'inicio': cubeta.isoformat(),
+            'ingresos': float(ingresos),
+            'pedidos': num_pedidos,
+        })
+    return serie
+
+
+def serie_ventas_json(fecha_inicio, fecha_fin, granularidad):
+    """
+    Respuesta JSON (bytes) de la serie de ventas. Se guarda en la caché de
+    reportes, que se invalida sola cuando cambian las ventas de un día del
+    período; la versión de las ventas en la llave evita guardar una serie
+    calculada antes de una invalidación que llegó a media consulta.
+    """
+    tipo = f'serie_{granularidad}'
+    llave = [granularidad, cache_reportes.version_ventas()]
+    contenido = cache_reportes.obtener(tipo, fecha_inicio, fecha_fin, llave)
+    if contenido is not None:
+        return contenido
+
+    serie = serie_ventas(fecha_inicio, fecha_fin, granularidad)
+    contenido = json.dumps({
+        'granularidad': granularidad,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+        'ingresos_totales': round(sum(punto['ingresos'] for punto in serie), 2),
+        'pedidos_totales': sum(punto['pedidos'] for punto in serie),
+        'serie': serie,
+    }).encode('utf-8')
+    cache_reportes.guardar(tipo, fecha_inicio, fecha_fin, llave, contenido)
+    return contenido
+
+
+MODOS_COMPARACION = ('anterior', 'anio_anterior')
+
+
+def periodo_comparado(fecha_inicio, fecha_fin, modo):
+    """
+    Período contra el que se compara: el inmediato anterior de la misma
+    duración ('anterior') o las mismas fechas un año antes ('anio_anterior').
+    """
+    if modo == 'anio_anterior':
+        def un_anio_antes(fecha):
+            try:
+                return fecha.replace(year=fecha.year - 1)
+            except ValueError:
+                # 29 de febrero
+                return fecha.replace(year=fecha.year - 1, day=28)
+        return un_anio_antes(fecha_inicio), un_anio_antes(fecha_fin)
+    dias = (fecha_fin - fecha_inicio).days + 1
+    return fecha_inicio - timedelta(days=dias), fecha_inicio - timedelta(days=1)
+
+
+def _delta(actual, comparado):
+    diferencia = actual - comparado
+    return {
+        'actual': actual,
+        'comparado': comparado,
+        'diferencia': diferencia,
+        'porcentaje': round(diferencia / comparado * 100, 1) if comparado else None,
+    }
+
+
+def comparar_periodos(fecha_inicio, fecha_fin, modo, limite=10):
+    """
+    Resumen financiero del período y del período de comparación, lado a
+    lado y con sus diferencias.
+
+    Los dos períodos salen de la misma consulta: cada uno se suma con su
+    propio Sum(filter=...), así una fila cuenta en los dos cuando los rangos
+    se enciman (por ejemplo, más de un año comparado con 'anio_anterior').
+    Son dos consultas en total (VentaDiaria y VentaPrendaDiaria), una menos
+    que resumen_financiero() para un solo período.
+
+    'actual' y 'comparado' tienen la misma forma que resumen_financiero().
+    """
+    comparado_inicio, comparado_fin = periodo_comparado(fecha_inicio, fecha_fin, modo)
+    rangos = {
+        'actual': (fecha_inicio, fecha_fin),
+        'comparado': (comparado_inicio, comparado_fin),
+    }
+    filtros = {
+        periodo: Q(fecha__gte=inicio, fecha__lte=fin)
+        for periodo, (inicio, fin) in rangos.items()
+    }
+
+    def por_periodo(queryset, campo_total, *campos):
+        sumas = {}
+        for periodo, filtro in filtros.items():
+            sumas[f'cantidad_{periodo}'] = Sum('cantidad', filter=filtro)
+            sumas[f'total_{periodo}'] = Sum(campo_total, filter=filtro)
+        return queryset.filter(filtros['actual'] | filtros['comparado']).values(
+            *campos).annotate(**sumas).order_by()
+
+    # ========== TOTALES, MÉTODOS DE PAGO Y SERVICIOS ==========
+    pagos = {periodo: dict.fromkeys(METODOS_PAGO, Decimal('0')) for periodo in rangos}
+    servicios = {periodo: {} for periodo in rangos}
+    ingresos = dict.fromkeys(rangos, Decimal('0'))
+    for fila in por_periodo(VentaDiaria.objects.all(), 'total', 'tipo_servicio', 'metodo_pago'):
+        for periodo in rangos:
+            if fila[f'cantidad_{periodo}'] is None:
+                continue
+            total = fila[f'total_{periodo}'] or Decimal('0')
+            ingresos[periodo] += total
+            if fila['metodo_pago'] in pagos[periodo]:
+                pagos[periodo][fila['metodo_pago']] += total
+            cantidad, ganancia = servicios[periodo].get(fila['tipo_servicio'], (0, Decimal('0')))
+            servicios[periodo][fila['tipo_servicio']] = (
+                cantidad + fila[f'cantidad_{periodo}'], ganancia + total)
+
+    # ========== PRENDAS ==========
+    prendas = {periodo: {} for periodo in rangos}
+    for fila in por_periodo(VentaPrendaDiaria.objects.all(), 'subtotal', 'prenda__nombre'):
+        for periodo in rangos:
+            if fila[f'cantidad_{periodo}']:
+                prendas[periodo][fila['prenda__nombre']] = (
+                    fila[f'cantidad_{periodo}'], fila[f'total_{periodo}'])
+
+    resumenes = {}
+    for periodo, (inicio, fin) in rangos.items():
+        total_pagos = sum(pagos[periodo].values(), Decimal('0'))
+        resumen = {
+            'fecha_inicio': inicio,
+            'fecha_fin': fin,
+            'ingresos_totales': ingresos[periodo],
+            'utilidad_neta': ingresos[periodo],
+            'prendas_stats': [
+                {'prenda__nombre': nombre, 'cantidad_total': cantidad,
+                 'ganancia_total': ganancia}
+                for nombre, (cantidad, ganancia) in sorted(
+                    prendas[periodo].items(), key=lambda item: -item[1][0])[:limite]
+            ],
+            'servicios_stats': [
+                {'tipo_servicio': tipo, 'cantidad': cantidad, 'ganancia_total': ganancia}
+                for tipo, (cantidad, ganancia) in sorted(
+                    servicios[periodo].items(), key=lambda item: -item[1][0])
+                if cantidad > 0
+            ],
+        }
+        for metodo in METODOS_PAGO:
+            resumen[f'pago_{metodo}'] = pagos[periodo][metodo]
+            resumen[f'pct_{metodo}'] = _porcentaje(pagos[periodo][metodo], total_pagos)
+        resumenes[periodo] = resumen
+
+    def lado_a_lado(actual, comparado):
+        nombres = list(actual) + [nombre for nombre in comparado if nombre not in actual]
+        return [
+            {'nombre': nombre or 'Sin especificar',
+             'cantidad': _delta(actual.get(nombre, (0, 0))[0], comparado.get(nombre, (0, 0))[0]),
+             'ganancia': _delta(actual.get(nombre, (0, Decimal('0')))[1],
+                                comparado.get(nombre, (0, Decimal('0')))[1])}
+            for nombre in nombres[:limite]
+        ]
+
+    actual, comparado = resumenes['actual'], resumenes['comparado']
+    return {
+        'modo': modo,
+        'actual': actual,
+        'comparado': comparado,
+        'deltas': {
+            campo: _delta(actual[campo], comparado[campo])
+            for campo in ('ingresos_totales', 'pago_efectivo', 'pago_tarjeta', 'pago_transferencia')
+        },
+        'prendas': lado_a_lado(
+            {p['prenda__nombre']: (p['cantidad_total'], p['ganancia_total'])
+             for p in actual['prendas_stats']},
+            prendas['comparado']),
+        'servicios': lado_a_lado(
+            {s['tipo_servicio']: (s['cantidad'], s['ganancia_total'])
+             for s in actual['servicios_stats']},
+            servicios['comparado']),
+    }
+
+
+def metodos_pago_json(resumen):
+    """Lista para la gráfica de métodos de pago"""
+    return [
+        {'nombre': 'Efectivo', 'total': float(resumen['pago_efectivo']),
+         'porcentaje': float(resumen['pct_efectivo'])},
+        {'nombre': 'Tarjeta', 'total': float(resumen['pago_tarjeta']),
+         'porcentaje': float(resumen['pct_tarjeta'])},
+        {'nombre': 'Transferencia', 'total': float(resumen['pago_transferencia']),
+         'porcentaje': float(resumen['pct_transferencia'])},
+    ]
+
+
+# Prendas que salen en el PDF de finanzas. La vista, los trabajos por correo
+# y cierre_dia usan el mismo límite: el resumen es parte de la llave del caché
+PRENDAS_PDF = 10
+
+
+def pdf_reporte_financiero(resumen, esperar=False):
+    """
+    Bytes del PDF del reporte financiero para un resumen ya calculado.
+    Se toma de la caché de reportes si ya se generó con los mismos datos.
+    Retorna None si xhtml2pdf falla. Con esperar=True (trabajos en segundo
+    plano) espera turno en el servicio de PDF en lugar de lanzar PDFNoDisponible.
+    """
+    fecha_inicio, fecha_fin = resumen['fecha_inicio'], resumen['fecha_fin']
+    pdf_bytes = cache_reportes.obtener(
+        'reporte_pdf', fecha_inicio, fecha_fin, resumen)
+    if pdf_bytes is not None:
+        return pdf_bytes
+
+    template = get_template('admin/finanzas/reporte_finanzas_pdf.html')
+    html = template.render(resumen)
+
+    pdf_bytes = html_a_pdf(html, esperar=esperar)
+    if pdf_bytes is None:
+        return None
+
+    cache_reportes.guardar('reporte_pdf', fecha_inicio,
+                           fecha_fin, resumen, pdf_bytes)
+    return pdf_bytes
+
+
+def escribir_excel_detallado(archivo, fecha_inicio, fecha_fin, periodo_nombre, resumen):
+    """
+    Escribe en `archivo` un Excel con el resumen del período, una hoja
+    "Pedidos" (un renglón por pedido pagado) y una hoja "Detalle" con las
+    prendas de esos pedidos.
+
+    Usa el modo write-only de openpyxl y recorre los pedidos con
+    .iterator(), así que la memoria no crece con el número de renglones.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    negrita = Font(bold=True)
+    formato_moneda = '$#,##0.00'
+
+    def encabezado(ws, *titulos):
+        fila = []
+        for titulo in titulos:
+            celda = WriteOnlyCell(ws, value=titulo)
+            celda.font = negrita
+            fila.append(celda)
+        ws.append(fila)
+
+    def moneda(ws, valor):
+        celda = WriteOnlyCell(ws, value=float(valor or 0))
+        celda.number_format = formato_moneda
+        return celda
+
+    def fecha_local(valor):
+        # Excel no acepta fechas con zona horaria
+        return timezone.localtime(valor).replace(tzinfo=None)
+
+    # ========== RESUMEN ==========
+    ws = wb.create_sheet("Resumen")
+    ws.column_dimensions['A'].width = 30
+    ws.column_dimensions['B'].width = 15
+    ws.append(["REPORTE FINANCIERO - PUNTO LIMPIO"])
+    ws.append([periodo_nombre])
+    ws.append([])
+    encabezado(ws, "Concepto", "Monto")
+    ws.append(["Ingresos totales", moneda(ws, resumen['ingresos_totales'])])
+    ws.append(["Efectivo", moneda(ws, resumen['pago_efectivo'])])
+    ws.append(["Tarjeta", moneda(ws, resumen['pago_tarjeta'])])
+    ws.append(["Transferencia", moneda(ws, resumen['pago_transferencia'])])
+
+    # ========== PEDIDOS ==========
+    ws = wb.create_sheet("Pedidos")
+    for columna, ancho in zip('ABCDEFGH', (16, 18, 25, 25, 12, 15, 15, 12)):
+        ws.column_dimensions[columna].width = ancho
+    encabezado(ws, "Folio", "Fecha", "Cliente", "Servicio",
+               "Origen", "Método de pago", "Estado", "Total")
+
+    pedidos = Pedido.objects.filter(
+        estado_pago='pagado',
+        **filtro_rango('fecha_recepcion', fecha_inicio, fecha_fin)
+    ).order_by('fecha_recepcion', 'id').values_list(
+        'folio', 'fecha_recepcion', 'cliente__username', 'tipo_servicio',
+        'origen', 'metodo_pago', 'estado', 'total'
+    )
+    for folio, fecha, cliente, servicio, origen, metodo, estado, total in pedidos.iterator(chunk_size=2000):
+        ws.append([folio, fecha_local(fecha), cliente, servicio,
+                   origen, metodo, estado, moneda(ws, total)])
+
+    # ========== DETALLE ==========
+    ws = wb.create_sheet("Detalle")
+    for columna, ancho in zip('ABCDEFG', (16, 18, 30, 10, 10, 15, 12)):
+        ws.column_dimensions[columna].width = ancho
+    encabezado(ws, "Folio", "Fecha", "Prenda", "Cantidad",
+               "Peso", "Precio unitario", "Subtotal")
+
+    detalles = DetallePedido.objects.filter(
+        pedido__estado_pago='pagado',
+        **filtro_rango('pedido__fecha_recepcion', fecha_inicio, fecha_fin)
+    ).order_by('pedido__fecha_recepcion', 'pedido_id', 'id').values_list(
+        'pedido__folio', 'pedido__fecha_recepcion', 'prenda__nombre',
+        'cantidad', 'peso', 'precio_unitario', 'subtotal'
+    )
+    for folio, fecha, prenda, cantidad, peso, precio, subtotal in detalles.iterator(chunk_size=2000):
+        ws.append([folio, fecha_local(fecha), prenda or 'Sin prenda', cantidad,
+                   float(peso or 0), moneda(ws, precio), moneda(ws, subtotal)])
+
+    wb.save(archivo)
@@ -0,0 +1,139 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache_dashboard, cache_tickets, eventos
+from .models import (
+    Pedido, DetallePedido, VentaDiaria, VentaPrendaDiaria, TotalPagoDiario,
+    Maquina, Insumo, Incidencia, DudaQueja, Prenda, NotificacionStock
+)
+
+
+@receiver(pre_delete, sender=Pedido)
+def leer_pedido_eliminado(sender, instance, **kwargs):
+    """
+    Antes de borrar, lee (y bloquea) cómo cuenta el pedido en la base de
+    datos: la copia que se elimina puede estar desactualizada.
+    """
+    instance._venta_anterior = instance._venta_guardada(bloquear=True)
+
+
+@receiver(post_delete, sender=Pedido)
+def restar_pedido_eliminado(sender, instance, **kwargs):
+    """
+    Quita de VentaDiaria y TotalPagoDiario los pedidos eliminados, incluidos los que se borran
+    en cascada (por ejemplo al eliminar un usuario).
+    """
+    clave = instance._venta_anterior
+    VentaDiaria.acumular(clave, -1)
+    TotalPagoDiario.acumular(clave, -1)
+
+
+@receiver(pre_delete, sender=DetallePedido)
+def leer_detalle_eliminado(sender, instance, **kwargs):
+    """Igual que con el pedido: fecha del pedido y aporte de la línea tal como están guardados"""
+    pedido = Pedido.objects.filter(pk=instance.pedido_id).first()
+    instance._prenda_anterior = (
+        pedido.fecha_venta(bloquear=True) if pedido else None,
+        instance._prenda_guardada(bloquear=True),
+    )
+
+
+@receiver(post_delete, sender=DetallePedido)
+def restar_detalle_eliminado(sender, instance, **kwargs):
+    """Quita de VentaPrendaDiaria las líneas eliminadas de pedidos pagados"""
+    fecha, aporte = instance._prenda_anterior
+    VentaPrendaDiaria.acumular(fecha, aporte, -1)
+
+
+# Secciones del dashboard que dependen de cada modelo
+SECCIONES_DASHBOARD = {
+    Pedido: ('ganancias', 'servicios'),
+    Maquina: ('maquinas',),
+    Insumo: ('alertas',),
+    Incidencia: ('incidencias',),
+    DudaQueja: ('dudas',),
+    Prenda: ('prendas',),
+}
+
+
+def invalidar_dashboard(sender, instance, created=False, **kwargs):
+    """Invalida (al confirmar la transacción) solo las secciones afectadas"""
+    secciones = SECCIONES_DASHBOARD[sender]
+    # Pedido.save deja en _venta_anterior la venta guardada antes: si no
+    # cambió, las ganancias siguen igual y solo cambian los estados
+    if (sender is Pedido and not created and kwargs.get('signal') is post_save
+            and hasattr(instance, '_venta_anterior')
+            and instance._venta_anterior == instance.clave_venta()):
+        secciones = ('servicios',)
+    transaction.on_commit(lambda: cache_dashboard.invalidar(*secciones))
+
+
+for modelo in SECCIONES_DASHBOARD:
+    post_save.connect(invalidar_dashboard, sender=modelo,
+                      dispatch_uid=f'dashboard_save_{modelo.__name__}')
+    post_delete.connect(invalidar_dashboard, sender=modelo,
+                        dispatch_uid=f'dashboard_delete_{modelo.__name__}')
+
+
+# ========== EVENTOS EN VIVO (SSE) ==========
+
+@receiver(post_save, sender=Pedido)
+def avisar_estado_pedido(sender, instance, created, **kwargs):
+    """Avisa a los tableros cuando un pedido se crea o cambia de estado o de pago"""
+    actual = (instance.estado, instance.estado_pago)
+    anterior = getattr(instance, '_estado_original', None)
+    instance._estado_original = actual
+    if created or anterior != actual:
+        eventos.publicar('pedidos', 'pedido', eventos.datos_pedido(
+            instance, anterior[0] if anterior else None))
+
+
+@receiver(post_save, sender=Maquina)
+def avisar_estado_maquina(sender, instance, created, **kwargs):
+    """Avisa cuando una máquina se registra, se asigna, se libera o entra a mantenimiento"""
+    actual = (instance.estado, instance.pedido_actual_id)
+    anterior = getattr(instance, '_estado_original', None)
+    instance._estado_original = actual
+    if created or anterior != actual:
+        eventos.publicar('maquinas', 'maquina', eventos.datos_maquina(
+            instance, anterior[0] if anterior else None))
+
+
+@receiver(post_delete, sender=Maquina)
+def avisar_baja_maquina(sender, instance, **kwargs):
+    eventos.publicar('maquinas', 'maquina_baja', {
+        'id': instance.id, 'tipo': instance.tipo, 'estado': instance.estado})
+
+
+@receiver(post_save, sender=Insumo)
+def avisar_stock_critico(sender, instance, **kwargs):
+    # porcentaje lo calcula la base de datos: leer el valor recién guardado
+    instance.refresh_from_db(fields=['porcentaje'])
+    if instance.estado_alerta():
+        eventos.publicar('stock', 'stock', eventos.datos_insumo(instance))
+
+
+@receiver(post_save, sender=NotificacionStock)
+def avisar_aviso_stock(sender, instance, created, **kwargs):
+    """Un operador avisó que se está acabando un insumo"""
+    if created:
+        datos = eventos.datos_insumo(instance.insumo)
+        datos['texto'] = f'{instance.usuario.username} avisa: {datos["texto"]}'
+        eventos.publicar('stock', 'stock', datos)
+
+
+# ========== CACHÉ DE TICKETS ==========
+
+@receiver(post_save, sender=Pedido)
+def descartar_ticket_final(sender, instance, **kwargs):
+    """Los pedidos entregados o cancelados ya casi no se reimprimen"""
+    if instance.estado in cache_tickets.ESTADOS_FINALES:
+        pedido_id = instance.id
+        transaction.on_commit(lambda: cache_tickets.invalidar(pedido_id))
+
+
+@receiver(post_delete, sender=Pedido)
+def descartar_ticket_eliminado(sender, instance, **kwargs):
+    pedido_id = instance.id
+    transaction.on_commit(lambda: cache_tickets.invalidar(pedido_id))
@@ -0,0 +1,23 @@
+// Suscripción a los eventos en vivo del servidor (Server-Sent Events).
+// manejadores: { pedido: fn(datos), maquina: fn(datos), ... }
+function suscribirEventos(url, canales, manejadores) {
+    if (!window.EventSource) return null;
+
+    const fuente = new EventSource(url + '?canales=' + canales.join(','));
+    Object.keys(manejadores).forEach(function (tipo) {
+        fuente.addEventListener(tipo, function (e) {
+            manejadores[tipo](JSON.parse(e.data));
+        });
+    });
+    // Se perdieron eventos (reinicio del servidor o desconexión larga)
+    fuente.addEventListener('sincronizar', function () {
+        window.location.reload();
+    });
+    return fuente;
+}
+
+function escaparHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto == null ? '' : String(texto);
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
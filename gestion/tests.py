@@ -1,3 +1,2015 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import qrcode
+from PIL import Image
+
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from django.urls import reverse
+
+from usuarios.models import Usuario
+from .models import (
+    Pedido, DetallePedido, Prenda, VentaDiaria, VentaPrendaDiaria, TotalPagoDiario, Insumo, Maquina, Incidencia, DudaQueja,
+    CorreoTicket, TrabajoReporte, MovimientoOperador, CierreDia, CorteCaja
+)
+from . import analitica, cache_dashboard, cache_tickets, correos, estaticos, eventos, pdf, reportes, trabajos, utils
+from .cache_disco import CacheDisco
+from .escpos import ticket_escpos
+from .exportaciones import recorrer_por_llave
+from .reportes import hoy_local, rango_dias, filtro_rango
+
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+# Cachés en disco de las pruebas (no los de BASE_DIR/cache)
+CACHE_PRUEBAS = tempfile.mkdtemp(prefix='puntolimpio_pruebas_')
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TICKETS_CACHE_DIR=os.path.join(CACHE_PRUEBAS, 'tickets'),
+    REPORTES_CACHE_DIR=os.path.join(CACHE_PRUEBAS, 'reportes'),
+)
+class CacheTemporalTestCase(TestCase):
+    """
+    Pruebas que pasan por el caché de Django o por los cachés en disco:
+    el caché en memoria y los archivos en un directorio temporal que se
+    borra al terminar cada prueba.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(CACHE_PRUEBAS, ignore_errors=True)
+        super().tearDown()
+
+
+class RangoFechasTests(TestCase):
+    """Rangos semiabiertos en hora local en lugar de `__date`"""
+
+    def test_rango_cubre_dias_locales(self):
+        inicio, fin = rango_dias(date(2026, 3, 1), date(2026, 3, 31))
+        zona = timezone.get_default_timezone()
+        self.assertEqual(inicio, datetime(2026, 3, 1, tzinfo=zona))
+        self.assertEqual(fin, datetime(2026, 4, 1, tzinfo=zona))
+        self.assertEqual(str(inicio.tzinfo), 'America/Mexico_City')
+
+    def test_un_solo_dia(self):
+        inicio, fin = rango_dias(date(2026, 3, 1))
+        self.assertEqual(fin - inicio, timedelta(days=1))
+
+    def test_filtro_rango(self):
+        filtros = filtro_rango('fecha_recepcion', date(2026, 3, 1))
+        self.assertEqual(set(filtros), {'fecha_recepcion__gte', 'fecha_recepcion__lt'})
+
+
+class InsumoPorcentajeTests(CacheTemporalTestCase):
+    """Insumo.porcentaje calculado por la base de datos con la regla de antes"""
+
+    CASOS = [
+        ('0.29', '1'), ('33.33', '100'), ('1', '3'), ('2', '3'), ('7', '70'),
+        ('10', '100'), ('10.99', '100'), ('150', '100'), ('0', '100'), ('5', '0'),
+    ]
+
+    @staticmethod
+    def regla_anterior(stock, capacidad):
+        if capacidad > 0:
+            return int((stock / capacidad) * 100)
+        return 0
+
+    def test_igual_que_la_regla_anterior(self):
+        for n, (stock, capacidad) in enumerate(self.CASOS):
+            stock, capacidad = Decimal(stock), Decimal(capacidad)
+            with self.subTest(stock=stock, capacidad=capacidad):
+                insumo = Insumo.objects.create(nombre=f'Insumo {n}', codigo=f'I{n}',
+                                               stock_actual=stock, capacidad_maxima=capacidad)
+                insumo.refresh_from_db()
+                self.assertEqual(insumo.porcentaje, self.regla_anterior(stock, capacidad))
+
+    def test_filtro_critico_y_alertas(self):
+        for codigo, stock, capacidad in (('A', '10', '100'), ('B', '11', '100'),
+                                         ('C', '1', '0'), ('D', '5', '50')):
+            Insumo.objects.create(nombre=codigo, codigo=codigo, stock_actual=Decimal(stock),
+                                  capacidad_maxima=Decimal(capacidad))
+        criticos = Insumo.objects.filter(porcentaje__lte=Insumo.PORCENTAJE_CRITICO)
+        self.assertEqual(sorted(criticos.values_list('codigo', flat=True)), ['A', 'C', 'D'])
+        self.assertEqual(
+            [alerta['texto'] for alerta in cache_dashboard._alertas(hoy_local())['alertas_insumos']],
+            ['A al 10% de stock', 'C al 0% de stock', 'D al 10% de stock'])
+
+    def test_sin_guardar(self):
+        casos = [('5', '100', True, 'nivel-bajo'), ('30', '100', False, 'nivel-medio'),
+                 ('80', '100', False, 'nivel-alto'), ('1', '0', True, 'nivel-bajo')]
+        for stock, capacidad, alerta, color in casos:
+            with self.subTest(stock=stock, capacidad=capacidad):
+                insumo = Insumo(nombre='Nuevo', codigo='N', stock_actual=Decimal(stock),
+                                capacidad_maxima=Decimal(capacidad))
+                with self.assertNumQueries(0):
+                    self.assertEqual((insumo.estado_alerta(), insumo.color_barra()), (alerta, color))
+
+        guardado = Insumo.objects.create(nombre='Guardado', codigo='G', stock_actual=30)
+        guardado.refresh_from_db()
+        self.assertEqual((guardado.estado_alerta(), guardado.color_barra()), (False, 'nivel-medio'))
+
+
+class VentaDiariaTests(TestCase):
+    """
+    VentaDiaria debe coincidir siempre con los pedidos pagados, aunque el
+    pedido se guarde desde copias leídas antes de otro cambio.
+    """
+
+    def setUp(self):
+        self.cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        self.pedido = Pedido.objects.create(
+            cliente=self.cliente, tipo_servicio='Lavado', total=Decimal('50'))
+
+    def assertCuadra(self):
+        esperado = {
+            (fila['dia'], fila['metodo_pago'], fila['tipo_servicio'], fila['origen']):
+                (fila['cantidad'], fila['suma'])
+            for fila in Pedido.objects.filter(estado_pago='pagado').annotate(
+                dia=TruncDate('fecha_recepcion')
+            ).values('dia', 'metodo_pago', 'tipo_servicio', 'origen').annotate(
+                cantidad=Count('id'), suma=Sum('total')
+            ).order_by()
+        }
+        registrado = {
+            (venta.fecha, venta.metodo_pago, venta.tipo_servicio, venta.origen):
+                (venta.cantidad, venta.total)
+            for venta in VentaDiaria.objects.all()
+            if venta.cantidad or venta.total
+        }
+        self.assertEqual(registrado, esperado)
+
+    def _pagar(self, pedido, **campos):
+        pedido.estado_pago = 'pagado'
+        for campo, valor in campos.items():
+            setattr(pedido, campo, valor)
+        pedido.save()
+
+    def test_crear_y_marcar_pagado(self):
+        self.assertFalse(VentaDiaria.objects.exists())
+        Pedido.objects.create(cliente=self.cliente, tipo_servicio='Lavado',
+                              total=Decimal('30'), estado_pago='pagado')
+        self._pagar(self.pedido)
+        self.assertEqual(VentaDiaria.objects.get().cantidad, 2)
+        self.assertCuadra()
+
+    def test_cambiar_precio_metodo_y_despagar(self):
+        self._pagar(self.pedido)
+        self.pedido.total = Decimal('80')
+        self.pedido.save()
+        self.assertCuadra()
+        self.pedido.metodo_pago = 'tarjeta'
+        self.pedido.save()
+        self.assertCuadra()
+        self.pedido.estado_pago = 'pendiente'
+        self.pedido.save()
+        self.assertCuadra()
+        self.assertFalse(VentaDiaria.objects.exclude(cantidad=0).exists())
+
+    def test_eliminar(self):
+        self._pagar(self.pedido)
+        self.pedido.delete()
+        self.assertCuadra()
+        # Eliminado en cascada junto con el cliente
+        otro = Pedido.objects.create(cliente=self.cliente, total=Decimal('20'),
+                                     estado_pago='pagado')
+        self.cliente.delete()
+        self.assertFalse(Pedido.objects.filter(pk=otro.pk).exists())
+        self.assertCuadra()
+
+    def test_copias_desactualizadas(self):
+        self._pagar(self.pedido)
+        copia_a = Pedido.objects.get(pk=self.pedido.pk)
+        copia_b = Pedido.objects.get(pk=self.pedido.pk)
+
+        copia_a.total = Decimal('80')
+        copia_a.save()
+        # copia_b todavía tiene total=50 y lo vuelve a guardar así
+        copia_b.metodo_pago = 'tarjeta'
+        copia_b.save()
+        self.assertCuadra()
+
+        # Borrar una copia vieja resta lo que está guardado, no lo que tenía
+        copia_a.delete()
+        self.assertCuadra()
+
+
+class TotalPagoDiarioTests(TestCase):
+    """Totales por día y método de pago del corte de caja y su conciliación"""
+
+    def setUp(self):
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        self.pedidos = [
+            Pedido.objects.create(cliente=cliente, total=Decimal(total),
+                                  metodo_pago=metodo, estado_pago='pagado')
+            for total, metodo in (('50', 'efectivo'), ('30', 'efectivo'), ('20', 'tarjeta'))
+        ]
+
+    def _esperado(self):
+        return {
+            (fila['dia'], fila['metodo_pago']): (fila['cantidad'], fila['suma'])
+            for fila in Pedido.objects.filter(estado_pago='pagado').annotate(
+                dia=TruncDate('fecha_recepcion')
+            ).values('dia', 'metodo_pago').annotate(
+                cantidad=Count('id'), suma=Sum('total')
+            ).order_by()
+        }
+
+    def _registrado(self):
+        return {
+            (fila.fecha, fila.metodo_pago): (fila.cantidad, fila.total)
+            for fila in TotalPagoDiario.objects.all()
+            if fila.cantidad or fila.total
+        }
+
+    def test_totales_acumulados(self):
+        hoy = hoy_local()
+        self.assertEqual(self._registrado(), {
+            (hoy, 'efectivo'): (2, Decimal('80')),
+            (hoy, 'tarjeta'): (1, Decimal('20')),
+        })
+
+        pedido = self.pedidos[0]
+        pedido.metodo_pago = 'transferencia'
+        pedido.save()
+        self.pedidos[1].estado_pago = 'pendiente'
+        self.pedidos[1].save()
+        self.pedidos[2].delete()
+        self.assertEqual(self._registrado(), {(hoy, 'transferencia'): (1, Decimal('50'))})
+        self.assertEqual(self._registrado(), self._esperado())
+
+    def test_copias_desactualizadas(self):
+        copia_a = Pedido.objects.get(pk=self.pedidos[0].pk)
+        copia_b = Pedido.objects.get(pk=self.pedidos[0].pk)
+        copia_a.total = Decimal('80')
+        copia_a.save()
+        copia_b.metodo_pago = 'tarjeta'
+        copia_b.save()
+        self.assertEqual(self._registrado(), self._esperado())
+
+    def test_conciliar(self):
+        salida = StringIO()
+        call_command('conciliar_totales_pago', stdout=salida)
+        self.assertIn('TotalPagoDiario es consistente.', salida.getvalue())
+
+        hoy = hoy_local()
+        TotalPagoDiario.objects.filter(metodo_pago='tarjeta').update(total=0, cantidad=0)
+        TotalPagoDiario.objects.create(fecha=hoy - timedelta(days=1), metodo_pago='efectivo',
+                                       cantidad=1, total=Decimal('10'))
+        salida = StringIO()
+        with self.assertRaisesMessage(CommandError, '2 diferencias'):
+            call_command('conciliar_totales_pago', stdout=salida)
+        self.assertEqual(salida.getvalue().splitlines(), [
+            f"{hoy - timedelta(days=1)} efectivo: esperado=None registrado=(1, Decimal('10.00'))",
+            f"{hoy} tarjeta: esperado=(1, Decimal('20')) registrado=None",
+        ])
+
+        salida = StringIO()
+        call_command('conciliar_totales_pago', '--reparar', stdout=salida)
+        self.assertIn('2 filas corregidas', salida.getvalue())
+        self.assertEqual(self._registrado(), self._esperado())
+        call_command('conciliar_totales_pago', stdout=StringIO())
+
+    def test_pago_durante_la_reparacion(self):
+        TotalPagoDiario.objects.filter(metodo_pago='tarjeta').update(total=0, cantidad=0)
+        cliente = self.pedidos[0].cliente
+
+        class PagoAlReportar(StringIO):
+            # Otro pago llega después de leer los totales y antes de corregirlos
+            def write(self, texto):
+                if 'esperado=' in texto and not Pedido.objects.filter(total=Decimal('15')).exists():
+                    Pedido.objects.create(cliente=cliente, total=Decimal('15'),
+                                          metodo_pago='tarjeta', estado_pago='pagado')
+                return super().write(texto)
+
+        call_command('conciliar_totales_pago', '--reparar', stdout=PagoAlReportar())
+        self.assertEqual(self._registrado()[(hoy_local(), 'tarjeta')], (2, Decimal('35')))
+        self.assertEqual(self._registrado(), self._esperado())
+
+
+class VentaPrendaDiariaTests(TestCase):
+    """Resumen diario por prenda contra las líneas de los pedidos pagados"""
+
+    def setUp(self):
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        self.camisa = Prenda.objects.create(nombre='Camisa', precio=Decimal('15'))
+        self.pantalon = Prenda.objects.create(nombre='Pantalón', precio=Decimal('20'))
+        self.pedido = Pedido.objects.create(cliente=cliente, total=Decimal('100'),
+                                            estado_pago='pagado')
+        self.linea = DetallePedido.objects.create(
+            pedido=self.pedido, prenda=self.camisa, cantidad=2, precio_unitario=Decimal('15'))
+        DetallePedido.objects.create(
+            pedido=self.pedido, prenda=self.pantalon, cantidad=1, precio_unitario=Decimal('20'))
+
+    def assertCuadra(self):
+        esperado = {
+            (fila['dia'], fila['prenda_id']): (fila['cantidad_total'], fila['suma'])
+            for fila in DetallePedido.objects.filter(
+                pedido__estado_pago='pagado', prenda__isnull=False
+            ).annotate(dia=TruncDate('pedido__fecha_recepcion')).values(
+                'dia', 'prenda_id'
+            ).annotate(cantidad_total=Sum('cantidad'), suma=Sum('subtotal')).order_by()
+        }
+        registrado = {
+            (fila.fecha, fila.prenda_id): (fila.cantidad, fila.subtotal)
+            for fila in VentaPrendaDiaria.objects.all()
+            if fila.cantidad or fila.subtotal
+        }
+        self.assertEqual(registrado, esperado)
+        call_command('reconstruir_ventas_prendas', '--verificar', stdout=StringIO())
+
+    def test_lineas(self):
+        self.assertEqual(
+            VentaPrendaDiaria.objects.get(prenda=self.camisa).subtotal, Decimal('30'))
+        self.linea.cantidad = 5
+        self.linea.save()
+        self.assertCuadra()
+        self.linea.prenda = self.pantalon
+        self.linea.save()
+        self.assertCuadra()
+        self.linea.delete()
+        self.assertCuadra()
+
+    def test_pago_y_fecha_del_pedido(self):
+        self.pedido.estado_pago = 'pendiente'
+        self.pedido.save()
+        self.assertCuadra()
+        self.assertFalse(VentaPrendaDiaria.objects.exclude(cantidad=0).exists())
+
+        self.pedido.estado_pago = 'pagado'
+        self.pedido.fecha_recepcion -= timedelta(days=3)
+        self.pedido.save()
+        self.assertCuadra()
+        self.pedido.delete()
+        self.assertCuadra()
+
+    def test_copias_desactualizadas(self):
+        copia_a = DetallePedido.objects.get(pk=self.linea.pk)
+        copia_b = DetallePedido.objects.get(pk=self.linea.pk)
+        copia_a.cantidad = 4
+        copia_a.save()
+        # copia_b vuelve a guardar cantidad=2 con otra prenda
+        copia_b.prenda = self.pantalon
+        copia_b.save()
+        self.assertCuadra()
+        copia_a.delete()
+        self.assertCuadra()
+
+    def test_verificar_detecta_diferencias(self):
+        VentaPrendaDiaria.objects.filter(prenda=self.camisa).update(cantidad=7)
+        salida = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 diferencias'):
+            call_command('reconstruir_ventas_prendas', '--verificar', stdout=salida)
+        self.assertIn(f'prenda={self.camisa.id}: esperado=(2, ', salida.getvalue())
+
+        call_command('reconstruir_ventas_prendas', stdout=StringIO())
+        self.assertCuadra()
+
+    def test_linea_durante_la_reconstruccion(self):
+        VentaPrendaDiaria.objects.filter(prenda=self.camisa).update(cantidad=7)
+        pedido = self.pedido
+
+        class LineaAlReportar(StringIO):
+            # Otra línea llega después de leer el resumen y antes de corregirlo
+            def write(self, texto):
+                if 'esperado=' in texto and pedido.detalles.count() == 2:
+                    DetallePedido.objects.create(pedido=pedido, prenda=pedido.detalles.first().prenda,
+                                                 cantidad=3, precio_unitario=Decimal('15'))
+                return super().write(texto)
+
+        call_command('reconstruir_ventas_prendas', stdout=LineaAlReportar())
+        self.assertEqual(VentaPrendaDiaria.objects.get(prenda=self.camisa).cantidad, 5)
+        self.assertCuadra()
+
+
+@override_settings(PDF_PROCESOS=0)
+class ResumenFinancieroTests(CacheTemporalTestCase):
+    """Resumen de finanzas compartido por las vistas y su presupuesto de consultas"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        self.admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(self.admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        camisa = Prenda.objects.create(nombre='Camisa', precio=Decimal('25'))
+        edredon = Prenda.objects.create(nombre='Edredón', precio=Decimal('120'))
+        ventas = [
+            ('efectivo', 'Lavado por kilo', '150', camisa, 4),
+            ('efectivo', 'Tintorería', '50', edredon, 1),
+            ('tarjeta', 'Lavado por kilo', '200', camisa, 2),
+            ('transferencia', 'Planchado', '100', None, 0),
+        ]
+        for metodo, servicio, total, prenda, cantidad in ventas:
+            pedido = Pedido.objects.create(
+                cliente=cliente, tipo_servicio=servicio, total=Decimal(total),
+                estado_pago='pagado', metodo_pago=metodo)
+            if prenda:
+                DetallePedido.objects.create(pedido=pedido, prenda=prenda, cantidad=cantidad,
+                                             precio_unitario=prenda.precio)
+        # Sin pagar: no cuenta
+        Pedido.objects.create(cliente=cliente, tipo_servicio='Tintorería',
+                              total=Decimal('999'), metodo_pago='efectivo')
+
+    def test_resumen(self):
+        hoy = hoy_local()
+        with self.assertNumQueries(3):
+            resumen = reportes.resumen_financiero(hoy, hoy)
+
+        self.assertEqual(resumen['ingresos_totales'], Decimal('500'))
+        self.assertEqual(
+            (resumen['pago_efectivo'], resumen['pago_tarjeta'], resumen['pago_transferencia']),
+            (Decimal('200'), Decimal('200'), Decimal('100')))
+        self.assertEqual(
+            (resumen['pct_efectivo'], resumen['pct_tarjeta'], resumen['pct_transferencia']),
+            (40.0, 40.0, 20.0))
+        self.assertEqual(
+            [(p['prenda__nombre'], p['cantidad_total'], p['ganancia_total'])
+             for p in resumen['prendas_stats']],
+            [('Camisa', 6, Decimal('150')), ('Edredón', 1, Decimal('120'))])
+        self.assertEqual(
+            {s['tipo_servicio']: (s['cantidad'], s['ganancia_total'])
+             for s in resumen['servicios_stats']},
+            {'Lavado por kilo': (2, Decimal('350')), 'Tintorería': (1, Decimal('50')),
+             'Planchado': (1, Decimal('100'))})
+
+        # Con límite solo la prenda más vendida; sin ventas, todo en cero
+        self.assertEqual(len(reportes.resumen_financiero(hoy, hoy, limite_prendas=1)['prendas_stats']), 1)
+        vacio = reportes.resumen_financiero(hoy - timedelta(days=30), hoy - timedelta(days=1))
+        self.assertEqual((vacio['ingresos_totales'], vacio['pct_efectivo']), (Decimal('0'), 0))
+
+    def test_presupuesto_de_consultas(self):
+        # Sesión + usuario + las tres consultas del resumen
+        for nombre in ('admin_finanzas', 'imprimir_reporte_finanzas', 'exportar_finanzas_excel'):
+            with self.subTest(vista=nombre), self.assertNumQueries(5):
+                respuesta = self.client.get(reverse(nombre), {'filtro': 'mes'})
+            self.assertEqual(respuesta.status_code, 200)
+
+        # Sesión + usuario + grupo + corte guardado + totales del día
+        for nombre in ('admin_corte_caja', 'imprimir_corte_caja'):
+            with self.subTest(vista=nombre), self.assertNumQueries(5):
+                respuesta = self.client.get(reverse(nombre))
+            self.assertEqual(respuesta.status_code, 200)
+
+
+class ComparacionPeriodosTests(CacheTemporalTestCase):
+    """Período actual contra el anterior o el del año pasado, en dos consultas"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        self.camisa = Prenda.objects.create(nombre='Camisa', precio=Decimal('25'))
+
+    def venta(self, fecha, metodo, total, cantidad=1, prendas=0):
+        VentaDiaria.objects.create(fecha=fecha, metodo_pago=metodo, tipo_servicio='Lavado por kilo',
+                                   origen='mostrador', cantidad=cantidad, total=Decimal(total))
+        if prendas:
+            VentaPrendaDiaria.objects.create(fecha=fecha, prenda=self.camisa, cantidad=prendas,
+                                             subtotal=self.camisa.precio * prendas)
+
+    def test_periodo_anterior(self):
+        self.venta(date(2026, 3, 5), 'efectivo', '300', cantidad=3, prendas=3)
+        self.venta(date(2026, 3, 6), 'transferencia', '100')
+        self.venta(date(2026, 2, 20), 'efectivo', '200', cantidad=2, prendas=1)
+        # Fuera de los dos períodos
+        self.venta(date(2026, 2, 18), 'efectivo', '999')
+
+        with self.assertNumQueries(2):
+            comparacion = reportes.comparar_periodos(date(2026, 3, 1), date(2026, 3, 10), 'anterior')
+
+        comparado = comparacion['comparado']
+        self.assertEqual((comparado['fecha_inicio'], comparado['fecha_fin']),
+                         (date(2026, 2, 19), date(2026, 2, 28)))
+        deltas = comparacion['deltas']
+        self.assertEqual(deltas['ingresos_totales'], {
+            'actual': Decimal('400'), 'comparado': Decimal('200'),
+            'diferencia': Decimal('200'), 'porcentaje': 100})
+        self.assertEqual(deltas['pago_efectivo']['porcentaje'], 50)
+        # Sin ventas en el período comparado no hay porcentaje
+        self.assertEqual(deltas['pago_transferencia']['diferencia'], Decimal('100'))
+        self.assertIsNone(deltas['pago_transferencia']['porcentaje'])
+        self.assertIsNone(deltas['pago_tarjeta']['porcentaje'])
+
+        camisa, = comparacion['prendas']
+        self.assertEqual((camisa['nombre'], camisa['cantidad']['actual'], camisa['cantidad']['comparado']),
+                         ('Camisa', 3, 1))
+        self.assertEqual(camisa['ganancia']['diferencia'], Decimal('50'))
+        servicio, = comparacion['servicios']
+        self.assertEqual((servicio['cantidad']['actual'], servicio['cantidad']['comparado']), (4, 2))
+
+    def test_anio_anterior_con_periodos_encimados(self):
+        # Más de un año: 2024-06-01 cae en los dos períodos
+        self.venta(date(2024, 6, 1), 'efectivo', '150', prendas=2)
+        self.venta(date(2023, 6, 1), 'efectivo', '50')
+        self.venta(date(2026, 3, 1), 'tarjeta', '80')
+
+        with self.assertNumQueries(2):
+            comparacion = reportes.comparar_periodos(date(2024, 1, 1), date(2026, 3, 31), 'anio_anterior')
+
+        comparado = comparacion['comparado']
+        self.assertEqual((comparado['fecha_inicio'], comparado['fecha_fin']),
+                         (date(2023, 1, 1), date(2025, 3, 31)))
+        self.assertEqual(comparacion['actual']['ingresos_totales'], Decimal('230'))
+        self.assertEqual(comparado['ingresos_totales'], Decimal('200'))
+        self.assertEqual(comparado['pago_tarjeta'], Decimal('0'))
+        self.assertEqual(
+            [(p['prenda__nombre'], p['cantidad_total']) for p in comparado['prendas_stats']],
+            [('Camisa', 2)])
+
+    def test_anio_anterior_29_de_febrero(self):
+        self.assertEqual(reportes.periodo_comparado(date(2024, 2, 29), date(2024, 2, 29), 'anio_anterior'),
+                         (date(2023, 2, 28), date(2023, 2, 28)))
+
+    def test_vista(self):
+        self.venta(date(2026, 3, 5), 'efectivo', '300')
+        self.venta(date(2025, 3, 5), 'efectivo', '100')
+        parametros = {'filtro': 'personalizado', 'fecha_desde': '2026-03-01', 'fecha_hasta': '2026-03-10'}
+
+        # Sesión + usuario + las dos consultas de la comparación
+        with self.assertNumQueries(4):
+            respuesta = self.client.get(reverse('admin_finanzas'), {**parametros, 'comparar': 'anio_anterior'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['comparar'], 'anio_anterior')
+        self.assertEqual(respuesta.context['ingresos_totales'], 300.0)
+        ingresos = dict(respuesta.context['conceptos_comparacion'])['Ingresos totales']
+        self.assertEqual((ingresos['comparado'], ingresos['porcentaje']), (Decimal('100'), 200))
+
+        respuesta = self.client.get(reverse('admin_finanzas'), {**parametros, 'comparar': 'otro'})
+        self.assertIsNone(respuesta.context['comparar'])
+        self.assertIsNone(respuesta.context['comparacion'])
+
+
+class ExcelDetalladoTests(CacheTemporalTestCase):
+    """Excel write-only con la hoja de pedidos pagados y la de sus prendas"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        camisa = Prenda.objects.create(nombre='Camisa', precio=Decimal('25'))
+        self.pagados = []
+        for total, metodo in (('75', 'efectivo'), ('120', 'tarjeta')):
+            pedido = Pedido.objects.create(cliente=cliente, tipo_servicio='Lavado por kilo',
+                                           total=Decimal(total), estado_pago='pagado',
+                                           metodo_pago=metodo)
+            DetallePedido.objects.create(pedido=pedido, prenda=camisa, cantidad=3,
+                                         precio_unitario=camisa.precio)
+            self.pagados.append(pedido)
+        pendiente = Pedido.objects.create(cliente=cliente, total=Decimal('40'))
+        DetallePedido.objects.create(pedido=pendiente, prenda=None, cantidad=1,
+                                     precio_unitario=Decimal('40'))
+
+    def test_hojas(self):
+        from openpyxl import load_workbook
+
+        respuesta = self.client.get(reverse('exportar_finanzas_excel_detallado'), {'filtro': 'hoy'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('attachment', respuesta['Content-Disposition'])
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        self.assertEqual(libro.sheetnames, ['Resumen', 'Pedidos', 'Detalle'])
+
+        resumen = {fila[0]: fila[1] for fila in libro['Resumen'].iter_rows(min_row=5, values_only=True)}
+        self.assertEqual(resumen['Ingresos totales'], 195)
+
+        # Solo los pagados, en orden de recepción
+        pedidos = list(libro['Pedidos'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual([(fila[0], fila[5], fila[7]) for fila in pedidos],
+                         [(self.pagados[0].folio, 'efectivo', 75),
+                          (self.pagados[1].folio, 'tarjeta', 120)])
+        self.assertIsNone(pedidos[0][1].tzinfo)
+
+        detalle = list(libro['Detalle'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual([(fila[0], fila[2], fila[3], fila[6]) for fila in detalle],
+                         [(pedido.folio, 'Camisa', 3, 75) for pedido in self.pagados])
+
+
+class ExportacionHistorialTests(CacheTemporalTestCase):
+    """Historiales en CSV/NDJSON recorridos por llave (fecha, id) en lugar de OFFSET"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        self.admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        self.client.force_login(self.admin)
+        cliente = Usuario.objects.create_user('mlopez', first_name='María', password='x',
+                                              rol='cliente')
+        # Dos pares con la misma fecha para que el corte de página caiga en un empate
+        base = timezone.now() - timedelta(days=1)
+        fechas = [base, base, base + timedelta(hours=1), base + timedelta(hours=1),
+                  base + timedelta(hours=2)]
+        self.pedidos = [
+            Pedido.objects.create(cliente=cliente, total=Decimal('10') * (n + 1),
+                                  fecha_recepcion=fecha,
+                                  operador=self.operador if n % 2 else None)
+            for n, fecha in enumerate(fechas)
+        ]
+
+    def test_recorrer_por_llave(self):
+        esperado = [pedido.folio for pedido in sorted(
+            self.pedidos, key=lambda p: (p.fecha_recepcion, p.id), reverse=True)]
+        with CaptureQueriesContext(connection) as consultas:
+            filas = list(recorrer_por_llave(Pedido.objects.all(), 'fecha_recepcion',
+                                            ['folio'], tamano=2))
+        self.assertEqual([folio for folio, in filas], esperado)
+        # Páginas de 2, 2 y 1, sin OFFSET
+        self.assertEqual(len(consultas), 3)
+        self.assertFalse(any('OFFSET' in consulta['sql'] for consulta in consultas))
+
+    def test_plan_de_las_paginas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN es de SQLite')
+        MovimientoOperador.objects.bulk_create(
+            MovimientoOperador(operador=self.operador, accion='entrego', detalles=str(n))
+            for n in range(5))
+        recorridos = (
+            (Pedido.objects.all(), 'fecha_recepcion', ['folio', 'cliente__username', 'total'],
+             'pedido_historial_idx'),
+            (MovimientoOperador.objects.all(), 'fecha', ['operador__username', 'pedido__folio'],
+             'movimiento_historial_idx'),
+        )
+        for queryset, campo, campos, indice in recorridos:
+            with CaptureQueriesContext(connection) as consultas:
+                list(recorrer_por_llave(queryset, campo, campos, tamano=2))
+            planes = []
+            for consulta in consultas.captured_queries:
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + consulta['sql'])
+                    planes.append(' | '.join(str(fila[-1]) for fila in cursor.fetchall()))
+            for plan in planes:
+                self.assertIn(indice, plan, plan)
+                self.assertNotIn('TEMP B-TREE', plan, plan)
+            # Después de la primera página se busca desde la llave, no desde el inicio
+            for plan in planes[1:]:
+                self.assertIn(f'({campo}<?)', plan, plan)
+
+    def test_ventas_csv(self):
+        respuesta = self.client.get(reverse('exportar_historial_ventas'), {'buscar': 'maría'})
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('historial_ventas.csv', respuesta['Content-Disposition'])
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('\ufefffolio,fecha,cliente'))
+        renglones = list(csv.reader(StringIO(contenido.lstrip('\ufeff'))))
+        self.assertEqual(len(renglones), len(self.pedidos) + 1)
+        self.assertEqual(renglones[1][0], self.pedidos[-1].folio)
+        self.assertEqual(renglones[1][6], '50.00')
+
+        # Filtros de fecha y operador
+        manana = (hoy_local() + timedelta(days=1)).isoformat()
+        respuesta = self.client.get(reverse('exportar_historial_ventas'),
+                                    {'fecha_desde': manana})
+        self.assertEqual(len(b''.join(respuesta.streaming_content).splitlines()), 1)
+        respuesta = self.client.get(reverse('exportar_historial_ventas'),
+                                    {'operador': 'operador', 'formato': 'ndjson'})
+        registros = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        self.assertEqual({registro['folio'] for registro in registros},
+                         {self.pedidos[1].folio, self.pedidos[3].folio})
+
+    def test_movimientos_ndjson(self):
+        MovimientoOperador.objects.create(operador=self.operador, accion='entrego',
+                                          detalles='Entregó', pedido=self.pedidos[0])
+        MovimientoOperador.objects.create(operador=self.admin, accion='elimino',
+                                          detalles='Eliminó')
+        respuesta = self.client.get(reverse('exportar_historial_movimientos'),
+                                    {'formato': 'ndjson', 'operador': 'operador'})
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        registros = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        self.assertEqual(len(registros), 1)
+        self.assertEqual(
+            {clave: registros[0][clave] for clave in ('usuario', 'accion', 'detalles', 'folio')},
+            {'usuario': 'operador', 'accion': 'entrego', 'detalles': 'Entregó',
+             'folio': self.pedidos[0].folio})
+
+
+class TiemposEntregaTests(CacheTemporalTestCase):
+    """Percentiles, entregas a tiempo y desgloses calculados con NumPy"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+
+        # Recibidos el 2 de marzo a la 1:00 (hora local)
+        recepcion = rango_dias(date(2026, 3, 2))[0] + timedelta(hours=1)
+        pedidos = [
+            # (servicio, horas hasta la entrega, fecha estimada, operador)
+            ('Lavado', 2, date(2026, 3, 2), operador),    # a tiempo
+            ('Lavado', 10, date(2026, 3, 1), operador),   # tarde
+            ('Tintorería', 30, date(2026, 3, 3), None),   # a tiempo
+            ('Tintorería', 100, None, None),              # sin fecha estimada
+        ]
+        for servicio, horas, estimada, quien in pedidos:
+            Pedido.objects.create(
+                cliente=cliente, tipo_servicio=servicio, operador=quien, origen='operador',
+                estado='entregado', fecha_recepcion=recepcion,
+                fecha_entrega_estimada=estimada,
+                fecha_entrega_real=recepcion + timedelta(hours=horas))
+        # No cuentan: sin entregar y recibido fuera del período
+        Pedido.objects.create(cliente=cliente, tipo_servicio='Lavado', fecha_recepcion=recepcion)
+        Pedido.objects.create(cliente=cliente, tipo_servicio='Lavado', estado='entregado',
+                              fecha_recepcion=recepcion - timedelta(days=30),
+                              fecha_entrega_real=recepcion)
+
+    def test_tiempos_entrega(self):
+        analisis = analitica.tiempos_entrega(date(2026, 3, 1), date(2026, 3, 31))
+
+        # Horas: 2, 10, 30 y 100; percentiles con interpolación lineal
+        self.assertEqual(analisis['general'], {
+            'pedidos': 4, 'promedio_horas': 35.5, 'p50_horas': 20.0,
+            'p90_horas': 79.0, 'p99_horas': 97.9,
+            'con_fecha_estimada': 3, 'a_tiempo_pct': 66.7,
+        })
+        self.assertEqual([rango['pedidos'] for rango in analisis['distribucion']],
+                         [1, 1, 0, 1, 0, 1, 0])
+        self.assertIsNone(analisis['distribucion'][-1]['hasta_horas'])
+
+        por_servicio = {fila['nombre']: fila for fila in analisis['por_servicio']}
+        self.assertEqual((por_servicio['Lavado']['p50_horas'], por_servicio['Lavado']['a_tiempo_pct']),
+                         (6.0, 50.0))
+        self.assertEqual((por_servicio['Tintorería']['con_fecha_estimada'],
+                          por_servicio['Tintorería']['a_tiempo_pct']), (1, 100.0))
+        self.assertEqual({fila['nombre']: fila['pedidos'] for fila in analisis['por_operador']},
+                         {'operador': 2, 'Sin especificar': 2})
+        self.assertEqual([fila['nombre'] for fila in analisis['por_origen']], ['operador'])
+
+    def test_bloques_y_periodo_vacio(self):
+        import numpy as np
+
+        # El resultado no depende del tamaño de bloque con que se leen las columnas
+        pedidos = Pedido.objects.filter(estado='entregado', fecha_entrega_real__isnull=False)
+        completos = analitica._cargar(pedidos)
+        por_bloques = analitica._cargar(pedidos, tamano=1)
+        for completo, bloque in zip(completos[:2], por_bloques[:2]):
+            np.testing.assert_array_equal(completo, bloque)
+        self.assertEqual(completos[2:], por_bloques[2:])
+
+        vacio = analitica.tiempos_entrega(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual((vacio['general']['pedidos'], vacio['general']['p50_horas']), (0, None))
+        self.assertEqual(vacio['por_servicio'], [])
+
+    def test_api(self):
+        respuesta = self.client.get(reverse('api_analitica_tiempos'), {
+            'filtro': 'personalizado', 'fecha_desde': '2026-03-01', 'fecha_hasta': '2026-03-31'})
+        self.assertEqual(respuesta.json()['general']['pedidos'], 4)
+        respuesta = self.client.get(reverse('api_analitica_tiempos'), {
+            'filtro': 'personalizado', 'fecha_desde': '2026-03-xx', 'fecha_hasta': '2026-03-31'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_pagina_con_fecha_invalida(self):
+        respuesta = self.client.get(reverse('admin_analitica'), {
+            'filtro': 'personalizado', 'fecha_desde': 'x', 'fecha_hasta': '2026-03-31'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['filtro'], 'mes')
+        self.assertEqual((respuesta.context['fecha_inicio'], respuesta.context['fecha_fin']),
+                         reportes.calcular_periodo('mes'))
+        self.assertEqual([str(mensaje) for mensaje in respuesta.context['messages']],
+                         ['Fecha inválida, se muestra el mes actual.'])
+
+
+class PlanConsultasTests(CacheTemporalTestCase):
+    """
+    Las consultas que hacen el dashboard y las vistas de finanzas deben
+    resolverse con un índice y no recorriendo toda la tabla (EXPLAIN QUERY
+    PLAN de SQLite sobre el SQL capturado al llamar cada vista).
+    """
+
+    # Tablas que crecen con cada pedido
+    TABLAS = ('gestion_pedido', 'gestion_detallepedido', 'gestion_ventadiaria',
+              'gestion_totalpagodiario', 'gestion_ventaprendadiaria', 'gestion_insumo')
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN es de SQLite')
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        prenda = Prenda.objects.create(nombre='Camisa', precio=Decimal('25'))
+        pedido = Pedido.objects.create(cliente=cliente, total=Decimal('50'),
+                                       estado_pago='pagado', metodo_pago='efectivo')
+        DetallePedido.objects.create(pedido=pedido, prenda=prenda, cantidad=2,
+                                     precio_unitario=Decimal('25'))
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return ' | '.join(str(fila[-1]) for fila in cursor.fetchall())
+
+    def planes(self, nombre, **parametros):
+        """Plan de cada consulta de la vista sobre las tablas grandes: {tabla: [planes]}"""
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse(nombre), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        planes = {}
+        for consulta in consultas.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for tabla in self.TABLAS:
+                if f'"{tabla}"' in sql:
+                    planes.setdefault(tabla, []).append(self.plan(sql))
+        return planes
+
+    def assertUsaIndices(self, planes, *tablas):
+        for tabla in tablas:
+            self.assertIn(tabla, planes, f'La vista no consultó {tabla}')
+        for tabla, lista in planes.items():
+            for plan in lista:
+                # Un índice que cubre la consulta (SCAN ... USING COVERING INDEX) sí vale
+                pasos = [paso for paso in plan.split(' | ') if paso.startswith(f'SCAN {tabla}')]
+                for paso in pasos:
+                    self.assertIn('USING COVERING INDEX', paso, plan)
+                self.assertIn('INDEX', plan, plan)
+
+    def test_dashboard(self):
+        # Ganancias (rango por fecha), conteo agrupado por estado e insumos críticos
+        planes = self.planes('admin_dashboard')
+        self.assertUsaIndices(planes, 'gestion_pedido', 'gestion_insumo')
+        self.assertEqual(len(planes['gestion_pedido']), 2)
+
+    def test_finanzas(self):
+        for filtro in ('hoy', 'semana', 'mes'):
+            planes = self.planes('admin_finanzas', filtro=filtro)
+            self.assertUsaIndices(planes, 'gestion_ventadiaria', 'gestion_ventaprendadiaria')
+
+    def test_corte_caja(self):
+        self.assertUsaIndices(self.planes('admin_corte_caja'), 'gestion_totalpagodiario')
+
+    def test_finanzas_detalle_excel(self):
+        planes = self.planes('exportar_finanzas_excel_detallado', filtro='semana')
+        self.assertUsaIndices(planes, 'gestion_pedido', 'gestion_ventadiaria')
+
+
+@override_settings(PRUEBAS_CACHE_DIR=os.path.join(CACHE_PRUEBAS, 'pruebas'),
+                   PRUEBAS_CACHE_MAX_BYTES=25)
+class CacheDiscoTests(CacheTemporalTestCase):
+    """Escritura atómica y límite de bytes del caché en disco compartido"""
+
+    def setUp(self):
+        super().setUp()
+        self.disco = CacheDisco('pruebas', 'PRUEBAS_CACHE_DIR', 'PRUEBAS_CACHE_MAX_BYTES',
+                                1024, '.bin')
+
+    def test_lru(self):
+        self.disco.escribir('a.bin', b'a' * 10)
+        self.disco.escribir('b.bin', b'b' * 10)
+        hace_un_rato = time.time() - 60
+        for nombre in ('a.bin', 'b.bin'):
+            os.utime(self.disco.ruta(nombre), (hace_un_rato, hace_un_rato))
+
+        # Leer 'a' la marca como usada: al rebasar los 25 bytes se va 'b'
+        self.assertEqual(self.disco.leer('a.bin'), b'a' * 10)
+        self.disco.escribir('c.bin', b'c' * 10)
+        self.assertIsNone(self.disco.leer('b.bin'))
+        self.assertEqual(sorted(os.listdir(self.disco.directorio())), ['a.bin', 'c.bin'])
+
+    def test_escritura_fallida_no_deja_temporales(self):
+        with mock.patch('os.replace', side_effect=OSError('Disco lleno')):
+            with self.assertRaises(OSError):
+                self.disco.escribir('a.bin', b'a')
+        self.assertEqual(os.listdir(self.disco.directorio()), [])
+
+    @override_settings(PDF_MOTOR='reportlab')
+    def test_tickets(self):
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        pedido = Pedido.objects.create(cliente=cliente, total=Decimal('50'))
+        contenido, version = cache_tickets.ticket_pdf(pedido)
+        with mock.patch('gestion.cache_tickets.render_pdf_ticket') as render:
+            self.assertEqual(cache_tickets.ticket_pdf(pedido), (contenido, version))
+        render.assert_not_called()
+
+        # Otra versión reemplaza a la anterior del mismo pedido
+        pedido.total = Decimal('60')
+        _, nueva = cache_tickets.ticket_pdf(pedido)
+        self.assertEqual([entrada.name for entrada in cache_tickets._disco.archivos()],
+                         [f'ticket_{pedido.id}_{nueva}.pdf'])
+        cache_tickets.invalidar(pedido.id)
+        self.assertEqual(list(cache_tickets._disco.archivos()), [])
+
+
+@override_settings(PDF_MOTOR='reportlab')
+class ImprimirTicketTests(CacheTemporalTestCase):
+    """ETag del ticket guardado en disco y 304 al reimprimirlo"""
+
+    def setUp(self):
+        super().setUp()
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        self.client.force_login(operador)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        self.pedido = Pedido.objects.create(cliente=cliente, total=Decimal('50'))
+        self.url = reverse('imprimir_ticket', args=[self.pedido.id])
+
+    def archivos(self):
+        return [entrada.name for entrada in cache_tickets._disco.archivos()]
+
+    def test_etag_y_304(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.content.startswith(b'%PDF'))
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+        etag = respuesta['ETag']
+        self.assertEqual(etag, f'"{cache_tickets.version(self.pedido)}"')
+
+        with mock.patch('gestion.cache_tickets.render_pdf_ticket') as render:
+            respuesta = self.client.get(self.url, headers={'If-None-Match': etag})
+        render.assert_not_called()
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual((respuesta['ETag'], respuesta['Cache-Control']), (etag, 'private, no-cache'))
+
+        # Algo que sale impreso cambió: otra versión y el navegador recibe el PDF nuevo
+        self.pedido.total = Decimal('60')
+        self.pedido.save()
+        respuesta = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(self.archivos(), [f'ticket_{self.pedido.id}_{respuesta["ETag"][1:-1]}.pdf'])
+
+    def test_misma_version_en_memoria_y_en_la_base(self):
+        # total=Decimal('50') en memoria, Decimal('50.00') al leerlo de la tabla
+        guardado = Pedido.objects.select_related('cliente').get(pk=self.pedido.pk)
+        self.assertEqual(cache_tickets.version(self.pedido), cache_tickets.version(guardado))
+
+    def test_entregado_o_cancelado_sale_del_cache(self):
+        for estado in cache_tickets.ESTADOS_FINALES:
+            with self.subTest(estado=estado):
+                self.client.get(self.url)
+                self.assertEqual(len(self.archivos()), 1)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.pedido.estado = estado
+                    self.pedido.save()
+                self.assertEqual(self.archivos(), [])
+                # Reimprimirlo sigue funcionando, pero ya no se guarda
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+                self.assertEqual(self.archivos(), [])
+                self.pedido.estado = 'pendiente'
+                self.pedido.save()
+
+
+class SerieVentasTests(CacheTemporalTestCase):
+    """Serie de ventas en caché sin servir datos viejos"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        self.client.force_login(admin)
+        self.cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+
+    def _pagar(self, total):
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.objects.create(cliente=self.cliente, total=Decimal(total),
+                                  estado_pago='pagado')
+
+    def _ingresos(self):
+        respuesta = self.client.get(reverse('api_serie_finanzas'), {'granularidad': 'dia'})
+        return respuesta.json()['ingresos_totales']
+
+    def test_cache_e_invalidacion(self):
+        self._pagar('50')
+        self.assertEqual(self._ingresos(), 50)
+        with mock.patch('gestion.reportes.serie_ventas') as serie_ventas:
+            self.assertEqual(self._ingresos(), 50)
+        serie_ventas.assert_not_called()
+        self._pagar('25')
+        self.assertEqual(self._ingresos(), 75)
+
+    def test_invalidacion_a_media_consulta(self):
+        self._pagar('50')
+        serie_ventas = reportes.serie_ventas
+
+        def con_venta_a_media_consulta(*args):
+            # Se lee la serie y, antes de guardarla, llega otra venta
+            serie = serie_ventas(*args)
+            self._pagar('25')
+            return serie
+
+        with mock.patch('gestion.reportes.serie_ventas', con_venta_a_media_consulta):
+            self.assertEqual(self._ingresos(), 50)
+        # La serie guardada quedó con la versión anterior: no se sirve
+        self.assertEqual(self._ingresos(), 75)
+
+    def test_reconstruir_invalida(self):
+        self._pagar('50')
+        self.assertEqual(self._ingresos(), 50)
+        # queryset.update() no pasa por los signals: el resumen y la serie quedan viejos
+        Pedido.objects.update(total=Decimal('80'))
+        self.assertEqual(self._ingresos(), 50)
+        call_command('reconstruir_ventas_diarias', stdout=StringIO())
+        self.assertEqual(self._ingresos(), 80)
+
+
+class DashboardConsultasTests(CacheTemporalTestCase):
+    """El dashboard del administrador hace un número fijo de consultas"""
+
+    # sesión + usuario + ganancias + insumos + incidencias + dudas
+    # + estados + máquinas + prendas
+    CONSULTAS = 9
+
+    def setUp(self):
+        super().setUp()
+        self.admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        self.client.force_login(self.admin)
+
+        for estado in ('pendiente', 'en_proceso', 'listo', 'entregado'):
+            for _ in range(3):
+                Pedido.objects.create(cliente=cliente, estado=estado,
+                                      estado_pago='pagado', total=Decimal('100'))
+        Insumo.objects.create(nombre='Jabón', codigo='J1', stock_actual=5,
+                              capacidad_maxima=100)
+        Insumo.objects.create(nombre='Cloro', codigo='C1', stock_actual=Decimal('10.9'),
+                              capacidad_maxima=100)
+        Insumo.objects.create(nombre='Suavizante', codigo='S1', stock_actual=11,
+                              capacidad_maxima=100)
+        for n in range(3):
+            Maquina.objects.create(nombre=f'L{n}', tipo='lavadora', estado='ocupado')
+            Incidencia.objects.create(trabajador=operador, asunto=f'Falla {n}',
+                                      descripcion='-')
+            DudaQueja.objects.create(cliente=cliente, comentario=f'Duda {n}')
+
+    def test_numero_de_consultas(self):
+        with self.assertNumQueries(self.CONSULTAS):
+            respuesta = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(respuesta.status_code, 200)
+
+        contexto = respuesta.context
+        self.assertEqual(contexto['servicios_hoy'], 12)
+        self.assertEqual(contexto['ganancias_hoy'], Decimal('1200'))
+        self.assertEqual(contexto['servicios_totales'], 9)
+        self.assertEqual(contexto['servicios_pendientes'], 3)
+        self.assertEqual(contexto['maquinas_lavado'], 3)
+        self.assertEqual(contexto['maquinas_secado'], 0)
+        # Porcentaje truncado, como antes en Python: 10.9% cuenta como 10%
+        self.assertEqual(
+            sorted(alerta['texto'] for alerta in contexto['alertas_insumos']),
+            ['Cloro al 10% de stock', 'Jabón al 5% de stock'])
+
+    def test_cache_y_invalidacion_por_seccion(self):
+        url = reverse('admin_dashboard')
+        # Los contadores son del proceso: comparar contra los de antes
+        antes = cache_dashboard.estadisticas()
+        self.client.get(url)
+        # Con todo en caché solo quedan la sesión y el usuario
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        # Cambiar una máquina solo recalcula la sección de máquinas
+        maquina = Maquina.objects.get(nombre='L0')
+        maquina.estado = 'disponible'
+        with self.captureOnCommitCallbacks(execute=True):
+            maquina.save()
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.context['maquinas_lavado'], 2)
+
+        estadisticas = self.client.get(reverse('api_cache_dashboard')).json()
+        self.assertEqual(estadisticas['fallos'] - antes['fallos'], 7 + 1)
+        self.assertEqual(estadisticas['aciertos'] - antes['aciertos'], 7 + 6)
+        self.assertEqual(estadisticas['proceso'], os.getpid())
+
+    def test_una_sola_vez_por_proceso(self):
+        # Varias peticiones a la vez con la sección vacía: una la calcula
+        calculos = []
+        original = cache_dashboard.SECCIONES['servicios']
+
+        def lenta(hoy):
+            calculos.append(hoy)
+            time.sleep(0.2)
+            return {'servicios_totales': 0}
+
+        cache_dashboard.SECCIONES['servicios'] = (lenta, False)
+        self.addCleanup(cache_dashboard.SECCIONES.__setitem__, 'servicios', original)
+        llave = cache_dashboard._llave('servicios', 0, hoy_local())
+        hilos = [threading.Thread(target=cache_dashboard._calcular,
+                                  args=('servicios', llave, hoy_local()))
+                 for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual(cache.get(llave), {'servicios_totales': 0})
+
+
+class TicketEscposTests(TestCase):
+    """
+    Bytes ESC/POS del ticket contra archivos de referencia en testdata/.
+    Si el diseño cambia a propósito se regeneran con
+    ACTUALIZAR_TESTDATA=1 python manage.py test gestion
+    """
+
+    def _pedido(self, **campos):
+        cliente = Usuario(username='mlopez', first_name='María', last_name='López')
+        datos = dict(
+            folio='PL-20260105-0007', cliente=cliente, tipo_servicio='Lavado por kilo',
+            peso=Decimal('4.50'), cantidad_prendas=12, total=Decimal('157.50'),
+            metodo_pago='efectivo',
+            fecha_recepcion=datetime(2026, 1, 5, 16, 30, tzinfo=dt_timezone.utc),
+            fecha_entrega_estimada=date(2026, 1, 7),
+        )
+        datos.update(campos)
+        return Pedido(**datos)
+
+    def _comparar(self, contenido, archivo):
+        ruta = os.path.join(TESTDATA, archivo)
+        if os.environ.get('ACTUALIZAR_TESTDATA'):
+            with open(ruta, 'wb') as referencia:
+                referencia.write(contenido)
+        with open(ruta, 'rb') as referencia:
+            self.assertEqual(contenido, referencia.read())
+
+    def test_ticket(self):
+        self._comparar(ticket_escpos(self._pedido()), 'ticket_escpos.bin')
+
+    def test_ticket_con_nota_y_sin_nombre(self):
+        pedido = self._pedido(
+            observaciones='Separar prendas blancas, no usar suavizante en las toallas',
+            fecha_entrega_estimada=None, metodo_pago='tarjeta',
+        )
+        pedido.cliente.first_name = ''
+        self._comparar(ticket_escpos(pedido, cortar=False), 'ticket_escpos_nota.bin')
+
+    def test_sin_motor_pdf(self):
+        pedido = self._pedido()
+        inicio = time.perf_counter()
+        for _ in range(20):
+            ticket_escpos(pedido)
+        # Mucho menos de 5 ms por ticket; holgado para máquinas lentas
+        self.assertLess((time.perf_counter() - inicio) / 20, 0.005)
+
+    def test_vista(self):
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        pedido = Pedido.objects.create(cliente=cliente, total=Decimal('80'))
+        pedido.refresh_from_db()
+        self.client.force_login(operador)
+
+        respuesta = self.client.get(reverse('imprimir_ticket_escpos', args=[pedido.id]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+        self.assertEqual(respuesta.content, ticket_escpos(pedido))
+
+
+class PDFDirectoTests(CacheTemporalTestCase):
+    """
+    El dibujo directo con reportlab (PDF_MOTOR = 'reportlab') debe dar el
+    mismo texto que las plantillas HTML; se compara el texto extraído.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cliente = Usuario(username='mlopez', first_name='María', last_name='López')
+        self.pedido = Pedido(
+            folio='PL-20260105-0007', cliente=cliente, tipo_servicio='Lavado por kilo',
+            peso=Decimal('4.50'), cantidad_prendas=12, total=Decimal('157.50'),
+            metodo_pago='efectivo', observaciones='Sin suavizante',
+            fecha_recepcion=datetime(2026, 1, 5, 16, 30, tzinfo=dt_timezone.utc),
+            fecha_entrega_estimada=date(2026, 1, 7),
+        )
+
+    def paginas(self, contenido):
+        from pypdf import PdfReader
+
+        return [pagina.extract_text() for pagina in PdfReader(BytesIO(contenido)).pages]
+
+    def palabras(self, contenido):
+        # El acomodo cambia el orden de extracción, no las palabras
+        return sorted(' '.join(self.paginas(contenido)).split())
+
+    def test_ticket(self):
+        directo = utils.render_pdf_ticket(self.pedido, motor='reportlab')
+        self.assertEqual(self.palabras(directo),
+                         self.palabras(utils.render_pdf_ticket(self.pedido, motor='html', esperar=True)))
+        texto = ' '.join(self.paginas(directo)[0].split())
+        for esperado in ('Folio: PL-20260105-0007', 'Cliente: María López',
+                         'Fecha: 05/01/2026 10:30 AM', 'Entrega Aprox: 07/01/2026',
+                         'Lavado por kilo', '(12 pzas / 4.50 kg)', 'Nota: Sin suavizante',
+                         'Pago: EFECTIVO', 'TOTAL: $157.50'):
+            self.assertIn(esperado, texto)
+
+    def test_lote(self):
+        otro = Pedido(folio='PL-20260105-0008', cliente=Usuario(username='jperez'),
+                      tipo_servicio='Tintorería', total=Decimal('80'), metodo_pago='tarjeta',
+                      fecha_recepcion=self.pedido.fecha_recepcion)
+        paginas = self.paginas(utils.render_pdf_tickets([self.pedido, otro], motor='reportlab'))
+        self.assertEqual(len(paginas), 2)
+        self.assertIn('PL-20260105-0007', paginas[0])
+        self.assertIn('jperez', paginas[1])
+        self.assertIn('TOTAL: $80', paginas[1])
+
+    def test_corte_caja(self):
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        Pedido.objects.create(cliente=cliente, total=Decimal('120.50'),
+                              estado_pago='pagado', metodo_pago='tarjeta')
+
+        palabras = {}
+        for motor in pdf.MOTORES:
+            with self.settings(PDF_MOTOR=motor), \
+                    mock.patch('gestion.views.timezone.now', return_value=timezone.now()):
+                respuesta = self.client.get(reverse('imprimir_corte_caja'))
+            self.assertEqual(respuesta.status_code, 200)
+            palabras[motor] = self.palabras(respuesta.content)
+        self.assertEqual(palabras['reportlab'], palabras['html'])
+        self.assertEqual(palabras['reportlab'].count('$120.50'), 2)
+
+    def test_error_usa_html(self):
+        with mock.patch.object(utils.pdf_directo, 'ticket_pdf', side_effect=ValueError('fuente')):
+            with self.assertLogs('gestion.utils', 'ERROR'):
+                contenido = utils.render_pdf_ticket(self.pedido, motor='reportlab', esperar=True)
+            self.assertIn('PL-20260105-0007', self.paginas(contenido)[0])
+
+            with self.settings(DEBUG=True), self.assertRaises(ValueError):
+                utils.render_pdf_ticket(self.pedido, motor='reportlab')
+
+    def test_motor_por_defecto(self):
+        with self.settings(PDF_MOTOR='html'):
+            self.assertEqual(pdf.motor(), 'html')
+        with self.settings(PDF_MOTOR='otro'):
+            self.assertEqual(pdf.motor(), 'html')
+        with self.settings(PDF_MOTOR='reportlab'):
+            self.assertEqual(pdf.motor(), 'reportlab')
+
+    def test_benchmark_pdf(self):
+        salida = StringIO()
+        call_command('benchmark_pdf', tickets=2, stdout=salida)
+        lineas = salida.getvalue()
+        self.assertIn('2 tickets por motor', lineas)
+        for motor in pdf.MOTORES:
+            self.assertRegex(lineas, rf'{motor} +promedio +[0-9.]+ ms')
+        self.assertIn('más rápido que html', lineas)
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_pdf', tickets=0, stdout=StringIO())
+
+
+class EstaticosTests(SimpleTestCase):
+    """collectstatic con AlmacenEstaticos y EstaticosMiddleware sirviendo el resultado"""
+
+    CSS = ('body { font-family: "Poppins", sans-serif; color: #333; }\n' * 200).encode()
+
+    def setUp(self):
+        fuentes = tempfile.mkdtemp(prefix='puntolimpio_estaticos_')
+        self.raiz = tempfile.mkdtemp(prefix='puntolimpio_static_root_')
+        self.addCleanup(shutil.rmtree, fuentes, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+        os.makedirs(os.path.join(fuentes, 'css'))
+        with open(os.path.join(fuentes, 'css', 'app.css'), 'wb') as archivo:
+            archivo.write(self.CSS)
+
+        ajustes = override_settings(
+            STATIC_URL='/static/', STATIC_ROOT=self.raiz, STATICFILES_DIRS=[fuentes],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'])
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        self.middleware = estaticos.EstaticosMiddleware(lambda request: HttpResponse('app'))
+        manifest = estaticos.AlmacenEstaticos(location=self.raiz).hashed_files
+        self.con_hash = '/static/' + manifest['css/app.css']
+        self.factory = RequestFactory()
+
+    def pedir(self, ruta, metodo='get', **cabeceras):
+        return self.middleware(getattr(self.factory, metodo)(ruta, headers=cabeceras))
+
+    def contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_precomprimidos(self):
+        # .br solo se genera si está instalado el paquete opcional brotli
+        extensiones = ('.gz', '.br') if estaticos.brotli else ('.gz',)
+        for nombre in ('css/app.css', self.con_hash[len('/static/'):]):
+            for extension in extensiones:
+                self.assertTrue(os.path.isfile(os.path.join(self.raiz, nombre + extension)))
+
+    def test_codificacion_segun_accept_encoding(self):
+        import gzip
+
+        brotli = estaticos.brotli
+        casos = (
+            ('gzip, deflate, br', 'br', brotli.decompress) if brotli
+            else ('gzip, deflate, br', 'gzip', gzip.decompress),
+            ('gzip', 'gzip', gzip.decompress),
+            ('br;q=0, gzip;q=0.8', 'gzip', gzip.decompress),
+            ('', None, bytes),
+        )
+        for aceptadas, codificacion, descomprimir in casos:
+            with self.subTest(accept_encoding=aceptadas):
+                respuesta = self.pedir(self.con_hash, Accept_Encoding=aceptadas)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.get('Content-Encoding'), codificacion)
+                self.assertEqual(respuesta['Vary'], 'Accept-Encoding')
+                self.assertEqual(respuesta['Content-Type'], 'text/css; charset=utf-8')
+                self.assertEqual(descomprimir(self.contenido(respuesta)), self.CSS)
+
+        respuesta = self.pedir(self.con_hash, 'head', Accept_Encoding='gzip')
+        self.assertEqual(int(respuesta['Content-Length']),
+                         os.path.getsize(os.path.join(self.raiz, self.con_hash[8:] + '.gz')))
+
+    def test_if_none_match(self):
+        for aceptadas in ('br', 'gzip', ''):
+            etag = self.pedir(self.con_hash, Accept_Encoding=aceptadas)['ETag']
+            respuesta = self.pedir(self.con_hash, Accept_Encoding=aceptadas, If_None_Match=etag)
+            self.assertEqual(respuesta.status_code, 304)
+            self.assertNotIn('Content-Encoding', respuesta)
+            self.assertEqual(self.pedir(self.con_hash, If_None_Match=f'W/{etag}').status_code, 304)
+        self.assertEqual(self.pedir(self.con_hash, If_None_Match='"otro"').status_code, 200)
+
+    def test_cache_control(self):
+        self.assertEqual(self.pedir(self.con_hash)['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+        # Sin hash el contenido puede cambiar con el siguiente collectstatic
+        self.assertEqual(self.pedir('/static/css/app.css')['Cache-Control'],
+                         'public, max-age=0, must-revalidate')
+
+    def test_pasa_a_la_aplicacion(self):
+        with open(os.path.join(os.path.dirname(self.raiz), 'secreto.txt'), 'w') as archivo:
+            archivo.write('no')
+        self.addCleanup(os.remove, archivo.name)
+        rutas = ('/static/../secreto.txt', '/static/css/../../secreto.txt',
+                 '/static//etc/passwd', '/static/css/app.css.gz', '/static/css/no_existe.css',
+                 '/otra/css/app.css')
+        for ruta in rutas:
+            with self.subTest(ruta=ruta):
+                self.assertEqual(self.pedir(ruta).content, b'app')
+        self.assertEqual(self.pedir('/static/css/app.css', 'post').content, b'app')
+
+
+class ServicioPDFTests(SimpleTestCase):
+    """Cola acotada y tiempo máximo de ServicioPDF, sin pasar por xhtml2pdf"""
+
+    def test_cola_llena(self):
+        servicio = pdf.ServicioPDF(procesos=0, cola_max=0, timeout=5)
+        empezo, seguir = threading.Event(), threading.Event()
+
+        def convertir(html):
+            empezo.set()
+            seguir.wait(5)
+            return b'%PDF', 0.0
+
+        with mock.patch.object(pdf, '_convertir', convertir):
+            hilo = threading.Thread(target=servicio.convertir, args=('<p>uno</p>',))
+            hilo.start()
+            empezo.wait(5)
+            with self.assertRaises(pdf.PDFNoDisponible):
+                servicio.convertir('<p>dos</p>')
+            seguir.set()
+            hilo.join()
+            # Con el lugar libre el siguiente sí pasa
+            self.assertEqual(servicio.convertir('<p>tres</p>'), b'%PDF')
+
+        metricas = servicio.metricas()
+        self.assertEqual(metricas['rechazados'], 1)
+        self.assertEqual(metricas['trabajos'], 2)
+        self.assertEqual(metricas['en_cola'], 0)
+
+    def test_espera_acotada(self):
+        servicio = pdf.ServicioPDF(procesos=0, cola_max=0, timeout=5)
+        empezo, seguir = threading.Event(), threading.Event()
+
+        def convertir(html):
+            empezo.set()
+            seguir.wait(5)
+            return b'%PDF', 0.0
+
+        with mock.patch.object(pdf, '_convertir', convertir):
+            hilo = threading.Thread(target=servicio.convertir, args=('<p>uno</p>',))
+            hilo.start()
+            empezo.wait(5)
+            inicio = time.monotonic()
+            with self.assertRaises(pdf.PDFNoDisponible):
+                servicio.convertir('<p>dos</p>', esperar=0.2)
+            self.assertLess(time.monotonic() - inicio, 2)
+            seguir.set()
+            hilo.join()
+        self.assertEqual(servicio.metricas()['rechazados'], 1)
+
+    def test_tiempo_agotado(self):
+        servicio = pdf.ServicioPDF(procesos=1, cola_max=0, timeout=0.5)
+        self.addCleanup(servicio.cerrar)
+        servicio.iniciar(esperar=True)
+        pool = servicio._obtener_pool()
+        procesos = list(pool._processes.values())
+
+        # time.sleep se puede mandar al proceso y no regresa a tiempo
+        with mock.patch.object(pdf, '_convertir', time.sleep):
+            with self.assertRaises(pdf.PDFNoDisponible):
+                servicio.convertir(30)
+
+        # El lugar se libera sin esperar al proceso, que se terminó
+        self.assertEqual(servicio.metricas()['en_cola'], 0)
+        self.assertEqual(servicio.metricas()['tiempo_agotado'], 1)
+        for proceso in procesos:
+            proceso.join(5)
+            self.assertFalse(proceso.is_alive())
+        self.assertIsNot(servicio._obtener_pool(), pool)
+
+
+class CodigoQRTests(SimpleTestCase):
+    """QR del ticket: en memoria, con la máscara que elige qrcode"""
+
+    FOLIOS = [f'PL-20260105-{n:04d}' for n in range(16)]
+
+    def setUp(self):
+        utils.qr_png.cache_clear()
+        utils.qr_data_uri.cache_clear()
+
+    def test_misma_matriz_que_qrcode(self):
+        contenido = utils.url_rastreo(self.FOLIOS[0])
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, border=4)
+        qr.add_data(contenido)
+        qr.make(fit=True)
+        esperado = [0 if modulo else 255 for fila in qr.get_matrix() for modulo in fila]
+
+        imagen = Image.open(BytesIO(utils.qr_png(contenido, box_size=1)))
+        self.assertEqual(list(imagen.getdata()), esperado)
+
+    def test_sin_archivos_y_entre_hilos(self):
+        esperados = {folio: utils.qr_data_uri(folio) for folio in self.FOLIOS}
+        utils.qr_png.cache_clear()
+        utils.qr_data_uri.cache_clear()
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        resultados = {}
+
+        def generar(folio):
+            resultados[folio] = utils.qr_data_uri(folio)
+
+        with override_settings(MEDIA_ROOT=media), \
+                mock.patch('builtins.open', side_effect=AssertionError('open()')), \
+                mock.patch('tempfile.mkstemp', side_effect=AssertionError('mkstemp()')):
+            hilos = [threading.Thread(target=generar, args=(folio,)) for folio in self.FOLIOS * 4]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        self.assertEqual(resultados, esperados)
+        self.assertEqual(os.listdir(media), [])
+
+
+class BusEventosTests(SimpleTestCase):
+    """Pub/sub en memoria de los Server-Sent Events"""
+
+    async def recibir(self, suscripcion):
+        return await asyncio.wait_for(suscripcion.cola.get(), 1)
+
+    async def test_reparte_por_canal(self):
+        bus = eventos.Bus()
+        pedidos = bus.suscribir(['pedidos'])
+        todos = bus.suscribir(eventos.CANALES)
+        self.assertEqual(bus.conexiones(), 2)
+
+        # Se publica desde otro hilo, como lo hace un signal en una vista síncrona
+        await asyncio.to_thread(bus.publicar, 'maquinas', 'maquina', {'id': 3})
+        await asyncio.to_thread(bus.publicar, 'pedidos', 'pedido', {'id': 7, 'estado': 'listo'})
+
+        maquina, pedido = await self.recibir(todos), await self.recibir(todos)
+        self.assertEqual(maquina[1], 'maquinas')
+        # El mismo evento (los mismos bytes) para todas las conexiones
+        self.assertIs(await self.recibir(pedidos), pedido)
+        self.assertTrue(pedidos.cola.empty())
+        self.assertEqual(pedido[2], (
+            f'id: {eventos.ARRANQUE}-2\nevent: pedido\n'
+            'data: {"id":7,"estado":"listo"}\n\n').encode())
+
+        bus.cancelar(pedidos)
+        bus.cancelar(todos)
+        self.assertEqual(bus.conexiones(), 0)
+
+    async def test_navegador_lento(self):
+        bus = eventos.Bus()
+        suscripcion = bus.suscribir(['stock'])
+        for numero in range(eventos.MAX_PENDIENTES + 1):
+            bus.publicar('stock', 'stock', {'id': numero})
+        await asyncio.sleep(0.05)
+        # Cola llena: se descarta lo pendiente y se cierra el stream
+        self.assertIsNone(await self.recibir(suscripcion))
+        self.assertTrue(suscripcion.cola.empty())
+
+    async def test_reconexion(self):
+        bus = eventos.Bus()
+        for numero in range(3):
+            bus.publicar('pedidos', 'pedido', {'id': numero})
+        bus.publicar('stock', 'stock', {'id': 9})
+
+        suscripcion = bus.suscribir(['pedidos'], f'{eventos.ARRANQUE}-1')
+        self.assertEqual([(await self.recibir(suscripcion))[0] for _ in range(2)], [2, 3])
+        self.assertTrue(suscripcion.cola.empty())
+
+        # Id de otro arranque del servidor: recargar la página
+        suscripcion = bus.suscribir(['pedidos'], 'abc-1')
+        self.assertIn(b'event: sincronizar', (await self.recibir(suscripcion))[2])
+
+    async def test_stream(self):
+        bus = eventos.Bus()
+        with mock.patch.object(eventos, 'bus', bus):
+            stream = eventos.stream(['pedidos'])
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            bus.publicar('pedidos', 'pedido', {'id': 1})
+            self.assertIn(b'"id":1', await asyncio.wait_for(anext(stream), 1))
+            await stream.aclose()
+        self.assertEqual(bus.conexiones(), 0)
+
+
+class EventosSignalsTests(CacheTemporalTestCase):
+    """Los signals publican los cambios al confirmarse la transacción"""
+
+    def test_pedido_y_maquina(self):
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        with mock.patch.object(eventos.bus, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido = Pedido.objects.create(cliente=cliente, total=Decimal('50'))
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido.observaciones = 'Sin suavizante'
+                pedido.save()
+            self.assertEqual(publicar.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido.estado = 'en_proceso'
+                pedido.save()
+                # Antes del commit no se publica nada
+                self.assertEqual(publicar.call_count, 1)
+            self.assertEqual(publicar.call_count, 2)
+            canal, tipo, datos = publicar.call_args.args
+            self.assertEqual((canal, tipo, datos['folio'], datos['estado'], datos['anterior']),
+                             ('pedidos', 'pedido', pedido.folio, 'en_proceso', 'pendiente'))
+
+            maquina = Maquina.objects.create(nombre='Lavadora 1', tipo='lavadora')
+            with self.captureOnCommitCallbacks(execute=True):
+                maquina.estado = 'ocupado'
+                maquina.pedido_actual = pedido
+                maquina.save()
+            canal, tipo, datos = publicar.call_args.args
+            self.assertEqual((canal, datos['estado'], datos['folio']),
+                             ('maquinas', 'ocupado', pedido.folio))
+
+        # Con WSGI la vista responde 204 y el navegador deja de intentar
+        self.client.force_login(operador)
+        self.assertEqual(self.client.get(reverse('eventos_stream')).status_code, 204)
+        self.client.force_login(cliente)
+        self.assertEqual(self.client.get(reverse('eventos_stream')).status_code, 403)
+
+
+class CorreoCaido(BaseEmailBackend):
+    """Backend de correo que falla como un servidor SMTP que cerró la conexión"""
+
+    def send_messages(self, mensajes):
+        raise smtplib.SMTPServerDisconnected('Conexión cerrada')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class TrabajoReporteTests(CacheTemporalTestCase):
+    """Cola de reportes por correo (TrabajoReporte) y su worker"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        admin.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+        self.client.force_login(admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        Pedido.objects.create(cliente=cliente, total=Decimal('120'), estado_pago='pagado')
+
+    def _encolar(self):
+        respuesta = self.client.post(
+            reverse('enviar_reporte_email'),
+            json.dumps({'email': 'contador@correo.com', 'filtro': 'mes'}),
+            content_type='application/json')
+        datos = respuesta.json()
+        self.assertTrue(datos['success'])
+        return datos
+
+    def test_envio(self):
+        datos = self._encolar()
+        # La vista solo encola: nada se envía hasta que corre el worker
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.client.get(datos['estado_url']).json()['estado'], 'pendiente')
+
+        trabajo = trabajos.tomar_trabajo()
+        self.assertEqual(trabajo.id, datos['trabajo_id'])
+        self.assertIsNone(trabajos.tomar_trabajo())
+        trabajos.ejecutar_trabajo(trabajo)
+
+        estado = self.client.get(datos['estado_url']).json()
+        self.assertEqual((estado['estado'], estado['progreso']), ('completado', 'Enviado'))
+        self.assertEqual(mail.outbox[0].to, ['contador@correo.com'])
+        self.assertTrue(mail.outbox[0].attachments[0][1].startswith(b'%PDF'))
+
+    @override_settings(EMAIL_BACKEND='gestion.tests.CorreoCaido')
+    def test_reintentos_smtp(self):
+        self._encolar()
+        trabajos.ejecutar_trabajo(trabajos.tomar_trabajo())
+        trabajo = TrabajoReporte.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('pendiente', 1))
+        self.assertIn('Conexión cerrada', trabajo.error)
+        # Espera exponencial: todavía no se puede tomar
+        self.assertGreater(trabajo.disponible_desde, timezone.now())
+        self.assertIsNone(trabajos.tomar_trabajo())
+
+        TrabajoReporte.objects.update(disponible_desde=timezone.now(), intentos=4)
+        trabajos.ejecutar_trabajo(trabajos.tomar_trabajo())
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 5))
+
+    def test_error_de_archivo_no_se_reintenta(self):
+        self._encolar()
+        # El caché de reportes apunta a un archivo: makedirs falla con OSError
+        archivo = os.path.join(CACHE_PRUEBAS, 'no_es_directorio')
+        os.makedirs(CACHE_PRUEBAS, exist_ok=True)
+        open(archivo, 'w').close()
+        with self.settings(REPORTES_CACHE_DIR=archivo):
+            trabajos.ejecutar_trabajo(trabajos.tomar_trabajo())
+        trabajo = TrabajoReporte.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_recuperar_abandonados(self):
+        self._encolar()
+        trabajo = trabajos.tomar_trabajo()
+        self.assertIsNotNone(trabajo.fecha_tomado)
+        # Recién tomado: sigue siendo del worker que lo tomó
+        self.assertEqual(trabajos.recuperar_abandonados(), 0)
+
+        TrabajoReporte.objects.update(
+            fecha_tomado=timezone.now() - trabajos.RECUPERAR_TRAS - timedelta(seconds=1))
+        self.assertEqual(trabajos.recuperar_abandonados(), 1)
+        self.assertEqual(TrabajoReporte.objects.get().estado, 'pendiente')
+        self.assertEqual(trabajos.tomar_trabajo().id, trabajo.id)
+
+
+class CierreDiaTests(CacheTemporalTestCase):
+    """Totales de cierre_dia, cortes de caja y reanudación (sin generar los PDF)"""
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        self.ayer = hoy_local() - timedelta(days=1)
+
+    def pagar(self, dia, metodo, total):
+        return Pedido.objects.create(
+            cliente=self.cliente, tipo_servicio='Lavado por kilo', total=Decimal(total),
+            estado_pago='pagado', metodo_pago=metodo,
+            fecha_recepcion=rango_dias(dia)[0] + timedelta(hours=12))
+
+    def cerrar(self, *args, **opciones):
+        salida = StringIO()
+        call_command('cierre_dia', *args, sin_reportes=True, stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_totales_y_conciliacion(self):
+        self.pagar(self.ayer, 'efectivo', '100')
+        self.pagar(self.ayer, 'tarjeta', '50')
+        # El resumen diario quedó mal por un queryset.update()
+        VentaDiaria.objects.filter(metodo_pago='efectivo').update(total=Decimal('999'), cantidad=3)
+
+        self.cerrar()
+
+        self.assertEqual(
+            sorted(VentaDiaria.objects.values_list('metodo_pago', 'cantidad', 'total')),
+            [('efectivo', 1, Decimal('100')), ('tarjeta', 1, Decimal('50'))])
+        cierre = CierreDia.objects.get(fecha=self.ayer)
+        self.assertEqual(
+            (cierre.num_pedidos, cierre.ventas_efectivo, cierre.ventas_tarjeta,
+             cierre.ventas_transferencia, cierre.total_ventas, cierre.estado),
+            (2, Decimal('100'), Decimal('50'), Decimal('0'), Decimal('150'), 'completado'))
+
+    def test_pago_durante_la_correccion(self):
+        self.pagar(self.ayer, 'efectivo', '100')
+        VentaDiaria.objects.update(total=Decimal('999'))
+        get_or_create = VentaDiaria.objects.get_or_create
+
+        def pago_antes_de_corregir(**campos):
+            # Otro pago del mismo día llega después de leer los pedidos
+            if not Pedido.objects.filter(total=Decimal('25')).exists():
+                self.pagar(self.ayer, 'efectivo', '25')
+            return get_or_create(**campos)
+
+        with mock.patch.object(VentaDiaria.objects, 'get_or_create', pago_antes_de_corregir):
+            self.cerrar()
+        self.assertEqual(list(VentaDiaria.objects.values_list('cantidad', 'total')),
+                         [(2, Decimal('125'))])
+
+    def test_cortes_de_caja(self):
+        self.pagar(self.ayer, 'efectivo', '100')
+        self.pagar(self.ayer, 'transferencia', '40')
+        cortes = [
+            CorteCaja.objects.create(
+                fecha=self.ayer, total_fisico=Decimal(fisico),
+                responsable=Usuario.objects.create_user(nombre, password='x', rol='operador'))
+            for nombre, fisico in (('cajero1', '130'), ('cajero2', '140'))
+        ]
+        # Corte de otro día: no se toca
+        otro = CorteCaja.objects.create(fecha=self.ayer - timedelta(days=1), responsable=cortes[0].responsable,
+                                        total_fisico=Decimal('5'))
+
+        self.cerrar()
+
+        for corte, diferencia in zip(cortes, (Decimal('-10'), Decimal('0'))):
+            corte.refresh_from_db()
+            self.assertEqual(
+                (corte.ventas_efectivo, corte.ventas_tarjeta, corte.ventas_transferencia,
+                 corte.total_ventas, corte.diferencia),
+                (Decimal('100'), Decimal('0'), Decimal('40'), Decimal('140'), diferencia))
+        otro.refresh_from_db()
+        self.assertEqual((otro.total_ventas, otro.diferencia), (Decimal('0'), Decimal('0')))
+
+    def test_segunda_corrida_y_forzar(self):
+        pedido = self.pagar(self.ayer, 'efectivo', '100')
+        self.cerrar()
+        Pedido.objects.filter(pk=pedido.pk).update(total=Decimal('80'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            salida = self.cerrar()
+        self.assertIn('Sin días pendientes', salida)
+        self.assertFalse([c for c in consultas if not c['sql'].startswith('SELECT')])
+        self.assertEqual(CierreDia.objects.get(fecha=self.ayer).total_ventas, Decimal('100'))
+
+        self.assertIn('Cierre completado: 1 días', self.cerrar(forzar=True))
+        cierre = CierreDia.objects.get(fecha=self.ayer)
+        self.assertEqual((cierre.total_ventas, cierre.estado), (Decimal('80'), 'completado'))
+        self.assertEqual(VentaDiaria.objects.get().total, Decimal('80'))
+
+    def test_retoma_desde_totales(self):
+        self.pagar(self.ayer, 'efectivo', '100')
+        # Se interrumpió después de guardar los totales y antes de los PDF
+        CierreDia.objects.create(fecha=self.ayer, num_pedidos=1, ventas_efectivo=Decimal('100'),
+                                 total_ventas=Decimal('100'), estado='totales')
+
+        with mock.patch('gestion.management.commands.cierre_dia.Command._cerrar_totales') as totales:
+            self.cerrar()
+        totales.assert_not_called()
+        self.assertEqual(CierreDia.objects.get(fecha=self.ayer).estado, 'completado')
+
+    def test_llenar_historia(self):
+        desde = self.ayer - timedelta(days=3)
+        self.pagar(desde, 'efectivo', '10')
+        self.pagar(desde + timedelta(days=1), 'tarjeta', '20')
+        self.pagar(self.ayer, 'efectivo', '30')
+        # Ya cerrado: no se repite
+        self.cerrar(fecha=str(self.ayer))
+
+        salida = self.cerrar(desde=str(desde), hasta=str(self.ayer))
+        self.assertIn(f'Cierre completado: 3 días ({desde} a {self.ayer - timedelta(days=1)})', salida)
+        self.assertEqual(
+            list(CierreDia.objects.order_by('fecha').values_list('fecha', 'num_pedidos', 'total_ventas', 'estado')),
+            [(desde, 1, Decimal('10'), 'completado'),
+             (desde + timedelta(days=1), 1, Decimal('20'), 'completado'),
+             (desde + timedelta(days=2), 0, Decimal('0'), 'completado'),
+             (self.ayer, 1, Decimal('30'), 'completado')])
+
+        with self.assertRaises(CommandError):
+            self.cerrar(desde=str(self.ayer), hasta=str(desde))
+        with self.assertRaises(CommandError):
+            self.cerrar(fecha='ayer')
+
+
+class CierreDiaReportesTests(CacheTemporalTestCase):
+    """Los PDF que deja generados cierre_dia son los que después pide la vista"""
+
+    def setUp(self):
+        super().setUp()
+        admin = Usuario.objects.create_user('admin', password='x', rol='admin')
+        self.client.force_login(admin)
+        cliente = Usuario.objects.create_user('cliente', password='x', rol='cliente')
+        pedido = Pedido.objects.create(cliente=cliente, total=Decimal('500'),
+                                       estado_pago='pagado')
+        # Más prendas que las que salen en el PDF
+        for numero in range(12):
+            prenda = Prenda.objects.create(nombre=f'Prenda {numero}', precio=Decimal('10'))
+            DetallePedido.objects.create(pedido=pedido, prenda=prenda, cantidad=numero + 1,
+                                         precio_unitario=Decimal('10'))
+
+    def test_vista_usa_el_pdf_del_cierre(self):
+        call_command('cierre_dia', stdout=StringIO())
+        with mock.patch('gestion.reportes.html_a_pdf') as html_a_pdf:
+            for filtro in ('hoy', 'mes'):
+                respuesta = self.client.get(reverse('imprimir_reporte_finanzas'),
+                                            {'filtro': filtro})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertTrue(respuesta.content.startswith(b'%PDF'))
+        html_a_pdf.assert_not_called()
+
+
+class ConexionPrueba:
+    """Conexión SMTP falsa: cuenta aperturas y falla con los errores indicados"""
+
+    def __init__(self, errores=()):
+        self.errores = list(errores)
+        self.aperturas = 0
+        self.enviados = []
+
+    def open(self):
+        self.aperturas += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, mensajes):
+        error = self.errores.pop(0) if self.errores else None
+        if error:
+            raise error
+        self.enviados.extend(mensajes)
+        return len(mensajes)
+
+
+@override_settings(PDF_MOTOR='reportlab',
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class CorreoTicketTests(CacheTemporalTestCase):
+    """Bandeja de salida del ticket por correo"""
+
+    def setUp(self):
+        super().setUp()
+        self.operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        self.clientes = [
+            Usuario.objects.create_user(f'cliente{n}', email=f'c{n}@correo.com',
+                                        password='x', rol='cliente')
+            for n in range(3)
+        ]
+
+    def _encolar(self):
+        for cliente in self.clientes:
+            correos.encolar_ticket(Pedido.objects.create(cliente=cliente, total=Decimal('50')))
+
+    def test_nuevo_servicio_no_espera_el_correo(self):
+        self.client.force_login(self.operador)
+        respuesta = self.client.post(
+            reverse('nuevo_servicio'),
+            json.dumps({'cliente_id': self.clientes[0].id, 'total': 120}),
+            content_type='application/json')
+        self.assertTrue(respuesta.json()['success'])
+        self.assertEqual(len(mail.outbox), 0)
+        correo = CorreoTicket.objects.get()
+        self.assertEqual((correo.estado, correo.email_destino), ('pendiente', 'c0@correo.com'))
+
+    def test_lote_con_una_conexion(self):
+        self._encolar()
+        conexion = ConexionPrueba()
+        resultado = correos.enviar_lote(correos.tomar_lote(), conexion)
+
+        self.assertEqual(resultado['enviados'], 3)
+        self.assertEqual(conexion.aperturas, 1)
+        self.assertEqual(conexion.enviados[0].attachments[0][2], 'application/pdf')
+        self.assertEqual(correos.metricas()['por_estado']['enviado'], 3)
+        self.assertEqual(correos.tomar_lote(), [])
+
+    def test_reintentos_y_fallidos(self):
+        self._encolar()
+        conexion = ConexionPrueba([
+            smtplib.SMTPRecipientsRefused({'c0@correo.com': (550, b'No existe')}),
+            smtplib.SMTPDataError(451, b'Intente mas tarde'),
+            smtplib.SMTPServerDisconnected('Conexion cerrada'),
+        ])
+        resultado = correos.enviar_lote(correos.tomar_lote(), conexion)
+        self.assertEqual((resultado['fallidos'], resultado['reintentos']), (1, 2))
+
+        fallido, temporal, desconectado = CorreoTicket.objects.order_by('id')
+        self.assertEqual(fallido.estado, 'fallido')
+        self.assertEqual((temporal.estado, temporal.intentos), ('pendiente', 1))
+        # Espera exponencial: todavía no está disponible
+        self.assertGreater(temporal.disponible_desde, timezone.now())
+        self.assertEqual(correos.tomar_lote(), [])
+
+        # Al agotar los intentos queda como fallido
+        CorreoTicket.objects.update(disponible_desde=timezone.now(), intentos=4)
+        conexion = ConexionPrueba([smtplib.SMTPServerDisconnected('x')] * 2)
+        correos.enviar_lote(correos.tomar_lote(), conexion)
+        self.assertEqual(correos.metricas()['por_estado']['fallido'], 2)
+
+    def test_lote_lento_no_reenvia(self):
+        self._encolar()
+        lote = correos.tomar_lote()
+        tomado = lote[0].fecha_tomado
+        mensaje = correos._mensaje
+        renovados = []
+
+        def lento(correo):
+            renovados.append(CorreoTicket.objects.get(pk=correo.pk).fecha_tomado)
+            if len(renovados) == 1:
+                # Este correo tarda más de RECUPERAR_TRAS y otro worker
+                # recupera los del lote que todavía no se renuevan
+                CorreoTicket.objects.filter(estado='en_proceso').exclude(pk=correo.pk).update(
+                    fecha_tomado=timezone.now() - correos.RECUPERAR_TRAS - timedelta(seconds=1))
+                self.assertEqual(correos.recuperar_abandonados(), 2)
+            return mensaje(correo)
+
+        conexion = ConexionPrueba()
+        with mock.patch.object(correos, '_mensaje', lento):
+            resultado = correos.enviar_lote(lote, conexion)
+
+        # Los recuperados no se mandan desde este lote: los enviará quien los tome
+        self.assertEqual((resultado['enviados'], len(conexion.enviados)), (1, 1))
+        self.assertEqual(len(renovados), 1)
+        self.assertGreater(renovados[0], tomado)
+        self.assertEqual(correos.metricas()['por_estado']['pendiente'], 2)
+        self.assertEqual(len(correos.tomar_lote()), 2)
+
+    def test_espera_del_pdf_acotada(self):
+        self._encolar()
+        with mock.patch('gestion.cache_tickets.render_pdf_ticket', return_value=b'%PDF') as render:
+            correos.enviar_lote(correos.tomar_lote(), ConexionPrueba())
+        self.assertTrue(all(llamada.kwargs['esperar'] == correos.ESPERA_PDF
+                            for llamada in render.call_args_list))
+        self.assertLess(correos.ESPERA_PDF, correos.RECUPERAR_TRAS.total_seconds())
+
+@override_settings(PDF_MOTOR='reportlab')
+class TicketsLoteTests(CacheTemporalTestCase):
+    """Varios tickets en un solo PDF, con una sola consulta de pedidos"""
+
+    def setUp(self):
+        super().setUp()
+        operador = Usuario.objects.create_user('operador', password='x', rol='operador')
+        self.client.force_login(operador)
+        self.pedidos = [
+            Pedido.objects.create(
+                cliente=Usuario.objects.create_user(f'cliente{n}', password='x', rol='cliente'),
+                total=Decimal('50'))
+            for n in range(3)
+        ]
+
+    def _paginas(self, respuesta):
+        contenido = respuesta.content
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        return contenido.count(b'/Type /Page\n')
+
+    def test_por_ids(self):
+        ids = ','.join(str(pedido.id) for pedido in reversed(self.pedidos))
+        # sesión + usuario + pedidos con su cliente
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(reverse('imprimir_tickets_lote') + f'?ids={ids}')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self._paginas(respuesta), 3)
+
+    def test_por_fecha(self):
+        url = reverse('imprimir_tickets_lote')
+        respuesta = self.client.get(url + f'?fecha={hoy_local().isoformat()}')
+        self.assertEqual(self._paginas(respuesta), 3)
+
+        manana = hoy_local() + timedelta(days=1)
+        self.assertEqual(self.client.get(url + f'?fecha={manana.isoformat()}').status_code, 404)
+        self.assertEqual(self.client.get(url + f'?fecha={manana.isoformat()}&formato=escpos').status_code, 404)
+        self.assertEqual(self.client.get(url + '?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_escpos(self):
+        ids = ','.join(str(pedido.id) for pedido in reversed(self.pedidos))
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(reverse('imprimir_tickets_lote'), {'ids': ids, 'formato': 'escpos'})
+            # Un fragmento por ticket, en el orden pedido
+            fragmentos = list(respuesta.streaming_content)
+        self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+        self.assertIn('filename="tickets_seleccion.bin"', respuesta['Content-Disposition'])
+        # Como los lee la vista: total y peso con sus decimales de la tabla
+        guardados = Pedido.objects.select_related('cliente').in_bulk([p.id for p in self.pedidos])
+        self.assertEqual(fragmentos, [ticket_escpos(guardados[pedido.id])
+                                      for pedido in reversed(self.pedidos)])
+
+    def test_por_fecha_sobre_el_limite(self):
+        url = reverse('imprimir_tickets_lote') + f'?fecha={hoy_local().isoformat()}'
+        # Tres pedidos en el día: con límite 2 no se imprime un lote recortado
+        with mock.patch('gestion.views.MAX_TICKETS_LOTE', 2):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('tiene 3 pedidos', respuesta.content.decode())
+
+        with mock.patch('gestion.views.MAX_TICKETS_LOTE', 3):
+            self.assertEqual(self._paginas(self.client.get(url)), 3)
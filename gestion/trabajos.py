@@ -0,0 +1,159 @@
+"""
+Cola de trabajos en base de datos para enviar reportes por correo.
+
+Las vistas solo registran el trabajo (TrabajoReporte) y responden de
+inmediato; el comando ``manage.py procesar_trabajos`` los toma de la
+tabla, genera el PDF y lo envía por SMTP, reintentando con espera
+exponencial cuando falla la conexión con el servidor de correo. Los que
+quedaron 'en_proceso' porque el worker se detuvo vuelven a la cola después
+de RECUPERAR_TRAS.
+"""
+import smtplib
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils import timezone
+
+from .models import TrabajoReporte
+from .reportes import PRENDAS_PDF, resumen_financiero, pdf_reporte_financiero
+
+
+# Errores de envío que vale la pena reintentar: los del servidor de correo
+# y los de la conexión (no cualquier OSError, como un error de archivo)
+ERRORES_SMTP = (smtplib.SMTPException, ConnectionError, TimeoutError, socket.gaierror)
+
+# Un trabajo 'en_proceso' más viejo que esto se considera abandonado
+RECUPERAR_TRAS = timedelta(minutes=10)
+
+
+def espera_reintento(intentos):
+    """Segundos a esperar antes del siguiente intento: 30s, 60s, 120s... (máx. 1 hora)"""
+    base = getattr(settings, 'TRABAJOS_ESPERA_BASE', 30)
+    return min(base * 2 ** (intentos - 1), 3600)
+
+
+def encolar_reporte_email(usuario, email_destino, filtro, fecha_inicio, fecha_fin):
+    return TrabajoReporte.objects.create(
+        solicitado_por=usuario,
+        email_destino=email_destino,
+        filtro=filtro,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        progreso='En cola',
+    )
+
+
+def recuperar_abandonados():
+    """Devuelve a la cola los trabajos de un worker que se detuvo a media tarea"""
+    return TrabajoReporte.objects.filter(
+        estado='en_proceso', fecha_tomado__lt=timezone.now() - RECUPERAR_TRAS
+    ).update(estado='pendiente', progreso='En cola', disponible_desde=timezone.now())
+
+
+def tomar_trabajo():
+    """
+    Reserva el siguiente trabajo disponible y lo marca como en proceso.
+    El UPDATE condicionado al estado evita que dos workers tomen el mismo.
+    """
+    while True:
+        trabajo_id = TrabajoReporte.objects.filter(
+            estado='pendiente',
+            disponible_desde__lte=timezone.now()
+        ).order_by('disponible_desde', 'id').values_list('id', flat=True).first()
+        if trabajo_id is None:
+            return None
+
+        tomado = TrabajoReporte.objects.filter(
+            id=trabajo_id, estado='pendiente'
+        ).update(estado='en_proceso', progreso='Generando PDF', fecha_tomado=timezone.now())
+        if tomado:
+            return TrabajoReporte.objects.get(id=trabajo_id)
+
+
+def _actualizar(trabajo, **campos):
+    for campo, valor in campos.items():
+        setattr(trabajo, campo, valor)
+    trabajo.save(update_fields=list(campos))
+
+
+def _nombre_periodo(trabajo):
+    if trabajo.filtro == 'hoy':
+        return f"del día {trabajo.fecha_inicio.strftime('%d/%m/%Y')}"
+    if trabajo.filtro == 'semana':
+        return "de la última semana"
+    if trabajo.filtro == 'mes':
+        return "del mes actual"
+    return f"del {trabajo.fecha_inicio.strftime('%d/%m/%Y')} al {trabajo.fecha_fin.strftime('%d/%m/%Y')}"
+
+
+def _mensaje_reporte(trabajo, resumen, pdf_bytes):
+    periodo_nombre = _nombre_periodo(trabajo)
+    solicitante = trabajo.solicitado_por.username if trabajo.solicitado_por else 'el sistema'
+    fecha_solicitud = timezone.localtime(trabajo.fecha_creacion)
+
+    subject = f'Reporte Financiero Punto Limpio - {periodo_nombre}'
+    body = f'''Hola,
+
+        Adjunto encontrarás el reporte financiero de Punto Limpio {periodo_nombre}.
+
+        Resumen del periodo:
+        - Ingresos totales: ${resumen['ingresos_totales']:,.2f}
+        - Utilidad neta: ${resumen['utilidad_neta']:,.2f}
+
+        Métodos de pago:
+        - Efectivo: ${resumen['pago_efectivo']:,.2f} ({resumen['pct_efectivo']}%)
+        - Tarjeta: ${resumen['pago_tarjeta']:,.2f} ({resumen['pct_tarjeta']}%)
+        - Transferencia: ${resumen['pago_transferencia']:,.2f} ({resumen['pct_transferencia']}%)
+
+        Este reporte fue generado automáticamente por {solicitante} el {fecha_solicitud.strftime('%d/%m/%Y a las %H:%M')}.
+
+        Saludos,
+        Sistema Punto Limpio
+        '''
+
+    email = EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[trabajo.email_destino],
+    )
+    filename = f"reporte_financiero_{trabajo.fecha_inicio.strftime('%Y%m%d')}_{trabajo.fecha_fin.strftime('%Y%m%d')}.pdf"
+    email.attach(filename, pdf_bytes, 'application/pdf')
+    return email
+
+
+def ejecutar_trabajo(trabajo):
+    """Genera y envía el reporte de un trabajo ya tomado con tomar_trabajo()"""
+    try:
+        resumen = resumen_financiero(
+            trabajo.fecha_inicio, trabajo.fecha_fin, limite_prendas=PRENDAS_PDF)
+        pdf_bytes = pdf_reporte_financiero(resumen, esperar=True)
+        if pdf_bytes is None:
+            _actualizar(trabajo, estado='fallido', progreso='Error',
+                        error='Error al generar el PDF',
+                        fecha_terminado=timezone.now())
+            return
+
+        _actualizar(trabajo, progreso='Enviando correo')
+        _mensaje_reporte(trabajo, resumen, pdf_bytes).send()
+
+    except ERRORES_SMTP as e:
+        intentos = trabajo.intentos + 1
+        if intentos < trabajo.max_intentos:
+            _actualizar(
+                trabajo, estado='pendiente', intentos=intentos, error=str(e),
+                progreso=f'Reintento {intentos} de {trabajo.max_intentos - 1}',
+                disponible_desde=timezone.now() + timedelta(seconds=espera_reintento(intentos)))
+        else:
+            _actualizar(trabajo, estado='fallido', intentos=intentos, error=str(e),
+                        progreso='Error', fecha_terminado=timezone.now())
+        return
+    except Exception as e:
+        _actualizar(trabajo, estado='fallido', error=str(e), progreso='Error',
+                    fecha_terminado=timezone.now())
+        return
+
+    _actualizar(trabajo, estado='completado', progreso='Enviado', error=None,
+                fecha_terminado=timezone.now())
@@ -55,6 +55,16 @@ urlpatterns = [
     path('api/eliminar-servicio/', views.eliminar_servicio,
          name='eliminar_servicio'),
     path('api/precios/', views.obtener_precios_json, name='obtener_precios_json'),
+    path('api/finanzas/serie/', views.api_serie_finanzas,
+         name='api_serie_finanzas'),
+    path('panel-admin/analitica/', views.admin_analitica, name='admin_analitica'),
+    path('api/dashboard/cache/', views.api_cache_dashboard,
+         name='api_cache_dashboard'),
+    path('api/pdf/metricas/', views.api_metricas_pdf, name='api_metricas_pdf'),
+    path('api/correos/metricas/', views.api_metricas_correos,
+         name='api_metricas_correos'),
+    path('api/analitica/tiempos/', views.api_analitica_tiempos,
+         name='api_analitica_tiempos'),
     path('api/buscar-clientes/', views.buscar_clientes, name='buscar_clientes'),
 
     path('panel-admin/inventarios/',
@@ -67,6 +77,11 @@ urlpatterns = [
          views.admin_historialVentas, name='historial_ventas'),
     path('panel-admin/historial/movimientos/',
          views.admin_historialMovimientos, name='historial_movimientos'),
+    path('panel-admin/historial/ventas/exportar/',
+         views.exportar_historial_ventas, name='exportar_historial_ventas'),
+    path('panel-admin/historial/movimientos/exportar/',
+         views.exportar_historial_movimientos,
+         name='exportar_historial_movimientos'),
     path('panel-admin/historial/detalle-venta/<int:pedido_id>/',
          views.admin_detalleVenta, name='detalle_venta'),
     path('panel-admin/incidencias/',
@@ -102,8 +117,12 @@ urlpatterns = [
          views.eliminar_insumo, name='eliminar_insumo'),
 
     path('api/asignar-maquina/', views.asignar_maquina, name='asignar_maquina'),
+    path('eventos/', views.eventos_stream, name='eventos_stream'),
     path('ticket/imprimir/<int:pedido_id>/',
          views.imprimir_ticket, name='imprimir_ticket'),
+    path('ticket/lote/', views.imprimir_tickets_lote, name='imprimir_tickets_lote'),
+    path('ticket/escpos/<int:pedido_id>/',
+         views.imprimir_ticket_escpos, name='imprimir_ticket_escpos'),
 
     # --- FLUJO DE ENTREGA Y VALIDACIÓN ---
     path('validar-ticket/', views.validar_ticket, name='validar_ticket'),
@@ -119,10 +138,15 @@ urlpatterns = [
     # Nuevas rutas para finanzas
     path('panel-admin/finanzas/exportar-excel/',
          views.exportar_finanzas_excel, name='exportar_finanzas_excel'),
+    path('panel-admin/finanzas/exportar-excel/detallado/',
+         views.exportar_finanzas_excel_detallado,
+         name='exportar_finanzas_excel_detallado'),
     path('panel-admin/finanzas/imprimir-reporte/',
          views.imprimir_reporte_finanzas, name='imprimir_reporte_finanzas'),
     path('panel-admin/finanzas/enviar-email/',
          views.enviar_reporte_email, name='enviar_reporte_email'),
+    path('panel-admin/finanzas/enviar-email/<int:trabajo_id>/estado/',
+         views.estado_reporte_email, name='estado_reporte_email'),
     path('panel-admin/finanzas/corte-caja/imprimir/',
          views.imprimir_corte_caja, name='imprimir_corte_caja')
 
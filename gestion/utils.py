@@ -1,85 +1,158 @@
+import base64
+import logging
 import qrcode
-import os
+from PIL import Image
+from functools import lru_cache
 from io import BytesIO
 from django.core.mail import EmailMessage
 from django.template.loader import get_template
 from django.conf import settings
-from xhtml2pdf import pisa
 
+from . import pdf_directo
+from .pdf import html_a_pdf, motor as motor_pdf
 
-def render_pdf_ticket(pedido):
-    """
-    Genera el contenido en bytes del PDF del ticket.
-    Retorna los bytes del PDF o None si hay error.
-    """
-    # 1. Generar Código QR (Apunta a una URL de rastreo)
+
+logger = logging.getLogger(__name__)
+
+
+PLANTILLA_TICKET = 'gestion/tickets/tickets_pdf.html'
+PLANTILLA_TICKET_CUERPO = 'gestion/tickets/_ticket.html'
+PLANTILLA_TICKETS_LOTE = 'gestion/tickets/tickets_lote_pdf.html'
+
+
+PLANTILLA_CORTE_CAJA = 'admin/finanzas/corte_caja_pdf.html'
+
+
+def url_rastreo(folio):
     # Ajusta 'localhost:8000' por tu dominio real cuando lo subas a internet
-    url_rastreo = f"http://localhost:8000/cliente/rastreo-servicio/?folio={pedido.folio}"
+    return f"http://localhost:8000/cliente/rastreo-servicio/?folio={folio}"
 
+
+@lru_cache(maxsize=256)
+def qr_png(contenido, box_size=10):
+    """
+    Bytes PNG del código QR, generado en memoria (sin archivos temporales en
+    MEDIA_ROOT). Los mismos datos dan la misma imagen, así que las
+    reimpresiones de un folio reutilizan la última generada.
+
+    Con box_size=1 cada módulo del QR es un pixel: el PDF lo escala sin
+    suavizar y la imagen que se incrusta es cientos de veces más chica.
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
+        box_size=box_size,
         border=4,
     )
-    qr.add_data(url_rastreo)
+    qr.add_data(contenido)
     qr.make(fit=True)
-    img_qr = qr.make_image(fill_color="black", back_color="white")
 
-    # Guardar QR temporalmente para que xhtml2pdf lo pueda leer
-    qr_filename = f'qr_{pedido.folio}.png'
-    qr_path = os.path.join(settings.MEDIA_ROOT, qr_filename)
+    # La imagen se arma de la matriz de módulos (incluye el borde) en lugar
+    # de dibujar cada módulo con make_image()
+    matriz = qr.get_matrix()
+    lado = len(matriz)
+    img_qr = Image.frombytes(
+        'L', (lado, lado), bytes(0 if modulo else 255 for fila in matriz for modulo in fila))
+    if box_size > 1:
+        img_qr = img_qr.resize((lado * box_size, lado * box_size), Image.NEAREST)
+
+    buffer = BytesIO()
+    img_qr.save(buffer, format='PNG')
+    return buffer.getvalue()
+
 
-    # Asegurar que existe el directorio media
-    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+@lru_cache(maxsize=256)
+def qr_data_uri(contenido):
+    """PNG del código QR como data URI (para la plantilla HTML del ticket)"""
+    return 'data:image/png;base64,' + base64.b64encode(qr_png(contenido)).decode('ascii')
 
-    img_qr.save(qr_path)
 
-    # 2. Renderizar Template HTML con los datos
-    template_path = 'gestion/tickets/tickets_pdf.html'
+def render_pdf_ticket(pedido, motor=None, esperar=False):
+    """
+    Genera el contenido en bytes del PDF del ticket.
+    Retorna los bytes del PDF o None si hay error.
+    """
+    # 1. Generar Código QR (Apunta a una URL de rastreo)
+    url = url_rastreo(pedido.folio)
+
+    # 2. Dibujo directo; si falla se usa la plantilla HTML
+    if (motor or motor_pdf()) == 'reportlab':
+        try:
+            return pdf_directo.ticket_pdf(pedido, qr_png(url, box_size=1))
+        except Exception:
+            # En desarrollo el error se ve; en producción queda en el log
+            if settings.DEBUG:
+                raise
+            logger.exception('Error dibujando el ticket del pedido %s, se usa HTML', pedido.folio)
+
+    # 3. Renderizar Template HTML con los datos
+    template_path = PLANTILLA_TICKET
     context = {
         'pedido': pedido,
-        'qr_path': qr_path,
+        'qr_src': qr_data_uri(url),
         # Puedes pasar más variables de contexto si lo necesitas
     }
 
     template = get_template(template_path)
     html = template.render(context)
 
-    # 3. Generar PDF en memoria
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    # 4. Generar PDF en el servicio de PDF (puede lanzar PDFNoDisponible)
+    pdf_bytes = html_a_pdf(html, esperar=esperar)
+    if pdf_bytes is None:
+        print(f"Error generando PDF para pedido {pedido.folio}")
+    return pdf_bytes
 
-    # Limpieza: borrar la imagen QR temporal del disco
-    if os.path.exists(qr_path):
-        os.remove(qr_path)
 
-    if pdf.err:
-        print(f"Error generando PDF para pedido {pedido.folio}")
-        return None
+def render_pdf_tickets(pedidos, motor=None):
+    """
+    Un solo PDF con los tickets de varios pedidos (una página por ticket),
+    generado en una sola pasada del motor. Retorna los bytes o None si hay
+    error; con la plantilla HTML puede lanzar PDFNoDisponible.
+    """
+    if (motor or motor_pdf()) == 'reportlab':
+        try:
+            return pdf_directo.tickets_pdf(
+                [(pedido, qr_png(url_rastreo(pedido.folio), box_size=1)) for pedido in pedidos])
+        except Exception:
+            if settings.DEBUG:
+                raise
+            logger.exception('Error dibujando el lote de tickets, se usa HTML')
+
+    tickets = [{'pedido': pedido, 'qr_src': qr_data_uri(url_rastreo(pedido.folio))}
+               for pedido in pedidos]
+    html = get_template(PLANTILLA_TICKETS_LOTE).render({'tickets': tickets})
+    return html_a_pdf(html)
+
 
-    return result.getvalue()
+def render_pdf_corte_caja(contexto, motor=None):
+    """
+    Bytes del PDF del corte de caja (None si hay error). Puede lanzar
+    PDFNoDisponible si se usa la plantilla HTML y el servicio está saturado.
+    """
+    if (motor or motor_pdf()) == 'reportlab':
+        try:
+            return pdf_directo.corte_caja_pdf(contexto)
+        except Exception:
+            if settings.DEBUG:
+                raise
+            logger.exception('Error dibujando el corte de caja, se usa HTML')
 
+    html = get_template(PLANTILLA_CORTE_CAJA).render(contexto)
+    return html_a_pdf(html)
 
-def enviar_ticket_email(pedido, pdf_bytes):
+
+def mensaje_ticket_email(pedido, pdf_bytes, email_destino=None):
     """
-    Recibe el objeto pedido y los bytes del PDF ya generado, y lo envía por correo.
+    Correo del ticket con el PDF adjunto, listo para enviarse (lo envía la
+    bandeja de salida, ver correos.py).
     """
-    if not pedido.cliente.email or not pdf_bytes:
-        return False
-
-    try:
-        email = EmailMessage(
-            subject=f'Tu Ticket de Servicio - {pedido.folio}',
-            body=f'Hola {pedido.cliente.first_name}, gracias por elegir Punto Limpio. Adjunto encontrarás tu ticket con los detalles de tu servicio.',
-            from_email=settings.EMAIL_HOST_USER,
-            to=[pedido.cliente.email],
-        )
-        # Adjuntar el PDF
-        email.attach(f'ticket_{pedido.folio}.pdf',
-                     pdf_bytes, 'application/pdf')
-        email.send()
-        return True
-    except Exception as e:
-        print(f"Error enviando correo al cliente {pedido.cliente.email}: {e}")
-        return False
+    email = EmailMessage(
+        subject=f'Tu Ticket de Servicio - {pedido.folio}',
+        body=f'Hola {pedido.cliente.first_name}, gracias por elegir Punto Limpio. Adjunto encontrarás tu ticket con los detalles de tu servicio.',
+        from_email=settings.EMAIL_HOST_USER,
+        to=[email_destino or pedido.cliente.email],
+    )
+    # Adjuntar el PDF
+    email.attach(f'ticket_{pedido.folio}.pdf',
+                 pdf_bytes, 'application/pdf')
+    return email
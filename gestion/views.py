@@ -1,14 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+)
+from django.utils.http import parse_etags, quote_etag
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required  # Se mantiene para 'tasks'
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from django.contrib.auth.models import Group
 from django.utils import timezone
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import Q
 from decimal import Decimal
+from io import BytesIO
 import json
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 # IMPORTAR TUS NUEVOS DECORADORES
 from .decorators import solo_cliente, solo_trabajador, solo_admin
@@ -19,12 +26,27 @@ from usuarios.forms import RegistroUsuarioAdminForm
 from .models import (
     Insumo, NotificacionStock, Prenda, Servicio, Pedido,
     DetallePedido, MovimientoOperador, Maquina,
-    Incidencia, DudaQueja, CorteCaja
+    Incidencia, DudaQueja, CorteCaja, TrabajoReporte
 )
 from .forms_inventario import InsumoForm
 
 # Utils
-from .utils import render_pdf_ticket, enviar_ticket_email
+from .utils import render_pdf_corte_caja, render_pdf_tickets
+from .escpos import ticket_escpos
+from .pdf import (
+    PDFNoDisponible, respuesta_no_disponible, metricas as metricas_pdf
+)
+from .reportes import (
+    hoy_local, rango_dias, filtro_rango,
+    calcular_periodo, resumen_financiero, ventas_por_metodo, metodos_pago_json,
+    PRENDAS_PDF, pdf_reporte_financiero, escribir_excel_detallado,
+    GRANULARIDADES, MAX_PUNTOS_SERIE, contar_cubetas, serie_ventas_json,
+    MODOS_COMPARACION, comparar_periodos
+)
+from . import cache_reportes, cache_dashboard, cache_tickets, correos, eventos
+from .trabajos import encolar_reporte_email
+from .exportaciones import recorrer_por_llave, respuesta_exportacion
+from .analitica import tiempos_entrega
 from django.urls import reverse
 
 
@@ -38,182 +60,49 @@ def prueba(request):
 
 @solo_admin
 def admin_dashboard(request):
-    if not request.user.groups.filter(name='Administrador').exists():
-        return redirect('tasks')
-
-    hoy = timezone.now().date()
-    inicio_semana = hoy - timedelta(days=7)
-    inicio_mes = hoy.replace(day=1)
+    # Las secciones se leen del caché; los signals invalidan las que cambian
+    return render(request, 'admin/dashboard.html', cache_dashboard.contexto_dashboard())
 
-    # ========== GANANCIAS ==========
-    # Hoy
-    pedidos_hoy = Pedido.objects.filter(
-        fecha_recepcion__date=hoy,
-        estado_pago='pagado'
-    )
-    ganancias_hoy = pedidos_hoy.aggregate(total=Sum('total'))[
-        'total'] or Decimal('0')
-    servicios_hoy = pedidos_hoy.count()
-
-    # Esta semana
-    pedidos_semana = Pedido.objects.filter(
-        fecha_recepcion__date__gte=inicio_semana,
-        fecha_recepcion__date__lte=hoy,
-        estado_pago='pagado'
-    )
-    ganancias_semana = pedidos_semana.aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    servicios_semana = pedidos_semana.count()
-
-    # Este mes
-    pedidos_mes = Pedido.objects.filter(
-        fecha_recepcion__date__gte=inicio_mes,
-        fecha_recepcion__date__lte=hoy,
-        estado_pago='pagado'
-    )
-    ganancias_mes = pedidos_mes.aggregate(total=Sum('total'))[
-        'total'] or Decimal('0')
-    servicios_mes = pedidos_mes.count()
-
-    # ========== ALERTAS CRÍTICAS ==========
-    # Insumos con stock crítico (<=10%)
-    insumos_criticos = Insumo.objects.all()
-    alertas_insumos = []
-    for insumo in insumos_criticos:
-        if insumo.porcentaje() <= 10:
-            alertas_insumos.append({
-                'texto': f'{insumo.nombre} al {insumo.porcentaje()}% de stock',
-                'tipo': 'insumo'
-            })
 
-    # Incidencias recientes del personal (últimas 3 pendientes o en proceso)
-    incidencias_recientes = Incidencia.objects.filter(
-        estado__in=['pendiente', 'en_proceso']
-    ).order_by('-fecha_reporte')[:3]
-
-    # Dudas/Quejas recientes de clientes (últimas 3 pendientes o en proceso)
-    dudas_recientes = DudaQueja.objects.filter(
-        estado__in=['pendiente', 'en_proceso']
-    ).order_by('-fecha_creacion')[:3]
-
-    # ========== SERVICIOS ACTIVOS ==========
-    servicios_totales = Pedido.objects.exclude(estado='entregado').count()
-    servicios_pendientes = Pedido.objects.filter(estado='pendiente').count()
-    servicios_proceso = Pedido.objects.filter(estado='en_proceso').count()
-    servicios_listos = Pedido.objects.filter(estado='listo').count()
-
-    # Máquinas en uso (lavado/secado)
-    maquinas_lavado = Maquina.objects.filter(
-        tipo='lavadora', estado='ocupado').count()
-    maquinas_secado = Maquina.objects.filter(
-        tipo='secadora', estado='ocupado').count()
-
-    # ========== PRECIOS DE PRENDAS ==========
-    # Obtener 5 prendas destacadas (las más caras o populares)
-    prendas_destacadas = Prenda.objects.filter(
-        activo=True).order_by('-precio')[:5]
+@solo_admin
+def api_cache_dashboard(request):
+    """Aciertos/fallos del caché del dashboard (del proceso que responde), para monitoreo"""
+    return JsonResponse(cache_dashboard.estadisticas())
 
-    context = {
-        # Ganancias
-        'ganancias_hoy': ganancias_hoy,
-        'servicios_hoy': servicios_hoy,
-        'ganancias_semana': ganancias_semana,
-        'servicios_semana': servicios_semana,
-        'ganancias_mes': ganancias_mes,
-        'servicios_mes': servicios_mes,
-
-        # Alertas
-        'alertas_insumos': alertas_insumos,
-        'incidencias_recientes': incidencias_recientes,
-        'dudas_recientes': dudas_recientes,
-
-        # Servicios activos
-        'servicios_totales': servicios_totales,
-        'servicios_pendientes': servicios_pendientes,
-        'servicios_proceso': servicios_proceso,
-        'servicios_listos': servicios_listos,
-        'maquinas_lavado': maquinas_lavado,
-        'maquinas_secado': maquinas_secado,
-
-        # Precios
-        'prendas_destacadas': prendas_destacadas,
-    }
 
-    return render(request, 'admin/dashboard.html', context)
+@solo_admin
+def api_metricas_pdf(request):
+    """Cola y tiempos del servicio de PDF de este proceso, para monitoreo"""
+    return JsonResponse(metricas_pdf())
 
 
 @solo_admin
-def admin_finanzas(request):
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Count, F
+def api_metricas_correos(request):
+    """Bandeja de salida de tickets por correo: conteo por estado, para monitoreo"""
+    return JsonResponse(correos.metricas())
 
-    hoy = timezone.now().date()
 
+@solo_admin
+def admin_finanzas(request):
     # Determinar el período de filtro
     filtro = request.GET.get('filtro', 'hoy')
-    fecha_desde = request.GET.get('fecha_desde')
-    fecha_hasta = request.GET.get('fecha_hasta')
-
-    if filtro == 'hoy':
-        fecha_inicio = hoy
-        fecha_fin = hoy
-    elif filtro == 'semana':
-        fecha_inicio = hoy - timedelta(days=7)
-        fecha_fin = hoy
-    elif filtro == 'mes':
-        fecha_inicio = hoy.replace(day=1)
-        fecha_fin = hoy
-    elif filtro == 'personalizado' and fecha_desde and fecha_hasta:
-        fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
+    fecha_inicio, fecha_fin = calcular_periodo(
+        filtro, request.GET.get('fecha_desde'), request.GET.get('fecha_hasta'))
+
+    # Comparación con el período anterior o con el mismo período del año pasado
+    comparar = request.GET.get('comparar')
+    comparacion = None
+    if comparar in MODOS_COMPARACION:
+        comparacion = comparar_periodos(fecha_inicio, fecha_fin, comparar, limite=10)
+        resumen = comparacion['actual']
     else:
-        fecha_inicio = hoy
-        fecha_fin = hoy
-
-    # ========== DATOS FINANCIEROS ==========
-    pedidos_periodo = Pedido.objects.filter(
-        fecha_recepcion__date__gte=fecha_inicio,
-        fecha_recepcion__date__lte=fecha_fin,
-        estado_pago='pagado'
-    )
-
-    ingresos_totales = pedidos_periodo.aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    utilidad_neta = ingresos_totales
-
-    # ========== MÉTODOS DE PAGO ==========
-    pago_efectivo = pedidos_periodo.filter(metodo_pago='efectivo').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_tarjeta = pedidos_periodo.filter(metodo_pago='tarjeta').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_transferencia = pedidos_periodo.filter(metodo_pago='transferencia').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    total_pagos = pago_efectivo + pago_tarjeta + pago_transferencia
-    pct_efectivo = round((pago_efectivo / total_pagos * 100),
-                         1) if total_pagos > 0 else 0
-    pct_tarjeta = round((pago_tarjeta / total_pagos * 100),
-                        1) if total_pagos > 0 else 0
-    pct_transferencia = round(
-        (pago_transferencia / total_pagos * 100), 1) if total_pagos > 0 else 0
+        comparar = None
+        resumen = resumen_financiero(fecha_inicio, fecha_fin, limite_prendas=10)
 
     # ========== GRÁFICA DE PRENDAS ==========
-    detalles_periodo = DetallePedido.objects.filter(
-        pedido__fecha_recepcion__date__gte=fecha_inicio,
-        pedido__fecha_recepcion__date__lte=fecha_fin,
-        pedido__estado_pago='pagado'
-    )
-
-    prendas_stats = detalles_periodo.values(
-        'prenda__nombre'
-    ).annotate(
-        cantidad_total=Sum('cantidad'),
-        ganancia_total=Sum('subtotal')
-    ).order_by('-cantidad_total')[:10]
-
+    prendas_stats = resumen['prendas_stats']
     total_prendas = sum(p['cantidad_total']
-                        for p in prendas_stats if p['cantidad_total']) if prendas_stats else 0
+                        for p in prendas_stats if p['cantidad_total'])
     prendas_data = []
     for prenda in prendas_stats:
         if prenda['prenda__nombre'] and prenda['cantidad_total']:
@@ -227,15 +116,8 @@ def admin_finanzas(request):
             })
 
     # ========== GRÁFICA DE SERVICIOS ==========
-    servicios_stats = pedidos_periodo.values(
-        'tipo_servicio'
-    ).annotate(
-        cantidad=Count('id'),
-        ganancia_total=Sum('total')
-    ).order_by('-cantidad')
-
-    total_servicios = sum(s['cantidad']
-                          for s in servicios_stats) if servicios_stats else 0
+    servicios_stats = resumen['servicios_stats']
+    total_servicios = sum(s['cantidad'] for s in servicios_stats)
     servicios_data = []
     for servicio in servicios_stats:
         pct = round((servicio['cantidad'] / total_servicios *
@@ -251,25 +133,36 @@ def admin_finanzas(request):
         'filtro': filtro,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
-        'ingresos_totales': float(ingresos_totales),
-        'utilidad_neta': float(utilidad_neta),
-        'pago_efectivo': float(pago_efectivo),
-        'pago_tarjeta': float(pago_tarjeta),
-        'pago_transferencia': float(pago_transferencia),
-        'pct_efectivo': float(pct_efectivo),
-        'pct_tarjeta': float(pct_tarjeta),
-        'pct_transferencia': float(pct_transferencia),
+        'ingresos_totales': float(resumen['ingresos_totales']),
+        'utilidad_neta': float(resumen['utilidad_neta']),
+        'pago_efectivo': float(resumen['pago_efectivo']),
+        'pago_tarjeta': float(resumen['pago_tarjeta']),
+        'pago_transferencia': float(resumen['pago_transferencia']),
+        'pct_efectivo': float(resumen['pct_efectivo']),
+        'pct_tarjeta': float(resumen['pct_tarjeta']),
+        'pct_transferencia': float(resumen['pct_transferencia']),
         'prendas_json': json.dumps(prendas_data),
         'servicios_json': json.dumps(servicios_data),
-        'metodos_pago_json': json.dumps([
-            {'nombre': 'Efectivo', 'total': float(
-                pago_efectivo), 'porcentaje': float(pct_efectivo)},
-            {'nombre': 'Tarjeta', 'total': float(
-                pago_tarjeta), 'porcentaje': float(pct_tarjeta)},
-            {'nombre': 'Transferencia', 'total': float(
-                pago_transferencia), 'porcentaje': float(pct_transferencia)},
-        ]),
+        'metodos_pago_json': json.dumps(metodos_pago_json(resumen)),
+        'comparar': comparar,
+        'comparacion': comparacion,
+        'url_filtro': urlencode({
+            clave: valor for clave, valor in request.GET.items()
+            if clave in ('filtro', 'fecha_desde', 'fecha_hasta')
+        }),
     }
+    if comparacion:
+        deltas = comparacion['deltas']
+        context['conceptos_comparacion'] = [
+            ('Ingresos totales', deltas['ingresos_totales']),
+            ('Efectivo', deltas['pago_efectivo']),
+            ('Tarjeta', deltas['pago_tarjeta']),
+            ('Transferencia', deltas['pago_transferencia']),
+        ]
+        context['tablas_comparacion'] = [
+            ('Prenda', comparacion['prendas']),
+            ('Servicio', comparacion['servicios']),
+        ]
     return render(request, 'admin/finanzas/finanzas.html', context)
 
 
@@ -279,7 +172,7 @@ def admin_corte_caja(request):
         return redirect('tasks')
 
     # Obtener fecha de hoy
-    hoy = timezone.now().date()
+    hoy = hoy_local()
 
     # Verificar si ya existe un corte para hoy
     corte_existente = CorteCaja.objects.filter(
@@ -293,21 +186,9 @@ def admin_corte_caja(request):
             request.POST.get('transferencia_banco', 0))
         justificacion = request.POST.get('justificacion', '')
 
-        # Pedidos pagados del día de hoy
-        pedidos_hoy = Pedido.objects.filter(
-            fecha_recepcion__date=hoy,
-            estado_pago='pagado'
-        )
-
-        # Calcular ventas por método de pago
-        ventas_efectivo = pedidos_hoy.filter(metodo_pago='efectivo').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-        ventas_tarjeta = pedidos_hoy.filter(metodo_pago='tarjeta').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-        ventas_transferencia = pedidos_hoy.filter(metodo_pago='transferencia').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-
-        total_ventas = ventas_efectivo + ventas_tarjeta + ventas_transferencia
+        # Ventas pagadas del día de hoy por método de pago
+        ventas = ventas_por_metodo(hoy)
+        total_ventas = ventas['total_ventas']
         total_fisico = efectivo_contado + tarjeta_terminal + transferencia_banco
         diferencia = total_fisico - total_ventas
 
@@ -320,15 +201,19 @@ def admin_corte_caja(request):
             corte.total_fisico = total_fisico
             corte.diferencia = diferencia
             corte.justificacion = justificacion
+            corte.ventas_efectivo = ventas['ventas_efectivo']
+            corte.ventas_tarjeta = ventas['ventas_tarjeta']
+            corte.ventas_transferencia = ventas['ventas_transferencia']
+            corte.total_ventas = total_ventas
             corte.fecha_hora_registro = timezone.now()
             messages.success(request, 'Corte de caja actualizado exitosamente')
         else:
             corte = CorteCaja(
                 fecha=hoy,
                 responsable=request.user,
-                ventas_efectivo=ventas_efectivo,
-                ventas_tarjeta=ventas_tarjeta,
-                ventas_transferencia=ventas_transferencia,
+                ventas_efectivo=ventas['ventas_efectivo'],
+                ventas_tarjeta=ventas['ventas_tarjeta'],
+                ventas_transferencia=ventas['ventas_transferencia'],
                 total_ventas=total_ventas,
                 efectivo_contado=efectivo_contado,
                 tarjeta_terminal=tarjeta_terminal,
@@ -350,21 +235,8 @@ def admin_corte_caja(request):
 
         return redirect('admin_corte_caja')
 
-    # Pedidos pagados del día de hoy
-    pedidos_hoy = Pedido.objects.filter(
-        fecha_recepcion__date=hoy,
-        estado_pago='pagado'
-    )
-
-    # Calcular ventas por método de pago
-    ventas_efectivo = pedidos_hoy.filter(metodo_pago='efectivo').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    ventas_tarjeta = pedidos_hoy.filter(metodo_pago='tarjeta').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    ventas_transferencia = pedidos_hoy.filter(metodo_pago='transferencia').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    total_ventas = ventas_efectivo + ventas_tarjeta + ventas_transferencia
+    # Ventas pagadas del día de hoy por método de pago
+    ventas = ventas_por_metodo(hoy)
 
     # Si existe un corte, usar esos datos
     if corte_existente:
@@ -386,10 +258,7 @@ def admin_corte_caja(request):
     context = {
         'fecha': hoy.strftime('%d/%m/%Y'),
         'fecha_hora': timezone.now().strftime('%d/%m/%Y %H:%M'),
-        'ventas_efectivo': ventas_efectivo,
-        'ventas_tarjeta': ventas_tarjeta,
-        'ventas_transferencia': ventas_transferencia,
-        'total_ventas': total_ventas,
+        **ventas,
         'efectivo_contado': efectivo_contado,
         'tarjeta_terminal': tarjeta_terminal,
         'transferencia_banco': transferencia_banco,
@@ -702,6 +571,86 @@ def admin_historialMovimientos(request):
     return render(request, 'admin/historial/historial-movimientos.html', context)
 
 
+def _fecha_parametro(request, nombre):
+    valor = request.GET.get(nombre)
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+    except ValueError:
+        return None
+
+
+@solo_admin
+def exportar_historial_ventas(request):
+    """Historial de ventas en CSV o NDJSON (?formato=ndjson), en streaming"""
+    ventas = Pedido.objects.all()
+
+    busqueda = request.GET.get('buscar', '').strip()
+    if busqueda:
+        ventas = ventas.filter(
+            Q(folio__icontains=busqueda) |
+            Q(cliente__username__icontains=busqueda) |
+            Q(cliente__first_name__icontains=busqueda)
+        )
+
+    fecha_desde = _fecha_parametro(request, 'fecha_desde')
+    fecha_hasta = _fecha_parametro(request, 'fecha_hasta')
+    if fecha_desde:
+        ventas = ventas.filter(
+            fecha_recepcion__gte=rango_dias(fecha_desde)[0])
+    if fecha_hasta:
+        ventas = ventas.filter(
+            fecha_recepcion__lt=rango_dias(fecha_hasta)[1])
+
+    operador = request.GET.get('operador', '').strip()
+    if operador:
+        ventas = ventas.filter(operador__username=operador)
+
+    encabezados = ['folio', 'fecha', 'cliente', 'nombre', 'apellido', 'servicio',
+                   'total', 'metodo_pago', 'estado', 'estado_pago', 'origen', 'operador']
+    filas = recorrer_por_llave(ventas, 'fecha_recepcion', [
+        'folio', 'fecha_recepcion', 'cliente__username', 'cliente__first_name',
+        'cliente__last_name', 'tipo_servicio', 'total', 'metodo_pago', 'estado',
+        'estado_pago', 'origen', 'operador__username'
+    ])
+    return respuesta_exportacion(
+        'historial_ventas', request.GET.get('formato'), encabezados, filas)
+
+
+@solo_admin
+def exportar_historial_movimientos(request):
+    """Historial de movimientos en CSV o NDJSON (?formato=ndjson), en streaming"""
+    movimientos = MovimientoOperador.objects.all()
+
+    operador = request.GET.get('operador', '').strip()
+    if operador:
+        movimientos = movimientos.filter(operador__username=operador)
+
+    accion = request.GET.get('accion', '').strip()
+    if accion:
+        movimientos = movimientos.filter(accion=accion)
+
+    # Mismos periodos que el filtro de la página (24h, 7d, 30d)
+    periodos = {'24h': 1, '7d': 7, '30d': 30}
+    periodo = request.GET.get('periodo')
+    if periodo in periodos:
+        movimientos = movimientos.filter(
+            fecha__gte=timezone.now() - timedelta(days=periodos[periodo]))
+
+    fecha_desde = _fecha_parametro(request, 'fecha_desde')
+    fecha_hasta = _fecha_parametro(request, 'fecha_hasta')
+    if fecha_desde:
+        movimientos = movimientos.filter(fecha__gte=rango_dias(fecha_desde)[0])
+    if fecha_hasta:
+        movimientos = movimientos.filter(fecha__lt=rango_dias(fecha_hasta)[1])
+
+    encabezados = ['fecha', 'usuario', 'accion', 'detalles', 'folio']
+    filas = recorrer_por_llave(movimientos, 'fecha', [
+        'fecha', 'operador__username', 'accion', 'detalles', 'pedido__folio'
+    ])
+    return respuesta_exportacion(
+        'historial_movimientos', request.GET.get('formato'), encabezados, filas)
+
+
 @solo_admin
 def admin_detalleVenta(request, pedido_id=None):
     pedido = None
@@ -772,12 +721,8 @@ def admin_incidencias(request):
 def admin_configuracion(request):
     incidencias_pendientes = Incidencia.objects.exclude(
         estado='resuelto').count()
-    productos_bajo_stock = 0
-    for insumo in Insumo.objects.all():
-        if insumo.capacidad_maxima > 0:
-            porcentaje = (insumo.stock_actual / insumo.capacidad_maxima) * 100
-            if porcentaje <= 10:
-                productos_bajo_stock += 1
+    productos_bajo_stock = Insumo.objects.filter(
+        porcentaje__lte=Insumo.PORCENTAJE_CRITICO).count()
 
     context = {
         'incidencias_pendientes': incidencias_pendientes,
@@ -852,55 +797,49 @@ def nuevo_servicio(request):
             if not cliente:
                 return JsonResponse({'success': False, 'message': 'Cliente no encontrado'}, status=400)
 
-            pedido = Pedido.objects.create(
-                cliente=cliente,
-                operador=request.user,
-                tipo_servicio=data.get('tipo_servicio', 'por_encargo'),
-                peso=Decimal(str(data.get('peso', 0))),
-                cantidad_prendas=int(data.get('cantidad_prendas', 0)),
-                observaciones=data.get('observaciones', ''),
-                cobija_tipo=data.get('cobija_tipo', ''),
-                lavado_especial=data.get('lavado_especial', False),
-                total=Decimal(str(data.get('total', 0))),
-                metodo_pago=data.get('metodo_pago', 'efectivo'),
-                estado='pendiente',
-                estado_pago='pendiente',
-                origen='operador',
-                fecha_entrega_estimada=data.get(
-                    'fecha_entrega') if data.get('fecha_entrega') else None
-            )
-
-            MovimientoOperador.objects.create(
-                operador=request.user,
-                accion='registro_servicio',
-                detalles=pedido.folio,
-                pedido=pedido
-            )
+            # El correo del ticket se registra en la misma transacción que el
+            # pedido; lo envía `manage.py enviar_correos` sin hacer esperar al operador
+            with transaction.atomic():
+                pedido = Pedido.objects.create(
+                    cliente=cliente,
+                    operador=request.user,
+                    tipo_servicio=data.get('tipo_servicio', 'por_encargo'),
+                    peso=Decimal(str(data.get('peso', 0))),
+                    cantidad_prendas=int(data.get('cantidad_prendas', 0)),
+                    observaciones=data.get('observaciones', ''),
+                    cobija_tipo=data.get('cobija_tipo', ''),
+                    lavado_especial=data.get('lavado_especial', False),
+                    total=Decimal(str(data.get('total', 0))),
+                    metodo_pago=data.get('metodo_pago', 'efectivo'),
+                    estado='pendiente',
+                    estado_pago='pendiente',
+                    origen='operador',
+                    fecha_entrega_estimada=data.get(
+                        'fecha_entrega') if data.get('fecha_entrega') else None
+                )
+
+                MovimientoOperador.objects.create(
+                    operador=request.user,
+                    accion='registro_servicio',
+                    detalles=pedido.folio,
+                    pedido=pedido
+                )
+
+                correo = correos.encolar_ticket(pedido)
 
             pedido.refresh_from_db()
-            mensaje_ticket = ""
-            ticket_url = ""
-
-            try:
-                pdf_bytes = render_pdf_ticket(pedido)
-                if pdf_bytes:
-                    ticket_url = reverse('imprimir_ticket', args=[pedido.id])
-                    enviado = enviar_ticket_email(pedido, pdf_bytes)
-                    if enviado:
-                        mensaje_ticket = " y ticket enviado por correo."
-                    else:
-                        mensaje_ticket = " (Ticket generado, pero no se pudo enviar correo)."
-                else:
-                    mensaje_ticket = " (Nota: Error al generar el PDF visual)."
-            except Exception as e:
-                print(f"Error en proceso de ticket: {e}")
-                mensaje_ticket = " (Error técnico con el ticket PDF)."
+            if correo:
+                mensaje_ticket = " y el ticket se enviará por correo."
+            else:
+                mensaje_ticket = " (El cliente no tiene correo registrado)."
 
             return JsonResponse({
                 'success': True,
                 'message': f'Servicio registrado correctamente{mensaje_ticket}',
                 'folio': pedido.folio,
-                'ticket_url': ticket_url
+                'ticket_url': reverse('imprimir_ticket', args=[pedido.id]),
+                # Para el agente de impresión de la impresora térmica
+                'ticket_escpos_url': reverse('imprimir_ticket_escpos', args=[pedido.id]),
             })
 
         except Exception as e:
@@ -1170,16 +1109,135 @@ def asignar_maquina(request):
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
 
+async def eventos_stream(request):
+    """
+    Server-Sent Events para los tableros (máquinas, cola de servicios y
+    dashboard). ?canales=pedidos,maquinas,stock elige qué eventos recibir.
+    Solo funciona servido por ASGI; con WSGI responde 204 y el navegador
+    deja de intentar (la página sigue funcionando como antes).
+    """
+    usuario = await request.auser()
+    if not usuario.is_authenticated or not (
+            usuario.rol in ('operador', 'admin') or usuario.is_superuser):
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    canales = [canal for canal in request.GET.get('canales', '').split(',')
+               if canal in eventos.CANALES] or list(eventos.CANALES)
+    response = StreamingHttpResponse(
+        eventos.stream(canales, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # que nginx no junte los eventos
+    return response
+
+
 @solo_trabajador
 def imprimir_ticket(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    pdf_bytes = render_pdf_ticket(pedido)
+    pedido = get_object_or_404(Pedido.objects.select_related('cliente'), id=pedido_id)
+
+    # Reimpresión de un ticket que el navegador ya tiene: 304 sin tocar el PDF
+    etag = quote_etag(cache_tickets.version(pedido))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            pdf_bytes, _ = cache_tickets.ticket_pdf(pedido)
+        except PDFNoDisponible as e:
+            return respuesta_no_disponible(e)
+        if not pdf_bytes:
+            return HttpResponse("Error al generar el ticket", status=500)
+        response = HttpResponse(pdf_bytes, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="ticket_{pedido.folio}.pdf"'
+
+    response['ETag'] = etag
+    # El navegador guarda el ticket pero pregunta siempre si cambió
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Tickets por lote como máximo (acota la memoria y el tiempo de una petición)
+MAX_TICKETS_LOTE = 500
+
+
+@solo_trabajador
+def imprimir_tickets_lote(request):
+    """
+    Un solo PDF con los tickets de varios pedidos, para reimprimirlos de una vez:
+    ?ids=1,2,3 (en ese orden) o ?fecha=YYYY-MM-DD (recibidos ese día).
+    Más de MAX_TICKETS_LOTE pedidos es un 400, nunca un lote recortado.
+
+    Con ?formato=escpos se manda un ticket ESC/POS tras otro (cada uno con su
+    corte) conforme se genera. El PDF sí se arma completo en memoria: la
+    tabla de referencias va al final y reportlab escribe todo el documento
+    en save(), así que MAX_TICKETS_LOTE es lo que acota ese búfer.
+    """
+    pedidos = Pedido.objects.select_related('cliente')
+    ids_texto = request.GET.get('ids', '').strip()
+    fecha_texto = request.GET.get('fecha', '').strip()
+    if ids_texto:
+        try:
+            ids = list(dict.fromkeys(int(valor) for valor in ids_texto.split(',') if valor.strip()))
+        except ValueError:
+            return HttpResponse("Lista de pedidos inválida", status=400)
+        if len(ids) > MAX_TICKETS_LOTE:
+            return HttpResponse(f"Máximo {MAX_TICKETS_LOTE} tickets por lote", status=400)
+        orden = {pedido_id: posicion for posicion, pedido_id in enumerate(ids)}
+        pedidos = sorted(pedidos.filter(id__in=ids), key=lambda pedido: orden[pedido.id])
+        nombre = 'tickets_seleccion'
+    elif fecha_texto:
+        try:
+            fecha = datetime.strptime(fecha_texto, '%Y-%m-%d').date()
+        except ValueError:
+            return HttpResponse("Fecha inválida (use YYYY-MM-DD)", status=400)
+        del_dia = pedidos.filter(**filtro_rango('fecha_recepcion', fecha))
+        # Uno de más basta para saber si el día rebasa el límite
+        pedidos = list(del_dia.order_by('fecha_recepcion', 'id')[:MAX_TICKETS_LOTE + 1])
+        if len(pedidos) > MAX_TICKETS_LOTE:
+            return HttpResponse(
+                f"El {fecha.strftime('%d/%m/%Y')} tiene {del_dia.count()} pedidos y el máximo "
+                f"es {MAX_TICKETS_LOTE} tickets por lote; imprímalos por partes con ?ids=",
+                status=400)
+        nombre = f'tickets_{fecha.strftime("%Y%m%d")}'
+    else:
+        return HttpResponse("Indique ?ids=1,2,3 o ?fecha=YYYY-MM-DD", status=400)
+
+    if not pedidos:
+        return HttpResponse("No hay pedidos para imprimir", status=404)
+
+    if request.GET.get('formato') == 'escpos':
+        response = StreamingHttpResponse(
+            (ticket_escpos(pedido) for pedido in pedidos),
+            content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.bin"'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
+    try:
+        pdf_bytes = render_pdf_tickets(pedidos)
+    except PDFNoDisponible as e:
+        return respuesta_no_disponible(e)
     if not pdf_bytes:
-        return HttpResponse("Error al generar el ticket", status=500)
+        return HttpResponse("Error al generar los tickets", status=500)
 
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="ticket_{pedido.folio}.pdf"'
+    response['Content-Disposition'] = f'inline; filename="{nombre}.pdf"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@solo_trabajador
+def imprimir_ticket_escpos(request, pedido_id):
+    """
+    Ticket en bytes ESC/POS para mandarlo directo a la impresora térmica
+    (agente de impresión local o descarga), sin PDF de por medio.
+    """
+    pedido = get_object_or_404(Pedido.objects.select_related('cliente'), id=pedido_id)
+    response = HttpResponse(ticket_escpos(pedido), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="ticket_{pedido.folio}.bin"'
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -1347,34 +1405,37 @@ def servCosto(request):
             metodo_pago = data.get('metodo_pago', 'efectivo')
             tipo = data.get('tipo_servicio', tipo_servicio)
 
-            pedido = Pedido.objects.create(
-                cliente=request.user,
-                servicio=servicio,
-                tipo_servicio=tipos_nombres.get(tipo, tipo_servicio_nombre),
-                total=total,
-                metodo_pago=metodo_pago,
-                cantidad_prendas=sum([p.get('cantidad', 0)
-                                     for p in prendas_data]),
-                peso=sum([Decimal(str(p.get('peso', 0)))
-                         for p in prendas_data]),
-                estado='pendiente',
-                estado_pago='pendiente',
-                origen='cliente'
-            )
-
-            for prenda_data in prendas_data:
-                prenda_obj = Prenda.objects.filter(
-                    id=prenda_data.get('prenda_id')).first()
-                if prenda_obj:
-                    DetallePedido.objects.create(
-                        pedido=pedido,
-                        prenda=prenda_obj,
-                        cantidad=prenda_data.get('cantidad', 1),
-                        peso=Decimal(str(prenda_data.get('peso', 0))),
-                        precio_unitario=Decimal(
-                            str(prenda_data.get('precio', 0))),
-                        subtotal=Decimal(str(prenda_data.get('subtotal', 0)))
-                    )
+            # Pedido, detalles y resúmenes diarios se guardan juntos
+            with transaction.atomic():
+                pedido = Pedido.objects.create(
+                    cliente=request.user,
+                    servicio=servicio,
+                    tipo_servicio=tipos_nombres.get(tipo, tipo_servicio_nombre),
+                    total=total,
+                    metodo_pago=metodo_pago,
+                    cantidad_prendas=sum([p.get('cantidad', 0)
+                                         for p in prendas_data]),
+                    peso=sum([Decimal(str(p.get('peso', 0)))
+                             for p in prendas_data]),
+                    estado='pendiente',
+                    estado_pago='pendiente',
+                    origen='cliente'
+                )
+
+                for prenda_data in prendas_data:
+                    prenda_obj = Prenda.objects.filter(
+                        id=prenda_data.get('prenda_id')).first()
+                    if prenda_obj:
+                        DetallePedido.objects.create(
+                            pedido=pedido,
+                            prenda=prenda_obj,
+                            cantidad=prenda_data.get('cantidad', 1),
+                            peso=Decimal(str(prenda_data.get('peso', 0))),
+                            precio_unitario=Decimal(
+                                str(prenda_data.get('precio', 0))),
+                            subtotal=Decimal(
+                                str(prenda_data.get('subtotal', 0)))
+                        )
 
             return JsonResponse({
                 'success': True,
@@ -1411,76 +1472,131 @@ def tasks(request):
         return redirect('cliente_dashboard')
 
 
+@solo_admin
+def api_serie_finanzas(request):
+    """
+    Serie de ingresos y pedidos pagados por hora, día, semana o mes.
+    Parámetros: granularidad (hora|dia|semana|mes, por defecto dia) y el
+    período igual que en finanzas (filtro, fecha_desde, fecha_hasta).
+    """
+    granularidad = request.GET.get('granularidad', 'dia')
+    if granularidad not in GRANULARIDADES:
+        return JsonResponse({'success': False, 'mensaje': 'Granularidad inválida'}, status=400)
+
+    fecha_desde = request.GET.get('fecha_desde')
+    fecha_hasta = request.GET.get('fecha_hasta')
+    filtro = request.GET.get('filtro') or (
+        'personalizado' if fecha_desde and fecha_hasta else 'hoy')
+    try:
+        fecha_inicio, fecha_fin = calcular_periodo(filtro, fecha_desde, fecha_hasta)
+    except ValueError:
+        return JsonResponse({'success': False, 'mensaje': 'Fecha inválida'}, status=400)
+    if fecha_inicio > fecha_fin:
+        return JsonResponse({'success': False, 'mensaje': 'Rango de fechas inválido'}, status=400)
+
+    if contar_cubetas(fecha_inicio, fecha_fin, granularidad) > MAX_PUNTOS_SERIE:
+        return JsonResponse({
+            'success': False,
+            'mensaje': f'El rango tiene más de {MAX_PUNTOS_SERIE} puntos; use una granularidad mayor'
+        }, status=400)
+
+    return HttpResponse(serie_ventas_json(fecha_inicio, fecha_fin, granularidad),
+                        content_type='application/json')
+
+
+def _periodo_analitica(request):
+    filtro = request.GET.get('filtro', 'mes')
+    fecha_inicio, fecha_fin = calcular_periodo(
+        filtro, request.GET.get('fecha_desde'), request.GET.get('fecha_hasta'))
+    return filtro, fecha_inicio, fecha_fin
+
+
+@solo_admin
+def admin_analitica(request):
+    """Tiempos de entrega: percentiles, entregas a tiempo y desgloses"""
+    try:
+        filtro, fecha_inicio, fecha_fin = _periodo_analitica(request)
+    except ValueError:
+        messages.error(request, 'Fecha inválida, se muestra el mes actual.')
+        filtro = 'mes'
+        fecha_inicio, fecha_fin = calcular_periodo(filtro)
+    analisis = tiempos_entrega(fecha_inicio, fecha_fin)
+    context = {
+        'filtro': filtro,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'analisis': analisis,
+        'desgloses': [
+            ('Por servicio', analisis['por_servicio']),
+            ('Por origen', analisis['por_origen']),
+            ('Por operador', analisis['por_operador']),
+        ],
+        'distribucion_json': json.dumps(analisis['distribucion']),
+    }
+    return render(request, 'admin/finanzas/analitica.html', context)
+
+
+@solo_admin
+def api_analitica_tiempos(request):
+    """Mismo análisis que admin_analitica en JSON"""
+    try:
+        _, fecha_inicio, fecha_fin = _periodo_analitica(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'mensaje': 'Fecha inválida'}, status=400)
+    return JsonResponse(tiempos_entrega(fecha_inicio, fecha_fin))
+
+
+def _nombre_periodo_excel(filtro, fecha_desde, fecha_hasta, fecha_inicio, fecha_fin):
+    hoy = hoy_local()
+    if filtro == 'semana':
+        return "Última Semana"
+    if filtro == 'mes':
+        return f"Este Mes - {hoy.strftime('%B %Y')}"
+    if filtro == 'personalizado' and fecha_desde and fecha_hasta:
+        return f"Del {fecha_inicio.strftime('%d/%m/%Y')} al {fecha_fin.strftime('%d/%m/%Y')}"
+    return f"Hoy - {hoy.strftime('%d/%m/%Y')}"
+
+
+def _respuesta_excel(contenido, filename):
+    response = HttpResponse(
+        contenido,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @solo_admin
 def exportar_finanzas_excel(request):
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Count
     from openpyxl import Workbook
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from openpyxl.utils import get_column_letter
 
-    hoy = timezone.now().date()
-
     filtro = request.GET.get('filtro', 'hoy')
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
+    fecha_inicio, fecha_fin = calcular_periodo(
+        filtro, fecha_desde, fecha_hasta)
+    periodo_nombre = _nombre_periodo_excel(
+        filtro, fecha_desde, fecha_hasta, fecha_inicio, fecha_fin)
 
-    if filtro == 'hoy':
-        fecha_inicio = hoy
-        fecha_fin = hoy
-        periodo_nombre = f"Hoy - {hoy.strftime('%d/%m/%Y')}"
-    elif filtro == 'semana':
-        fecha_inicio = hoy - timedelta(days=7)
-        fecha_fin = hoy
-        periodo_nombre = "Última Semana"
-    elif filtro == 'mes':
-        fecha_inicio = hoy.replace(day=1)
-        fecha_fin = hoy
-        periodo_nombre = f"Este Mes - {hoy.strftime('%B %Y')}"
-    elif filtro == 'personalizado' and fecha_desde and fecha_hasta:
-        fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-        periodo_nombre = f"Del {fecha_inicio.strftime('%d/%m/%Y')} al {fecha_fin.strftime('%d/%m/%Y')}"
-    else:
-        fecha_inicio = hoy
-        fecha_fin = hoy
-        periodo_nombre = f"Hoy - {hoy.strftime('%d/%m/%Y')}"
-
-    pedidos_periodo = Pedido.objects.filter(
-        fecha_recepcion__date__gte=fecha_inicio,
-        fecha_recepcion__date__lte=fecha_fin,
-        estado_pago='pagado'
-    )
+    resumen = resumen_financiero(fecha_inicio, fecha_fin)
+    filename = f"reporte_financiero_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.xlsx"
 
-    ingresos_totales = pedidos_periodo.aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    utilidad_neta = ingresos_totales
-
-    pago_efectivo = pedidos_periodo.filter(metodo_pago='efectivo').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_tarjeta = pedidos_periodo.filter(metodo_pago='tarjeta').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_transferencia = pedidos_periodo.filter(metodo_pago='transferencia').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    detalles_periodo = DetallePedido.objects.filter(
-        pedido__fecha_recepcion__date__gte=fecha_inicio,
-        pedido__fecha_recepcion__date__lte=fecha_fin,
-        pedido__estado_pago='pagado'
-    )
-    prendas_stats = detalles_periodo.values(
-        'prenda__nombre'
-    ).annotate(
-        cantidad_total=Sum('cantidad'),
-        ganancia_total=Sum('subtotal')
-    ).order_by('-cantidad_total')
-
-    servicios_stats = pedidos_periodo.values(
-        'tipo_servicio'
-    ).annotate(
-        cantidad=Count('id'),
-        ganancia_total=Sum('total')
-    ).order_by('-cantidad')
+    # Si ya se generó este Excel con los mismos datos, se sirve de la caché
+    datos_cache = [periodo_nombre, resumen]
+    contenido = cache_reportes.obtener(
+        'reporte_xlsx', fecha_inicio, fecha_fin, datos_cache)
+    if contenido is not None:
+        return _respuesta_excel(contenido, filename)
+
+    ingresos_totales = resumen['ingresos_totales']
+    utilidad_neta = resumen['utilidad_neta']
+    pago_efectivo = resumen['pago_efectivo']
+    pago_tarjeta = resumen['pago_tarjeta']
+    pago_transferencia = resumen['pago_transferencia']
+    prendas_stats = resumen['prendas_stats']
+    servicios_stats = resumen['servicios_stats']
 
     wb = Workbook()
     ws = wb.active
@@ -1611,133 +1727,64 @@ def exportar_finanzas_excel(request):
     ws.column_dimensions['C'].width = 15
     ws.column_dimensions['D'].width = 15
 
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f"reporte_financiero_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    wb.save(response)
-    return response
+    archivo = BytesIO()
+    wb.save(archivo)
+    contenido = archivo.getvalue()
+    cache_reportes.guardar('reporte_xlsx', fecha_inicio,
+                           fecha_fin, datos_cache, contenido)
+    return _respuesta_excel(contenido, filename)
 
 
 @solo_admin
-def imprimir_reporte_finanzas(request):
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Count
-    from django.template.loader import get_template
-    from xhtml2pdf import pisa
-    from io import BytesIO
-
-    hoy = timezone.now().date()
+def exportar_finanzas_excel_detallado(request):
+    """
+    Excel con un renglón por pedido pagado y por prenda del período.
+    Se escribe en modo streaming a un archivo temporal y se envía por partes.
+    """
+    import tempfile
+    from django.http import FileResponse
 
     filtro = request.GET.get('filtro', 'hoy')
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
-
-    if filtro == 'hoy':
-        fecha_inicio = hoy
-        fecha_fin = hoy
-    elif filtro == 'semana':
-        fecha_inicio = hoy - timedelta(days=7)
-        fecha_fin = hoy
-    elif filtro == 'mes':
-        fecha_inicio = hoy.replace(day=1)
-        fecha_fin = hoy
-    elif filtro == 'personalizado' and fecha_desde and fecha_hasta:
-        fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-    else:
-        fecha_inicio = hoy
-        fecha_fin = hoy
-
-    pedidos_periodo = Pedido.objects.filter(
-        fecha_recepcion__date__gte=fecha_inicio,
-        fecha_recepcion__date__lte=fecha_fin,
-        estado_pago='pagado'
-    )
-
-    ingresos_totales = pedidos_periodo.aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    utilidad_neta = ingresos_totales
-
-    pago_efectivo = pedidos_periodo.filter(metodo_pago='efectivo').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_tarjeta = pedidos_periodo.filter(metodo_pago='tarjeta').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    pago_transferencia = pedidos_periodo.filter(metodo_pago='transferencia').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    total_pagos = pago_efectivo + pago_tarjeta + pago_transferencia
-    pct_efectivo = round((pago_efectivo / total_pagos * 100),
-                         1) if total_pagos > 0 else 0
-    pct_tarjeta = round((pago_tarjeta / total_pagos * 100),
-                        1) if total_pagos > 0 else 0
-    pct_transferencia = round(
-        (pago_transferencia / total_pagos * 100), 1) if total_pagos > 0 else 0
-
-    detalles_periodo = DetallePedido.objects.filter(
-        pedido__fecha_recepcion__date__gte=fecha_inicio,
-        pedido__fecha_recepcion__date__lte=fecha_fin,
-        pedido__estado_pago='pagado'
+    fecha_inicio, fecha_fin = calcular_periodo(
+        filtro, fecha_desde, fecha_hasta)
+    periodo_nombre = _nombre_periodo_excel(
+        filtro, fecha_desde, fecha_hasta, fecha_inicio, fecha_fin)
+
+    resumen = resumen_financiero(fecha_inicio, fecha_fin)
+
+    # El archivo temporal se borra solo cuando FileResponse lo cierra
+    archivo = tempfile.TemporaryFile()
+    escribir_excel_detallado(
+        archivo, fecha_inicio, fecha_fin, periodo_nombre, resumen)
+    archivo.seek(0)
+
+    filename = f"pedidos_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.xlsx"
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    prendas_stats = detalles_periodo.values(
-        'prenda__nombre'
-    ).annotate(
-        cantidad_total=Sum('cantidad'),
-        ganancia_total=Sum('subtotal')
-    ).order_by('-cantidad_total')[:10]
-
-    servicios_stats = pedidos_periodo.values(
-        'tipo_servicio'
-    ).annotate(
-        cantidad=Count('id'),
-        ganancia_total=Sum('total')
-    ).order_by('-cantidad')
 
-    context = {
-        'fecha_inicio': fecha_inicio,
-        'fecha_fin': fecha_fin,
-        'ingresos_totales': ingresos_totales,
-        'utilidad_neta': utilidad_neta,
-        'pago_efectivo': pago_efectivo,
-        'pago_tarjeta': pago_tarjeta,
-        'pago_transferencia': pago_transferencia,
-        'pct_efectivo': pct_efectivo,
-        'pct_tarjeta': pct_tarjeta,
-        'pct_transferencia': pct_transferencia,
-        'prendas_stats': prendas_stats,
-        'servicios_stats': servicios_stats,
-        'prendas_json': json.dumps([{
-            'nombre': p['prenda__nombre'],
-            'cantidad': p['cantidad_total'],
-            'ganancia': float(p['ganancia_total'] or 0)
-        } for p in prendas_stats if p['prenda__nombre']]),
-        'servicios_json': json.dumps([{
-            'nombre': s['tipo_servicio'] or 'Sin especificar',
-            'cantidad': s['cantidad'],
-            'ganancia': float(s['ganancia_total'] or 0)
-        } for s in servicios_stats]),
-        'metodos_pago_json': json.dumps([
-            {'nombre': 'Efectivo', 'total': float(
-                pago_efectivo), 'porcentaje': float(pct_efectivo)},
-            {'nombre': 'Tarjeta', 'total': float(
-                pago_tarjeta), 'porcentaje': float(pct_tarjeta)},
-            {'nombre': 'Transferencia', 'total': float(
-                pago_transferencia), 'porcentaje': float(pct_transferencia)},
-        ]),
-    }
 
-    template = get_template('admin/finanzas/reporte_finanzas_pdf.html')
-    html = template.render(context)
+@solo_admin
+def imprimir_reporte_finanzas(request):
+    filtro = request.GET.get('filtro', 'hoy')
+    fecha_inicio, fecha_fin = calcular_periodo(
+        filtro, request.GET.get('fecha_desde'), request.GET.get('fecha_hasta'))
 
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    resumen = resumen_financiero(fecha_inicio, fecha_fin, limite_prendas=PRENDAS_PDF)
+    try:
+        pdf_bytes = pdf_reporte_financiero(resumen)
+    except PDFNoDisponible as e:
+        return respuesta_no_disponible(e)
 
-    if pdf.err:
+    if pdf_bytes is None:
         return HttpResponse("Error al generar el PDF", status=500)
 
-    response = HttpResponse(result.getvalue(), content_type='application/pdf')
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     filename = f"reporte_financiero_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.pdf"
     response['Content-Disposition'] = f'inline; filename="{filename}"'
     return response
@@ -1769,164 +1816,44 @@ def enviar_reporte_email(request):
         except ValidationError:
             return JsonResponse({'success': False, 'message': 'Email inválido'}, status=400)
         # Calcular fechas según el filtro
-        hoy = timezone.now().date()
-        if filtro == 'hoy':
-            fecha_inicio = hoy
-            fecha_fin = hoy
-        elif filtro == 'semana':
-            fecha_inicio = hoy - timedelta(days=7)
-            fecha_fin = hoy
-        elif filtro == 'mes':
-            fecha_inicio = hoy.replace(day=1)
-            fecha_fin = hoy
-        elif filtro == 'personalizado' and fecha_desde and fecha_hasta:
-            fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-        else:
-            fecha_inicio = hoy
-            fecha_fin = hoy
-
-        # Obtener datos financieros
-        pedidos_periodo = Pedido.objects.filter(
-            fecha_recepcion__date__gte=fecha_inicio,
-            fecha_recepcion__date__lte=fecha_fin,
-            estado_pago='pagado'
-        )
-
-        ingresos_totales = pedidos_periodo.aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-        utilidad_neta = ingresos_totales
-
-        # Métodos de pago
-        pago_efectivo = pedidos_periodo.filter(metodo_pago='efectivo').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-        pago_tarjeta = pedidos_periodo.filter(metodo_pago='tarjeta').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-        pago_transferencia = pedidos_periodo.filter(metodo_pago='transferencia').aggregate(
-            total=Sum('total'))['total'] or Decimal('0')
-
-        total_pagos = pago_efectivo + pago_tarjeta + pago_transferencia
-        pct_efectivo = round(
-            (pago_efectivo / total_pagos * 100), 1) if total_pagos > 0 else 0
-        pct_tarjeta = round((pago_tarjeta / total_pagos * 100),
-                            1) if total_pagos > 0 else 0
-        pct_transferencia = round(
-            (pago_transferencia / total_pagos * 100), 1) if total_pagos > 0 else 0
-
-        # Datos de prendas
-        detalles_periodo = DetallePedido.objects.filter(
-            pedido__fecha_recepcion__date__gte=fecha_inicio,
-            pedido__fecha_recepcion__date__lte=fecha_fin,
-            pedido__estado_pago='pagado'
-        )
-        prendas_stats = detalles_periodo.values(
-            'prenda__nombre'
-        ).annotate(
-            cantidad_total=Sum('cantidad'),
-            ganancia_total=Sum('subtotal')
-        ).order_by('-cantidad_total')[:10]
-
-        # Datos de servicios
-        servicios_stats = pedidos_periodo.values(
-            'tipo_servicio'
-        ).annotate(
-            cantidad=Count('id'),
-            ganancia_total=Sum('total')
-        ).order_by('-cantidad')
-
-        # Preparar contexto para el PDF
-        context = {
-            'fecha_inicio': fecha_inicio,
-            'fecha_fin': fecha_fin,
-            'ingresos_totales': ingresos_totales,
-            'utilidad_neta': utilidad_neta,
-            'pago_efectivo': pago_efectivo,
-            'pago_tarjeta': pago_tarjeta,
-            'pago_transferencia': pago_transferencia,
-            'pct_efectivo': pct_efectivo,
-            'pct_tarjeta': pct_tarjeta,
-            'pct_transferencia': pct_transferencia,
-            'prendas_stats': prendas_stats,
-            'servicios_stats': servicios_stats,
-        }
-
-        # Generar PDF
-        from django.template.loader import get_template
-        from io import BytesIO
-        from xhtml2pdf import pisa
-
-        template = get_template('admin/finanzas/reporte_finanzas_pdf.html')
-        html = template.render(context)
+        fecha_inicio, fecha_fin = calcular_periodo(
+            filtro, fecha_desde, fecha_hasta)
 
-        result = BytesIO()
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-        if pdf.err:
-            return JsonResponse({'success': False, 'message': 'Error al generar el PDF'}, status=500)
-
-        pdf_bytes = result.getvalue()
-
-        # Enviar email
-        from django.core.mail import EmailMessage
-        from django.conf import settings
-
-        # Determinar el nombre del periodo
-        if filtro == 'hoy':
-            periodo_nombre = f"del día {fecha_inicio.strftime('%d/%m/%Y')}"
-        elif filtro == 'semana':
-            periodo_nombre = "de la última semana"
-        elif filtro == 'mes':
-            periodo_nombre = "del mes actual"
-        else:
-            periodo_nombre = f"del {fecha_inicio.strftime('%d/%m/%Y')} al {fecha_fin.strftime('%d/%m/%Y')}"
-
-        subject = f'Reporte Financiero Punto Limpio - {periodo_nombre}'
-        body = f'''Hola,
-
-        Adjunto encontrarás el reporte financiero de Punto Limpio {periodo_nombre}.
-
-        Resumen del periodo:
-        - Ingresos totales: ${ingresos_totales:,.2f}
-        - Utilidad neta: ${utilidad_neta:,.2f}
-
-        Métodos de pago:
-        - Efectivo: ${pago_efectivo:,.2f} ({pct_efectivo}%)
-        - Tarjeta: ${pago_tarjeta:,.2f} ({pct_tarjeta}%)
-        - Transferencia: ${pago_transferencia:,.2f} ({pct_transferencia}%)
-
-        Este reporte fue generado automáticamente por {request.user.username} el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}.
-
-        Saludos,
-        Sistema Punto Limpio
-        '''
-
-        email = EmailMessage(
-            subject=subject,
-            body=body,
-            from_email=settings.EMAIL_HOST_USER,
-            to=[email_destino],
-        )
-
-        # Adjuntar el PDF
-        filename = f"reporte_financiero_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.pdf"
-        email.attach(filename, pdf_bytes, 'application/pdf')
-
-        # Enviar el email
-        email.send()
+        # El PDF y el envío los hace el worker (manage.py procesar_trabajos)
+        trabajo = encolar_reporte_email(
+            request.user, email_destino, filtro, fecha_inicio, fecha_fin)
 
         return JsonResponse({
             'success': True,
-            'message': f'Reporte enviado exitosamente a {email_destino}'
+            'trabajo_id': trabajo.id,
+            'estado_url': reverse('estado_reporte_email', args=[trabajo.id]),
+            'message': f'El reporte se enviará a {email_destino} en unos momentos'
         })
 
     except Exception as e:
-        print(f"Error enviando reporte por email: {str(e)}")
+        print(f"Error encolando reporte por email: {str(e)}")
         return JsonResponse({
             'success': False,
             'message': f'Error al enviar el reporte: {str(e)}'
         }, status=500)
 
 
+@solo_admin
+def estado_reporte_email(request, trabajo_id):
+    """Estado de un envío de reporte encolado con enviar_reporte_email"""
+    trabajo = get_object_or_404(TrabajoReporte, id=trabajo_id)
+    return JsonResponse({
+        'success': True,
+        'trabajo_id': trabajo.id,
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'progreso': trabajo.progreso,
+        'intentos': trabajo.intentos,
+        'error': trabajo.error,
+        'email_destino': trabajo.email_destino,
+    })
+
+
 @solo_admin
 def imprimir_corte_caja(request):
     """
@@ -1935,28 +1862,11 @@ def imprimir_corte_caja(request):
     if not request.user.groups.filter(name='Administrador').exists():
         return HttpResponse("No autorizado", status=403)
 
-    from django.template.loader import get_template
-    from xhtml2pdf import pisa
-    from io import BytesIO
-
     # Obtener fecha de hoy
-    hoy = timezone.now().date()
+    hoy = hoy_local()
 
-    # Pedidos pagados del día de hoy
-    pedidos_hoy = Pedido.objects.filter(
-        fecha_recepcion__date=hoy,
-        estado_pago='pagado'
-    )
-
-    # Calcular ventas por método de pago
-    ventas_efectivo = pedidos_hoy.filter(metodo_pago='efectivo').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    ventas_tarjeta = pedidos_hoy.filter(metodo_pago='tarjeta').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-    ventas_transferencia = pedidos_hoy.filter(metodo_pago='transferencia').aggregate(
-        total=Sum('total'))['total'] or Decimal('0')
-
-    total_ventas = ventas_efectivo + ventas_tarjeta + ventas_transferencia
+    # Ventas pagadas del día de hoy por método de pago
+    ventas = ventas_por_metodo(hoy)
 
     # Obtener corte guardado si existe
     corte_existente = CorteCaja.objects.filter(
@@ -1980,10 +1890,7 @@ def imprimir_corte_caja(request):
     context = {
         'fecha': hoy.strftime('%d/%m/%Y'),
         'fecha_hora': timezone.now().strftime('%d/%m/%Y %H:%M'),
-        'ventas_efectivo': ventas_efectivo,
-        'ventas_tarjeta': ventas_tarjeta,
-        'ventas_transferencia': ventas_transferencia,
-        'total_ventas': total_ventas,
+        **ventas,
         'efectivo_contado': efectivo_contado,
         'tarjeta_terminal': tarjeta_terminal,
         'transferencia_banco': transferencia_banco,
@@ -1993,20 +1900,17 @@ def imprimir_corte_caja(request):
         'responsable': request.user.username,
     }
 
-    # Renderizar template
-    template_path = 'admin/finanzas/corte_caja_pdf.html'
-    template = get_template(template_path)
-    html = template.render(context)
-
-    # Crear PDF
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    # Crear PDF (dibujo directo o plantilla HTML según PDF_MOTOR)
+    try:
+        pdf_bytes = render_pdf_corte_caja(context)
+    except PDFNoDisponible as e:
+        return respuesta_no_disponible(e)
 
-    if pdf.err:
+    if pdf_bytes is None:
         return HttpResponse('Error al generar el PDF', status=500)
 
     # Retornar PDF
-    response = HttpResponse(result.getvalue(), content_type='application/pdf')
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'inline; filename="corte_caja_{hoy.strftime("%Y%m%d")}.pdf"'
 
     return response
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'puntoLimpio.settings')
 
 application = get_asgi_application()
+
+# Arrancar los procesos del servicio de PDF antes de la primera petición
+from gestion.pdf import servicio  # noqa: E402
+
+servicio().iniciar()
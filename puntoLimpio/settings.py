@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Sirve STATIC_ROOT (comprimido, con ETag y caché larga) antes que todo lo demás
+    'gestion.estaticos.EstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -119,6 +121,21 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+# Destino de collectstatic; de aquí los sirve gestion.estaticos.EstaticosMiddleware
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Nombres con hash del contenido + copias .gz/.br generadas en collectstatic
+    'staticfiles': {
+        'BACKEND': 'gestion.estaticos.AlmacenEstaticos',
+    },
+}
+
+# Cache-Control para los estáticos con hash en el nombre (1 año)
+ESTATICOS_MAX_AGE = 365 * 24 * 60 * 60
 
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
@@ -129,6 +146,10 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'puntolimpio039@gmail.com'
 EMAIL_HOST_PASSWORD = 'spdi okco fqpp vtea'
+# Segundos por operación SMTP. Muy por debajo de RECUPERAR_TRAS (10 min) de
+# gestion.trabajos y gestion.correos: un envío lento falla y se reintenta en
+# lugar de que otro worker recupere el trabajo y mande el correo dos veces
+EMAIL_TIMEOUT = 30
 
 # Cerrar sesión cuando se cierre el navegador
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
@@ -137,6 +158,41 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Caché en disco de reportes de finanzas ya generados (PDF/Excel)
+REPORTES_CACHE_DIR = BASE_DIR / 'cache' / 'reportes'
+REPORTES_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Caché de Django (contexto del dashboard). En disco para que lo compartan
+# todos los procesos del servidor y las invalidaciones lleguen a todos.
+# FileBasedCache no tiene add/incr atómicos entre procesos: el candado y los
+# contadores del dashboard son por proceso (ver gestion/cache_dashboard.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    }
+}
+DASHBOARD_CACHE_TTL = 60  # segundos; red de seguridad además de los signals
+
+# Caché en disco de los tickets PDF (se reimprimen sin volver a generarlos)
+TICKETS_CACHE_DIR = BASE_DIR / 'cache' / 'tickets'
+TICKETS_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+# Servicio de PDF (gestion/pdf.py): procesos que convierten HTML a PDF,
+# trabajos que pueden esperar turno y segundos máximos por trabajo
+PDF_PROCESOS = 2
+PDF_COLA_MAX = 8
+PDF_TIMEOUT = 30
+# Ticket y corte de caja: 'html' (plantillas) o 'reportlab' (dibujo directo,
+# mucho más rápido; ver manage.py benchmark_pdf antes de activarlo)
+PDF_MOTOR = 'html'
+
+# Cola de reportes por correo (manage.py procesar_trabajos)
+TRABAJOS_HILOS = 2
+TRABAJOS_ESPERA_BASE = 30  # segundos antes del primer reintento
+
 # Obligar que muestre mensaje para los guardianes (decorators.py)
 MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'puntoLimpio.settings')
 
 application = get_wsgi_application()
+
+# Arrancar los procesos del servicio de PDF antes de la primera petición
+from gestion.pdf import servicio  # noqa: E402
+
+servicio().iniciar()